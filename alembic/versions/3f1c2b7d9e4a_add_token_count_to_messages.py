@@ -0,0 +1,25 @@
+"""add token_count to messages
+
+Revision ID: 3f1c2b7d9e4a
+Revises: 90ad8c0478a8
+Create Date: 2026-10-18 09:12:41.204518
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2b7d9e4a"
+down_revision: Union[str, Sequence[str], None] = "90ad8c0478a8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable: existing rows are counted on read until they are rewritten
+    op.add_column("messages", sa.Column("token_count", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "token_count")
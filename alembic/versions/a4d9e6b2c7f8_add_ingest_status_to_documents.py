@@ -0,0 +1,28 @@
+"""add ingest status to documents
+
+Revision ID: a4d9e6b2c7f8
+Revises: f3a7d2c9b5e1
+Create Date: 2026-10-18 19:05:41.318207
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a4d9e6b2c7f8"
+down_revision: Union[str, Sequence[str], None] = "f3a7d2c9b5e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("documents", sa.Column("status", sa.String(), server_default="ready", nullable=False))
+    op.add_column("documents", sa.Column("bytes_received", sa.Integer(), nullable=True))
+    op.add_column("documents", sa.Column("error", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("documents", "error")
+    op.drop_column("documents", "bytes_received")
+    op.drop_column("documents", "status")
@@ -0,0 +1,51 @@
+"""add document chunks and postings
+
+Revision ID: b7e4d1a2c9f0
+Revises: 3f1c2b7d9e4a
+Create Date: 2026-10-18 11:03:27.918342
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e4d1a2c9f0"
+down_revision: Union[str, Sequence[str], None] = "3f1c2b7d9e4a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing documents keep NULL stats and are indexed on first retrieval
+    op.add_column("documents", sa.Column("chunk_count", sa.Integer(), nullable=True))
+    op.add_column("documents", sa.Column("total_length", sa.Integer(), nullable=True))
+
+    op.create_table(
+        "document_chunks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id")),
+        sa.Column("position", sa.Integer()),
+        sa.Column("content", sa.Text()),
+        sa.Column("length", sa.Integer()),
+    )
+    op.create_index("ix_document_chunks_id", "document_chunks", ["id"])
+    op.create_index("ix_document_chunks_document_id", "document_chunks", ["document_id"])
+
+    op.create_table(
+        "chunk_postings",
+        sa.Column("term", sa.String(), primary_key=True),
+        sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id"), primary_key=True),
+        sa.Column("chunk_id", sa.Integer(), sa.ForeignKey("document_chunks.id"), primary_key=True),
+        sa.Column("term_frequency", sa.Integer()),
+        sa.Column("chunk_length", sa.Integer()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("chunk_postings")
+    op.drop_index("ix_document_chunks_document_id", table_name="document_chunks")
+    op.drop_index("ix_document_chunks_id", table_name="document_chunks")
+    op.drop_table("document_chunks")
+    op.drop_column("documents", "total_length")
+    op.drop_column("documents", "chunk_count")
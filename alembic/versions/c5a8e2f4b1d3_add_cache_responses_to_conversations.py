@@ -0,0 +1,27 @@
+"""add cache_responses to conversations
+
+Revision ID: c5a8e2f4b1d3
+Revises: b7e4d1a2c9f0
+Create Date: 2026-10-18 13:26:05.447120
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c5a8e2f4b1d3"
+down_revision: Union[str, Sequence[str], None] = "b7e4d1a2c9f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversations",
+        sa.Column("cache_responses", sa.Boolean(), nullable=False, server_default=sa.true())
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "cache_responses")
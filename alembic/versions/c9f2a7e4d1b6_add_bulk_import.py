@@ -0,0 +1,39 @@
+"""add bulk import
+
+Revision ID: c9f2a7e4d1b6
+Revises: b8e3f1a6d4c2
+Create Date: 2026-10-18 22:41:37.118205
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c9f2a7e4d1b6"
+down_revision: Union[str, Sequence[str], None] = "b8e3f1a6d4c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("conversations", sa.Column("external_id", sa.String(), nullable=True))
+    op.create_index("ix_conversations_external_id", "conversations", ["external_id"], unique=True)
+    op.create_table(
+        "import_checkpoints",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("line", sa.Integer(), nullable=False),
+        sa.Column("users", sa.Integer(), nullable=False),
+        sa.Column("conversations", sa.Integer(), nullable=False),
+        sa.Column("messages", sa.Integer(), nullable=False),
+        sa.Column("errors", sa.Integer(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("import_checkpoints")
+    op.drop_index("ix_conversations_external_id", table_name="conversations")
+    op.drop_column("conversations", "external_id")
@@ -0,0 +1,23 @@
+"""add conversation listing index
+
+Revision ID: d2f6a9c3e8b7
+Revises: c5a8e2f4b1d3
+Create Date: 2026-10-18 15:02:41.118305
+"""
+
+from typing import Sequence, Union
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f6a9c3e8b7"
+down_revision: Union[str, Sequence[str], None] = "c5a8e2f4b1d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_conversations_user_created_id", "conversations", ["user_id", "created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_conversations_user_created_id", table_name="conversations")
@@ -0,0 +1,26 @@
+"""add idempotency key to messages
+
+Revision ID: e1b5c8d3a7f2
+Revises: c9f2a7e4d1b6
+Create Date: 2026-10-18 23:58:12.503117
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e1b5c8d3a7f2"
+down_revision: Union[str, Sequence[str], None] = "c9f2a7e4d1b6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("idempotency_key", sa.String(), nullable=True))
+    op.create_index("ix_messages_idempotency_key", "messages", ["idempotency_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_idempotency_key", table_name="messages")
+    op.drop_column("messages", "idempotency_key")
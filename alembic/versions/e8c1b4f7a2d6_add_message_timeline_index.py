@@ -0,0 +1,23 @@
+"""add message timeline index
+
+Revision ID: e8c1b4f7a2d6
+Revises: d2f6a9c3e8b7
+Create Date: 2026-10-18 16:11:09.530217
+"""
+
+from typing import Sequence, Union
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8c1b4f7a2d6"
+down_revision: Union[str, Sequence[str], None] = "d2f6a9c3e8b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_messages_conversation_timestamp_id", "messages", ["conversation_id", "timestamp", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_conversation_timestamp_id", table_name="messages")
@@ -0,0 +1,26 @@
+"""add summary to conversations
+
+Revision ID: f3a7d2c9b5e1
+Revises: e8c1b4f7a2d6
+Create Date: 2026-10-18 17:40:22.604918
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f3a7d2c9b5e1"
+down_revision: Union[str, Sequence[str], None] = "e8c1b4f7a2d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("conversations", sa.Column("summary", sa.Text(), nullable=True))
+    op.add_column("conversations", sa.Column("summary_through_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "summary_through_id")
+    op.drop_column("conversations", "summary")
@@ -0,0 +1,129 @@
+"""
+Bulk NDJSON import throughput.
+
+Writes an NDJSON file with --users users and --conversations conversations of
+--messages messages each. It is imported into a fresh temporary SQLite file
+with ImportService at each of the --batch-records sizes, reading the file the
+way `python -m src.bulk_import` does. The baseline is what migrating without
+the import costs at best: the first --row-messages messages written one ORM
+insert and commit each, as add_message does (minus the LLM call).
+
+Reports seconds, messages/s and microseconds per message.
+
+    python -m benchmarks.bulk_import --conversations 2000 --messages 100
+    python -m benchmarks.bulk_import --batch-records 1000 5000 20000 --output before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import fakeredis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.micro import sentence
+from benchmarks.results import compare, write_results
+from src.bulk_import import read_chunks
+from src.models import Base, Conversation, Message, User
+from src.services.import_service import ImportService
+
+
+def generate(path: str, args) -> int:
+    rng = random.Random(args.seed)
+    lines = 0
+    with open(path, "w") as f:
+        for u in range(args.users):
+            f.write(json.dumps({"type": "user", "username": f"user{u}", "email": f"user{u}@example.com"}) + "\n")
+        for c in range(args.conversations):
+            f.write(json.dumps({"type": "conversation", "id": f"c{c}", "user": f"user{c % args.users}", "title": sentence(rng, 4), "created_at": f"2024-01-01T{c % 24:02d}:00:00Z"}) + "\n")
+            for i in range(args.messages):
+                role = "user" if i % 2 == 0 else "assistant"
+                content = sentence(rng, rng.randint(5, 40) if role == "user" else rng.randint(60, 250))
+                f.write(json.dumps({"type": "message", "conversation": f"c{c}", "role": role, "content": content, "timestamp": f"2024-01-01T{c % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z"}) + "\n")
+            lines += 1 + args.messages
+    return lines + args.users
+
+
+async def engine_for(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+async def bulk(data_path: str, db_path: str, batch_records: int) -> dict:
+    engine = await engine_for(db_path)
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        start = time.perf_counter()
+        with open(data_path, "rb") as f:
+            stats = await ImportService(db, fakeredis.FakeAsyncRedis(), batch_records=batch_records).run("bench", read_chunks(f))
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return {"seconds": elapsed, "messages": stats["messages"], "errors": stats["errors"], "warmed": stats["warmed"]}
+
+
+async def row_by_row(data_path: str, db_path: str, limit: int) -> dict:
+    engine = await engine_for(db_path)
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        db.add(User(username="user0", email="user0@example.com"))
+        db.add(Conversation(user_id=1))
+        await db.commit()
+        written = 0
+        start = time.perf_counter()
+        with open(data_path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record["type"] != "message":
+                    continue
+                db.add(Message(conversation_id=1, role=record["role"], content=record["content"]))
+                await db.commit()
+                written += 1
+                if written == limit:
+                    break
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return {"seconds": elapsed, "messages": written}
+
+
+def main(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "import.ndjson")
+        lines = generate(data_path, args)
+        print(f"{lines} records, {os.path.getsize(data_path) / 1e6:.1f} MB: {args.users} users, {args.conversations} conversations x {args.messages} messages")
+        results["row_by_row"] = asyncio.run(row_by_row(data_path, os.path.join(tmp, "rows.db"), args.row_messages))
+        for batch_records in args.batch_records:
+            results[f"bulk_{batch_records}"] = asyncio.run(bulk(data_path, os.path.join(tmp, f"bulk_{batch_records}.db"), batch_records))
+    for result in results.values():
+        result["messages_per_second"] = result["messages"] / result["seconds"]
+        result["us_per_message"] = result["seconds"] / result["messages"] * 1e6
+
+    print(f"{'mode':>14} {'messages':>10} {'seconds':>8} {'messages/s':>11} {'us/message':>11}")
+    for name, result in results.items():
+        print(f"{name:>14} {result['messages']:>10} {result['seconds']:>8.2f} {result['messages_per_second']:>11.0f} {result['us_per_message']:>11.1f}")
+
+    if args.output:
+        write_results(args.output, "bulk_import", vars(args), results)
+    if args.compare and compare(args.compare, results, "us_per_message", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=100, help="messages per conversation")
+    parser.add_argument("--batch-records", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--row-messages", type=int, default=2000, help="messages written one by one for the baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown per message that counts as a regression")
+    main(parser.parse_args())
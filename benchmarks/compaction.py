@@ -0,0 +1,126 @@
+"""
+Cold-storage compaction of archived conversations.
+
+Seeds a temporary SQLite file with --conversations conversations of
+--messages messages each and archives --archived of them. Then it runs the
+compaction job and reports:
+- the size of the messages table, its indexes and conversation_archives,
+  before and after;
+- compaction throughput;
+- full-history read latency for an archived conversation from the hot table
+  and from its archive;
+- the latency of an active conversation's history window read.
+
+    python -m benchmarks.compaction --conversations 2000 --messages 50 --archived 0.8
+    python -m benchmarks.compaction --output before.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import fakeredis
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.micro import sentence
+from benchmarks.results import compare, summarize, write_results
+from src.models import Base, ChatMode, Conversation, ConversationState, Message
+from src.services.compaction_service import CompactionService, table_sizes
+from src.services.conversation_service import ConversationService
+
+
+async def seed(db: AsyncSession, rng: random.Random, args):
+    await db.execute(insert(Conversation.__table__), [{"user_id": 1, "mode": ChatMode.OPEN.value, "state": ConversationState.ACTIVE.value, "cache_responses": True} for _ in range(args.conversations)])
+    for first in range(1, args.conversations + 1, 200):
+        rows = [
+            {"conversation_id": c, "role": "user" if i % 2 == 0 else "assistant", "content": sentence(rng, rng.randint(5, 40) if i % 2 == 0 else rng.randint(60, 250)), "token_count": 50}
+            for c in range(first, min(first + 200, args.conversations + 1))
+            for i in range(args.messages)
+        ]
+        await db.execute(insert(Message.__table__), rows)
+    archived = rng.sample(range(1, args.conversations + 1), int(args.conversations * args.archived))
+    await db.execute(update(Conversation).where(Conversation.id.in_(archived)).values(state=ConversationState.ARCHIVED))
+    await db.commit()
+    return sorted(archived), sorted(set(range(1, args.conversations + 1)) - set(archived))
+
+
+async def read_latency(service: ConversationService, conversation_ids, window: bool, samples: int) -> dict:
+    # One untimed pass first, so before and after are both measured with a warm page cache
+    timings = []
+    for timed in (False, True):
+        for conversation_id in conversation_ids[:samples]:
+            start = time.perf_counter()
+            if window:
+                service._window(await service._load_history(conversation_id), 4000)
+            else:
+                await service.get_conversation_history(conversation_id)
+            if timed:
+                timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+async def run(path: str, args) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    results = {}
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        archived, active = await seed(db, random.Random(args.seed), args)
+        service = ConversationService(db, fakeredis.FakeAsyncRedis())
+        before = await table_sizes(db)
+        results["archived_read_hot"] = await read_latency(service, archived, False, args.samples)
+        results["active_window_before"] = await read_latency(service, active, True, args.samples)
+
+        start = time.perf_counter()
+        stats = await CompactionService(db).run()
+        elapsed = time.perf_counter() - start
+        results["compaction"] = {**stats, "seconds": elapsed, "messages_per_second": stats["messages"] / elapsed}
+
+        after = await table_sizes(db)
+        results["archived_read_cold"] = await read_latency(service, archived, False, args.samples)
+        results["active_window_after"] = await read_latency(service, active, True, args.samples)
+        results["sizes"] = {name: {"before": before.get(name, 0), "after": after.get(name, 0)} for name in sorted(set(before) | set(after))}
+    await engine.dispose()
+    return results
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(run(os.path.join(tmp, "compaction.db"), args))
+
+    print(f"{args.conversations} conversations x {args.messages} messages, {args.archived:.0%} archived")
+    print(f"{'table':>24} {'before KB':>10} {'after KB':>10}")
+    for name, size in results["sizes"].items():
+        print(f"{name:>24} {size['before'] / 1024:>10.0f} {size['after'] / 1024:>10.0f}")
+    compaction = results["compaction"]
+    print(f"compacted {compaction['conversations']} conversations, {compaction['messages']} messages in {compaction['seconds']:.2f}s ({compaction['messages_per_second']:.0f} messages/s), text {compaction['ratio']:.1f}x smaller")
+    print(f"{'read':>24} {'p50 ms':>8} {'p95 ms':>8}")
+    for name in ("archived_read_hot", "archived_read_cold", "active_window_before", "active_window_after"):
+        print(f"{name:>24} {results[name]['p50_ms']:>8.2f} {results[name]['p95_ms']:>8.2f}")
+
+    if args.output:
+        write_results(args.output, "compaction", vars(args), results)
+    if args.compare:
+        reads = {name: results[name] for name in ("archived_read_hot", "archived_read_cold", "active_window_before", "active_window_after")}
+        if compare(args.compare, reads, "p95_ms", args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50, help="messages per conversation")
+    parser.add_argument("--archived", type=float, default=0.8, help="fraction of conversations archived")
+    parser.add_argument("--samples", type=int, default=200, help="conversations read per latency measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    main(parser.parse_args())
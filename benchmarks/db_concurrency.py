@@ -0,0 +1,120 @@
+"""
+Concurrency load test for the chat-turn data path.
+
+Runs N concurrent "turns" (conversation lookup, history read, fake LLM await,
+two message inserts) against a SQLite file, once with the legacy blocking
+Session used from async code and once with AsyncSession. Each read pays an
+extra --db-latency inside the driver (a SQLite function that sleeps), which
+stands in for a network round trip to Postgres.
+
+    python -m benchmarks.db_concurrency --concurrency 1 8 32 64
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Base, Conversation, Message, ChatMode, ConversationState
+
+
+ROUND_TRIP = text("SELECT round_trip()")
+
+
+def add_latency(sync_engine, delay: float):
+    # Runs on the driver's thread, so it only blocks the event loop when the driver does
+    @event.listens_for(sync_engine, "connect")
+    def _register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("round_trip", 0, lambda: time.sleep(delay))
+
+
+def seed(url: str, conversations: int):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        for _ in range(conversations):
+            conversation = Conversation(user_id=1, mode=ChatMode.OPEN, state=ConversationState.ACTIVE)
+            db.add(conversation)
+            db.flush()
+            db.add_all([Message(conversation_id=conversation.id, role="user", content="hello there"),
+                        Message(conversation_id=conversation.id, role="assistant", content="hi, how can I help?")])
+        db.commit()
+    engine.dispose()
+
+
+async def blocking_turn(SessionLocal, conversation_id: int, llm_latency: float):
+    with SessionLocal() as db:
+        db.execute(ROUND_TRIP)
+        db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        db.execute(ROUND_TRIP)
+        db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp).all()
+        await asyncio.sleep(llm_latency)
+        db.add_all([Message(conversation_id=conversation_id, role="user", content="q"),
+                    Message(conversation_id=conversation_id, role="assistant", content="a")])
+        db.commit()
+
+
+async def async_turn(SessionLocal, conversation_id: int, llm_latency: float):
+    async with SessionLocal() as db:
+        await db.execute(ROUND_TRIP)
+        await db.execute(select(Conversation).where(Conversation.id == conversation_id))
+        await db.execute(ROUND_TRIP)
+        await db.execute(select(Message).where(Message.conversation_id == conversation_id).order_by(Message.timestamp))
+        await asyncio.sleep(llm_latency)
+        db.add_all([Message(conversation_id=conversation_id, role="user", content="q"),
+                    Message(conversation_id=conversation_id, role="assistant", content="a")])
+        await db.commit()
+
+
+async def run(turn, SessionLocal, concurrency: int, turns: int, llm_latency: float) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await turn(SessionLocal, i % concurrency + 1, llm_latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(turns)))
+    return turns / (time.perf_counter() - start)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(f"sqlite:///{path}", max(args.concurrency))
+
+        sync_engine = create_engine(f"sqlite:///{path}", pool_size=max(args.concurrency), connect_args={"timeout": 30})
+        add_latency(sync_engine, args.db_latency)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=max(args.concurrency), connect_args={"timeout": 30})
+        add_latency(async_engine.sync_engine, args.db_latency)
+
+        BlockingSession = sessionmaker(bind=sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+        print(f"{'concurrency':>12} {'blocking turns/s':>18} {'async turns/s':>15} {'speedup':>8}")
+        for concurrency in args.concurrency:
+            turns = max(args.turns, concurrency * 4)
+            before = await run(blocking_turn, BlockingSession, concurrency, turns, args.llm_latency)
+            after = await run(async_turn, AsyncSessionLocal, concurrency, turns, args.llm_latency)
+            print(f"{concurrency:>12} {before:>18.1f} {after:>15.1f} {after / before:>7.1f}x")
+
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--turns", type=int, default=64)
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds added to every read")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds for the fake completion")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+Query latency of dense retrieval (one float32 matrix-vector product over a
+memory-mapped chunk matrix plus argpartition top-k) against the original
+set-intersection loop, at growing chunk counts.
+
+Chunk texts are synthetic. Above --embed-limit chunks the matrix is filled
+with random unit vectors instead of embedding every chunk, since query
+latency does not depend on the vector values.
+
+    python -m benchmarks.dense_retrieval --chunks 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+
+from benchmarks.rag_retrieval import VOCABULARY, set_intersection
+from src.services.embeddings import HashingEmbedder
+from src.services.vector_store import VectorStore
+
+QUERY = "how do I reset term17 and term4242"
+
+
+def timed(fn, repeat: int) -> float:
+    fn()  # warm the page cache / memmap
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args):
+    rng = random.Random(0)
+    embedder = HashingEmbedder(args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(tmp)
+        print(f"{'chunks':>9} {'set-intersection ms':>20} {'dense ms':>9} {'matrix MB':>10}")
+        for document_id, size in enumerate(args.chunks):
+            texts = [" ".join(rng.choices(VOCABULARY, k=args.words)) for _ in range(size)]
+            if size <= args.embed_limit:
+                matrix = embedder.embed(texts)
+            else:
+                matrix = np.random.default_rng(0).standard_normal((size, args.dim), dtype=np.float32)
+                matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            store.write(document_id, list(range(size)), matrix)
+            del matrix
+
+            legacy = timed(lambda: set_intersection(QUERY, texts), args.repeat)
+            dense = timed(lambda: store.search([document_id], embedder.embed([QUERY])[0], args.top_k), args.repeat)
+            megabytes = size * args.dim * 4 / 2**20
+            print(f"{size:>9} {legacy:>20.2f} {dense:>9.2f} {megabytes:>10.0f}")
+            del texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--words", type=int, default=20, help="words per synthetic chunk")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--embed-limit", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,126 @@
+"""
+In-process fake of an OpenAI-compatible chat completions endpoint.
+
+    with FakeLLMServer(latency=0.05) as server:
+        ...  # POST {server.url}
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_fake_llm_app(latency: float = 0.0, tokens_per_second: Optional[float] = None, completion_tokens: int = 20, error_rate: float = 0.0,
+                        rate_limit_first: int = 0, rate_limit_rate: float = 0.0, retry_after: Optional[float] = 1.0) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.rate_limited = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if app.state.requests <= rate_limit_first or (rate_limit_rate and random.random() < rate_limit_rate):
+            app.state.rate_limited += 1
+            headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+            return JSONResponse({"error": {"message": "Rate limit reached", "type": "tokens"}}, status_code=429, headers=headers)
+        if error_rate and random.random() < error_rate:
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=500)
+        prompt_tokens = sum(len(m["content"].split()) for m in body["messages"])
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        if body.get("stream"):
+            return StreamingResponse(stream(usage), media_type="text/event-stream")
+        generation = completion_tokens / tokens_per_second if tokens_per_second else 0.0
+        await asyncio.sleep(latency + generation)
+        content = " ".join(["token"] * completion_tokens)
+        return {
+            "id": "fake",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    async def stream(usage: dict):
+        await asyncio.sleep(latency)
+        for i in range(completion_tokens):
+            if tokens_per_second:
+                await asyncio.sleep(1 / tokens_per_second)
+            delta = "token" if i == 0 else " token"
+            yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': delta}}]})}\n\n"
+        yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def self_signed_cert(directory: str):
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
+
+
+class BackgroundServer:
+    # Serves an ASGI app with uvicorn on a free local port, in a daemon thread
+    path = ""
+
+    def __init__(self, app, tls: bool = False):
+        self.app = app
+        self.tls = tls
+        self.certfile = None
+        self._tmp = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://127.0.0.1:{self.port}"
+
+    @property
+    def url(self) -> str:
+        return self.base_url + self.path
+
+    def __enter__(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        ssl_options = {}
+        if self.tls:
+            self._tmp = tempfile.TemporaryDirectory()
+            self.certfile, keyfile = self_signed_cert(self._tmp.name)
+            ssl_options = {"ssl_certfile": self.certfile, "ssl_keyfile": keyfile}
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning", **ssl_options)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
+        if self._tmp:
+            self._tmp.cleanup()
+
+
+class FakeLLMServer(BackgroundServer):
+    path = "/v1/chat/completions"
+
+    def __init__(self, tls: bool = False, **app_options):
+        super().__init__(create_fake_llm_app(**app_options), tls)
@@ -0,0 +1,117 @@
+"""
+Document ingestion throughput on multi-MB uploads.
+
+Generates --megabytes of paragraph text and indexes it into a temporary
+SQLite file: once the old way (whole document in Document.content, then
+RAGService.index_document) and then streamed through IngestionService in
+--read-bytes pieces, chunking inline (0 processes) and in worker pools of
+each size in --processes. Reports MB/s and chunks/s per run.
+
+    python -m benchmarks.ingestion --megabytes 20
+    python -m benchmarks.ingestion --processes 0 2 4 --output before.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.micro import sentence
+from benchmarks.results import compare, write_results
+from src.models import Base, ChatMode, Conversation, Document
+from src.services.ingestion_service import IngestionService, get_ingest_pool
+from src.services.rag_service import RAGService
+
+
+def document_text(rng: random.Random, megabytes: float) -> str:
+    paragraphs, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        paragraph = ". ".join(sentence(rng, rng.randint(8, 30)) for _ in range(rng.randint(2, 8))) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+async def body(data: bytes, read_bytes: int):
+    for i in range(0, len(data), read_bytes):
+        yield data[i:i + read_bytes]
+
+
+async def run(path: str, text: str, args, processes: int = None) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def wal(connection, _):
+        connection.execute("PRAGMA journal_mode=WAL")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        conversation = Conversation(user_id=1, mode=ChatMode.GROUNDED)
+        db.add(conversation)
+        await db.commit()
+        data = text.encode()
+        start = time.perf_counter()
+        if processes is None:
+            document = Document(conversation_id=conversation.id, name="bench", content=text)
+            db.add(document)
+            await db.flush()
+            await RAGService(db, mode="bm25").index_document(document)
+            await db.commit()
+        else:
+            service = IngestionService(db, get_ingest_pool() if processes else None)
+            document = await service.create_document(conversation.id, "bench")
+            await service.ingest(document, body(data, args.read_bytes))
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return {"seconds": elapsed, "mb_per_second": len(data) / 1024 / 1024 / elapsed, "chunks": document.chunk_count, "chunks_per_second": document.chunk_count / elapsed}
+
+
+def main(args):
+    from src.config.settings import settings
+    settings.rag_mode = "bm25"
+    text = document_text(random.Random(args.seed), args.megabytes)
+    print(f"{len(text.encode()) / 1024 / 1024:.1f} MB, chunks of {settings.ingest_chunk_min_tokens}-{settings.ingest_chunk_max_tokens} tokens, {os.cpu_count()} CPUs")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ingest.db")
+        results["index_document"] = asyncio.run(run(path, text, args))
+        for processes in args.processes:
+            settings.ingest_processes = processes
+            get_ingest_pool.cache_clear()
+            if processes:
+                get_ingest_pool().submit(int).result()  # start the workers outside the timing
+            results[f"stream[{processes} processes]"] = asyncio.run(run(path, text, args, processes))
+            if processes:
+                get_ingest_pool().shutdown()
+
+    print(f"{'run':>24} {'seconds':>9} {'MB/s':>8} {'chunks':>8} {'chunks/s':>9}")
+    for name, result in results.items():
+        print(f"{name:>24} {result['seconds']:>9.2f} {result['mb_per_second']:>8.2f} {result['chunks']:>8} {result['chunks_per_second']:>9.0f}")
+
+    if args.output:
+        write_results(args.output, "ingestion", vars(args), results)
+    if args.compare and compare(args.compare, results, "seconds", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=10.0, help="size of the generated document")
+    parser.add_argument("--read-bytes", type=int, default=65536, help="size of each body read")
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2], help="worker pool sizes to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression")
+    main(parser.parse_args())
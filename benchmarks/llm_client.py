@@ -0,0 +1,75 @@
+"""
+Per-turn latency of LLMService.call_llm with a new AsyncClient per call (the
+old behaviour) versus the shared, pooled client, against a local fake
+completion server over TLS.
+
+    python -m benchmarks.llm_client --turns 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMServer
+from src.config.http_client import create_http_client
+from src.services.llm_providers import LLMProvider, ProviderRouter
+from src.services.llm_scheduler import LLMScheduler
+from src.services.llm_service import LLMService
+
+MESSAGES = [{"role": "user", "content": "hello there"}]
+
+
+async def per_call_clients(server: FakeLLMServer, turns: int):
+    # Each variant gets its own unthrottled scheduler, so only the client differs
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0)
+    timings = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(verify=server.certfile or True) as client:
+            service = LLMService(client, scheduler=scheduler, router=ProviderRouter([LLMProvider("fake", server.url)]))
+            await service.call_llm(list(MESSAGES))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def shared_client(server: FakeLLMServer, turns: int):
+    client = create_http_client(verify=server.certfile or True)
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0)
+    timings = []
+    try:
+        for _ in range(turns):
+            start = time.perf_counter()
+            service = LLMService(client, scheduler=scheduler, router=ProviderRouter([LLMProvider("fake", server.url)]))
+            await service.call_llm(list(MESSAGES))
+            timings.append(time.perf_counter() - start)
+    finally:
+        await client.aclose()
+    return timings
+
+
+def report(name: str, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1000
+    p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{name:>20} p50={p50:7.2f} ms  p95={p95:7.2f} ms")
+    return p50
+
+
+async def main(args):
+    with FakeLLMServer(tls=not args.no_tls) as server:
+        before = report("client per call", await per_call_clients(server, args.turns))
+        after = report("shared client", await shared_client(server, args.turns))
+        print(f"{'saved per turn':>20} {before - after:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--no-tls", action="store_true")
+    asyncio.run(main(parser.parse_args()))
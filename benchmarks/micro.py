@@ -0,0 +1,100 @@
+"""
+Microbenchmarks for the per-turn hot paths that run without I/O:
+keyword retrieval (retrieve_rag_context), call_llm context windowing,
+response-cache keys and history-cache (de)serialization.
+
+Results go to JSON so runs on different commits can be compared:
+
+    python -m benchmarks.micro --output baseline.json
+    python -m benchmarks.micro --compare baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from benchmarks.rag_retrieval import VOCABULARY
+from benchmarks.results import compare, write_results
+from src.models import Message
+from src.services.history_cache import HistoryCache
+from src.services.llm_service import LLMService
+from src.services.response_cache import ResponseCache
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, k=words))
+
+
+def measure(fn, min_time: float, samples: int) -> dict:
+    # Calibrates a loop count so each sample runs for about min_time, then reports per-call times
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number * 1e6)
+    return {"min_us": min(timings), "median_us": statistics.median(timings), "loops": number}
+
+
+def cases(rng: random.Random):
+    llm = LLMService()
+    query = "how do I reset term17 and term4242"
+    for size in (100, 1000):
+        chunks = [sentence(rng, 60) for _ in range(size)]
+        yield f"retrieve_rag_context[{size} chunks]", lambda chunks=chunks: llm.retrieve_rag_context(query, chunks)
+
+    for size in (100, 1000):
+        history = [{"role": "user" if i % 2 == 0 else "assistant", "content": sentence(rng, 40)} for i in range(size)]
+        for message in history:
+            message["token_count"] = llm.tokenizer.count(message["content"])
+        yield f"context_window[{size} messages]", lambda history=history: llm._apply_context_window(history, 4000)
+        window = llm._apply_context_window(history, 4000)
+        yield f"response_cache_key[{size} messages]", lambda window=window: ResponseCache.key_for(llm.model, window)
+
+    now = datetime.now(timezone.utc)
+    messages = [Message(id=i, role="user", content=sentence(rng, 40), timestamp=now, token_count=50) for i in range(2000)]
+    entries = [json.dumps(HistoryCache.entry(m)) for m in messages]
+    yield "history_serialize[2000 messages]", lambda: [json.dumps(HistoryCache.entry(m)) for m in messages]
+    yield "history_deserialize[2000 messages]", lambda: [json.loads(e) for e in entries]
+
+
+def main(args):
+    rng = random.Random(0)
+    results = {}
+    print(f"{'case':>36} {'min us':>12} {'median us':>12}")
+    for name, fn in cases(rng):
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(fn, args.min_time, args.samples)
+        print(f"{name:>36} {results[name]['min_us']:>12.1f} {results[name]['median_us']:>12.1f}")
+
+    if args.output:
+        write_results(args.output, "micro", vars(args), results)
+    if args.compare and compare(args.compare, results, "median_us", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per sample")
+    parser.add_argument("--filter", help="only run cases whose name contains this")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression")
+    main(parser.parse_args())
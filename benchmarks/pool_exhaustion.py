@@ -0,0 +1,132 @@
+"""
+Pool exhaustion under slow completions.
+
+Runs --turns concurrent ConversationService.add_message calls whose LLM call
+takes --llm-latency seconds, on an engine with a deliberately small pool,
+while a probe keeps listing users (the GET /users query) every --probe-interval.
+The "holding" variant keeps its read transaction open across the LLM call,
+as add_message did before the turn was split into phases; "split" is the
+current code.
+
+    python -m benchmarks.pool_exhaustion --pool-size 5 --turns 50 --llm-latency 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import fakeredis
+from sqlalchemy import select
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.models import Base, Conversation, User, ChatMode
+from src.services.conversation_service import ConversationService
+from src.services.llm_service import LLMService
+from src.services.user_service import UserService
+
+
+class HoldingConversationService(ConversationService):
+    # The pre-split turn: a transaction (and its pooled connection) stays open through the LLM call
+    async def prepare_turn(self, *args, **kwargs):
+        turn = await super().prepare_turn(*args, **kwargs)
+        await self.db.execute(select(1))
+        return turn
+
+
+async def seed(SessionLocal, conversations: int):
+    async with SessionLocal() as db:
+        db.add_all([User(username=f"user{i}", email=f"user{i}@example.com") for i in range(50)])
+        db.add_all([Conversation(user_id=1, mode=ChatMode.OPEN) for _ in range(conversations)])
+        await db.commit()
+
+
+def fake_llm(latency: float) -> LLMService:
+    llm = LLMService()
+
+    async def call_llm(messages, context_limit=None, use_cache=True):
+        await asyncio.sleep(latency)
+        return {"content": "ok", "tokens_used": 1}
+
+    llm.call_llm = call_llm
+    return llm
+
+
+async def run(service_class, SessionLocal, redis_client, args) -> dict:
+    llm = fake_llm(args.llm_latency)
+    probes, timeouts, errors = [], 0, 0
+
+    async def turn(conversation_id: int):
+        nonlocal errors
+        async with SessionLocal() as db:
+            try:
+                await service_class(db, redis_client, llm).add_message(conversation_id, "hello")
+            except PoolTimeoutError:
+                errors += 1
+
+    async def probe(done: asyncio.Event):
+        nonlocal timeouts
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                async with SessionLocal() as db:
+                    await UserService(db, redis_client).list_users(limit=20)
+                probes.append(time.perf_counter() - start)
+            except PoolTimeoutError:
+                timeouts += 1
+            await asyncio.sleep(args.probe_interval)
+
+    done = asyncio.Event()
+    prober = asyncio.create_task(probe(done))
+    start = time.perf_counter()
+    await asyncio.gather(*(turn(i + 1) for i in range(args.turns)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+
+    probes.sort()
+    return {
+        "elapsed": elapsed,
+        "turn_errors": errors,
+        "probe_p50": statistics.median(probes) * 1000 if probes else float("nan"),
+        "probe_max": probes[-1] * 1000 if probes else float("nan"),
+        "probe_timeouts": timeouts,
+    }
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            pool_size=args.pool_size, max_overflow=0, pool_timeout=args.pool_timeout, connect_args={"timeout": 30},
+        )
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+            await conn.run_sync(Base.metadata.create_all)
+        SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(SessionLocal, args.turns)
+        redis_client = fakeredis.FakeAsyncRedis()
+
+        print(f"pool_size={args.pool_size} turns={args.turns} llm_latency={args.llm_latency}s pool_timeout={args.pool_timeout}s")
+        print(f"{'variant':>8} {'elapsed s':>10} {'turn timeouts':>14} {'probe p50 ms':>13} {'probe max ms':>13} {'probe timeouts':>15}")
+        for name, service_class in (("holding", HoldingConversationService), ("split", ConversationService)):
+            result = await run(service_class, SessionLocal, redis_client, args)
+            print(f"{name:>8} {result['elapsed']:>10.2f} {result['turn_errors']:>14} {result['probe_p50']:>13.1f} {result['probe_max']:>13.1f} {result['probe_timeouts']:>15}")
+
+        await redis_client.aclose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=50, help="concurrent add_message calls")
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="seconds for the fake completion")
+    parser.add_argument("--pool-timeout", type=float, default=5.0)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
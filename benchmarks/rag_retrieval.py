@@ -0,0 +1,94 @@
+"""
+Grounded-mode retrieval latency as the number of indexed documents grows.
+
+Compares the original path (load every document, split on blank lines,
+set-intersect each chunk with the query) against BM25 over the persistent
+postings index, on a temporary SQLite file.
+
+    python -m benchmarks.rag_retrieval --documents 10 100 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.models import Base, Conversation, Document, ChatMode
+from src.services.rag_service import RAGService
+
+VOCABULARY = [f"term{i}" for i in range(20000)]
+QUERIES = ["how do I reset term17 and term4242", "term99 pricing for term12345", "what is term7"]
+
+
+def make_document(rng: random.Random, chunks: int, words: int) -> str:
+    return "\n\n".join(" ".join(rng.choices(VOCABULARY, k=words)) for _ in range(chunks))
+
+
+def set_intersection(query: str, document_chunks):
+    query_words = set(query.lower().split())
+    relevant_chunks = []
+    for chunk in document_chunks:
+        if query_words & set(chunk.lower().split()):
+            relevant_chunks.append(chunk)
+    return relevant_chunks[:3]
+
+
+async def legacy_retrieve(db, query: str, document_ids):
+    document_chunks = []
+    for doc_id in document_ids:
+        doc = (await db.execute(select(Document).where(Document.id == doc_id))).scalars().first()
+        document_chunks.extend(doc.content.split("\n\n"))
+    return set_intersection(query, document_chunks)
+
+
+async def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        await fn(QUERIES[i % len(QUERIES)])
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def main(args):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        print(f"{'documents':>10} {'chunks':>8} {'legacy ms':>10} {'bm25 ms':>9}")
+        document_ids = []
+        async with SessionLocal() as db:
+            conversation = Conversation(user_id=1, mode=ChatMode.GROUNDED)
+            db.add(conversation)
+            await db.flush()
+            service = RAGService(db)
+            for target in args.documents:
+                while len(document_ids) < target:
+                    document = Document(conversation_id=conversation.id, name="doc", content=make_document(rng, args.chunks, args.words))
+                    db.add(document)
+                    await db.flush()
+                    await service.index_document(document)
+                    document_ids.append(document.id)
+                await db.commit()
+
+                legacy = await timed(lambda q: legacy_retrieve(db, q, document_ids), args.repeat)
+                bm25 = await timed(lambda q: service.retrieve(q, document_ids), args.repeat)
+                print(f"{target:>10} {target * args.chunks:>8} {legacy:>10.2f} {bm25:>9.2f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--chunks", type=int, default=10, help="chunks per document")
+    parser.add_argument("--words", type=int, default=120, help="words per chunk")
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
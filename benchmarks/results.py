@@ -0,0 +1,72 @@
+"""
+Shared reporting for the benchmark suite: percentile summaries, JSON result
+files tagged with the git commit, and comparison against a baseline file.
+
+    python -m benchmarks.micro --output before.json
+    (change code)
+    python -m benchmarks.micro --compare before.json
+"""
+import json
+import math
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(seconds: List[float]) -> Dict:
+    values = sorted(seconds)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else float("nan"),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, config: Dict, results: Dict):
+    document = {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"results written to {path}")
+
+
+def compare(baseline_path: str, results: Dict, metric: str, threshold: float) -> List[str]:
+    # Prints current vs baseline for `metric` and returns the names that got slower by more than threshold
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} (commit {baseline.get('commit')}), {metric}:")
+    regressions = []
+    for name, current in results.items():
+        before = baseline["results"].get(name, {}).get(metric)
+        if before is None or current.get(metric) is None:
+            continue
+        change = (current[metric] - before) / before if before else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:>36} {before:>10.3f} -> {current[metric]:>10.3f} {change:>+8.1%} {flag}")
+    return regressions
@@ -0,0 +1,97 @@
+"""
+Cache-value and response-body serialization for a conversation history.
+
+Redis side: bytes stored and time to encode/decode every entry of a history
+with the old per-entry json.dumps/json.loads and with each available Codec
+(json/orjson, msgpack, zlib/zstd/lz4 compression above --compress-min-bytes).
+Response side: rendering the history with FastAPI's response_model
+validation plus JSONResponse, against FastJSONResponse.
+
+    python -m benchmarks.serialization --messages 500
+    python -m benchmarks.serialization --output before.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+from typing import List
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from benchmarks.micro import measure, sentence
+from benchmarks.results import compare, write_results
+from src.services.codec import Codec, get_json_serializer
+
+
+def history(rng: random.Random, size: int) -> List[dict]:
+    # Short user turns and longer replies, with an occasional very long one
+    entries = []
+    for i in range(size):
+        words = rng.randint(5, 40) if i % 2 == 0 else rng.choice([60, 120, 250, 250, 1200])
+        entries.append({"id": i + 1, "role": "user" if i % 2 == 0 else "assistant", "content": sentence(rng, words), "timestamp": "2024-05-01T12:00:00.123456", "token_count": words})
+    return entries
+
+
+def codecs(min_bytes: int):
+    json_libraries = ["json"] + (["orjson"] if importlib.util.find_spec("orjson") else [])
+    serializers = ["json"] + (["msgpack"] if importlib.util.find_spec("msgpack") else [])
+    compressions = ["none", "zlib"] + [name for name, module in (("zstd", "zstandard"), ("lz4", "lz4")) if importlib.util.find_spec(module)]
+    for json_library in json_libraries:
+        for serializer in serializers:
+            if serializer == "msgpack" and json_library != "json":
+                continue  # msgpack values do not touch the JSON library
+            for compression in compressions:
+                name = f"{serializer if serializer != 'json' else json_library}+{compression}"
+                yield name, Codec(serializer, compression, min_bytes, json_library)
+
+
+def main(args):
+    entries = history(random.Random(0), args.messages)
+    results = {}
+
+    def run(name: str, encode, decode, stored: int):
+        results[name] = {"bytes": stored}
+        results[name].update({f"encode_{k}": v for k, v in measure(encode, args.min_time, args.samples).items() if k != "loops"})
+        if decode:
+            results[name].update({f"decode_{k}": v for k, v in measure(decode, args.min_time, args.samples).items() if k != "loops"})
+        print(f"{name:>28} {stored:>10} {results[name]['encode_median_us']:>12.1f} {results[name].get('decode_median_us', float('nan')):>12.1f}")
+
+    print(f"history of {args.messages} messages, {sum(len(e['content']) for e in entries)} characters of content\n")
+    print(f"{'redis values':>28} {'bytes':>10} {'encode us':>12} {'decode us':>12}")
+    baseline = [json.dumps(e).encode() for e in entries]
+    run("current json.dumps", lambda: [json.dumps(e) for e in entries], lambda: [json.loads(v) for v in baseline], sum(map(len, baseline)))
+    for name, codec in codecs(args.compress_min_bytes):
+        encoded = [codec.encode(e) for e in entries]
+        assert [codec.decode(v) for v in encoded] == entries
+        run(name, lambda codec=codec: [codec.encode(e) for e in entries], lambda codec=codec, encoded=encoded: [codec.decode(v) for v in encoded], sum(map(len, encoded)))
+
+    print(f"\n{'response body':>28} {'bytes':>10} {'render us':>12}")
+    adapter = TypeAdapter(List[dict])
+    body = JSONResponse(adapter.dump_python(adapter.validate_python(entries), mode="json")).body
+    run("response_model+JSONResponse", lambda: JSONResponse(adapter.dump_python(adapter.validate_python(entries), mode="json")).body, None, len(body))
+    for library in ["json", "orjson"] if importlib.util.find_spec("orjson") else ["json"]:
+        serializer = get_json_serializer(library)
+        run(f"FastJSONResponse[{library}]", lambda serializer=serializer: serializer.dumps(entries), None, len(serializer.dumps(entries)))
+
+    if args.output:
+        write_results(args.output, "serialization", vars(args), results)
+    if args.compare and compare(args.compare, results, "encode_median_us", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--compress-min-bytes", type=int, default=1024)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per sample")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression")
+    main(parser.parse_args())
@@ -0,0 +1,127 @@
+"""
+Per-turn overhead of a chat turn over the WebSocket session vs REST.
+
+Starts the app on uvicorn against a temporary SQLite file and fakeredis, with
+the fake completion server answering instantly, so what is timed is the
+app's own work per turn. Each of --clients clients gets its own conversation
+(seeded with --history messages) and sends --turns messages one after another
+with each transport:
+
+  rest         POST /conversations/{id}/messages
+  rest_stream  the same with "stream": true, read to the end of the SSE stream
+  websocket    one /ws/conversations/{id} connection, a frame per turn, read until "done"
+
+Reports p50/p95/p99 per turn. Needs the `websockets` package.
+
+    python -m benchmarks.websocket_chat --turns 200
+    python -m benchmarks.websocket_chat --clients 10 --output before.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+import websockets
+
+from benchmarks.fake_llm import BackgroundServer, FakeLLMServer
+from benchmarks.load_test import configure
+from benchmarks.results import compare, summarize, write_results
+
+
+async def seed(client: httpx.AsyncClient, index: int, history: int) -> int:
+    user = (await client.post("/api/v1/users", json={"username": f"ws{index}", "email": f"ws{index}@example.com"})).json()
+    conversation_id = (await client.post("/api/v1/conversations", json={"user_id": user["id"], "first_message": "hello"})).json()["conversation_id"]
+    for _ in range((history - 2) // 2):
+        await client.post(f"/api/v1/conversations/{conversation_id}/messages", json={"message": "tell me more"})
+    return conversation_id
+
+
+async def rest(client: httpx.AsyncClient, base_url: str, conversation_id: int, turns: int) -> List[float]:
+    timings = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        response = await client.post(f"/api/v1/conversations/{conversation_id}/messages", json={"message": "tell me more"})
+        response.raise_for_status()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def rest_stream(client: httpx.AsyncClient, base_url: str, conversation_id: int, turns: int) -> List[float]:
+    timings = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        async with client.stream("POST", f"/api/v1/conversations/{conversation_id}/messages", json={"message": "tell me more", "stream": True}) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def websocket(client: httpx.AsyncClient, base_url: str, conversation_id: int, turns: int) -> List[float]:
+    timings = []
+    async with websockets.connect(f"{base_url.replace('http', 'ws', 1)}/api/v1/ws/conversations/{conversation_id}") as socket:
+        await socket.recv()  # ready
+        for _ in range(turns):
+            start = time.perf_counter()
+            await socket.send(json.dumps({"message": "tell me more"}))
+            while True:
+                frame = json.loads(await socket.recv())
+                if frame["type"] == "error":
+                    raise RuntimeError(frame["detail"])
+                if frame["type"] == "done":
+                    break
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+TRANSPORTS = {"rest": rest, "rest_stream": rest_stream, "websocket": websocket}
+
+
+async def drive(base_url: str, args) -> dict:
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        conversations = [await seed(client, i, args.history) for i in range(args.clients)]
+        for name, transport in TRANSPORTS.items():
+            start = time.monotonic()
+            runs = await asyncio.gather(*(transport(client, base_url, conversation_id, args.turns) for conversation_id in conversations))
+            timings = [t for run in runs for t in run]
+            results[name] = {**summarize(timings), "rps": len(timings) / (time.monotonic() - start)}
+    return results
+
+
+def main(args):
+    args.database_url, args.redis_url, args.llm_rpm, args.turn_workers = None, None, 0, 0
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer(latency=0.0, tokens_per_second=None) as llm:
+        configure(args, llm.url, tmp)
+        import fakeredis
+        from src.config import redis_client
+        from src.main import app
+        redis_client._client = fakeredis.FakeAsyncRedis()
+
+        with BackgroundServer(app) as server:
+            print(f"clients={args.clients} turns={args.turns} history={args.history}")
+            results = asyncio.run(drive(server.base_url, args))
+
+    print(f"{'transport':>12} {'turns':>7} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in results.items():
+        print(f"{name:>12} {result['count']:>7} {result['rps']:>8.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+    if args.output:
+        write_results(args.output, "websocket_chat", {k: v for k, v in vars(args).items() if k not in ("database_url", "redis_url")}, results)
+    if args.compare and compare(args.compare, results, "p95_ms", args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1, help="concurrent clients, one conversation each")
+    parser.add_argument("--turns", type=int, default=100, help="turns per client and transport")
+    parser.add_argument("--history", type=int, default=20, help="messages in each conversation before timing")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 slowdown that counts as a regression")
+    main(parser.parse_args())
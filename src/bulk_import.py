@@ -0,0 +1,44 @@
+# Bulk import of NDJSON user, conversation and message records (see services/import_service.py),
+# the same import as POST /api/v1/import:
+#
+#     python -m src.bulk_import chats.ndjson                 # the run is named after the file
+#     python -m src.bulk_import chats.ndjson --name march    # rerun after a failure to resume
+#     zcat chats.ndjson.gz | python -m src.bulk_import - --name march
+from src.config.redis_client import close_redis, get_redis
+from src.models import AsyncSessionLocal
+from src.services.import_service import ImportService
+from typing import AsyncIterator, BinaryIO
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+async def read_chunks(stream: BinaryIO, size: int = 1048576) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await asyncio.to_thread(stream.read, size)
+        if not chunk:
+            return
+        yield chunk
+
+async def main(path: str, name: str):
+    try:
+        async with AsyncSessionLocal() as db:
+            service = ImportService(db, get_redis())
+            if path == "-":
+                stats = await service.run(name, read_chunks(sys.stdin.buffer))
+            else:
+                with open(path, "rb") as f:
+                    stats = await service.run(name, read_chunks(f))
+        print(json.dumps(stats, indent=2))
+    finally:
+        await close_redis()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="NDJSON file, or - for standard input")
+    parser.add_argument("--name", help="checkpoint name, to resume a failed run (default: the file name)")
+    args = parser.parse_args()
+    if args.path == "-" and not args.name:
+        parser.error("--name is required when reading standard input")
+    asyncio.run(main(args.path, args.name or os.path.basename(args.path)))
@@ -0,0 +1,47 @@
+# Cold-storage compaction job: moves the messages of archived (and long-deleted) conversations
+# into compressed conversation_archives rows every COMPACTION_INTERVAL seconds. Run one instance:
+#
+#     python -m src.compaction           # forever
+#     python -m src.compaction --once    # a single pass, e.g. from cron
+#     python -m src.compaction --once --report   # with table and index sizes before and after
+from src.config.settings import settings
+from src.models import AsyncSessionLocal
+from src.services.compaction_service import CompactionService, table_sizes
+import argparse
+import asyncio
+import signal
+
+async def compact(report: bool):
+    async with AsyncSessionLocal() as db:
+        before = await table_sizes(db) if report else None
+        stats = await CompactionService(db).run()
+        print(f"Compaction: {stats}")
+        if report:
+            after = await table_sizes(db)
+            for name in before:
+                print(f"  {name}: {before[name]} -> {after.get(name, 0)} bytes")
+
+async def main(once: bool, report: bool):
+    if once:
+        await compact(report)
+        return
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    while not stopping.is_set():
+        try:
+            await compact(report)
+        except Exception as e:
+            print(f"Compaction failed: {e}")
+        try:
+            await asyncio.wait_for(stopping.wait(), settings.compaction_interval)
+        except asyncio.TimeoutError:
+            pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", action="store_true")
+    parser.add_argument("--report", action="store_true", help="print table and index sizes before and after")
+    args = parser.parse_args()
+    asyncio.run(main(args.once, args.report))
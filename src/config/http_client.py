@@ -0,0 +1,38 @@
+import httpx
+from typing import Optional
+from src.config.settings import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+def create_http_client(**options) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        settings.llm_read_timeout,
+        connect=settings.llm_connect_timeout,
+        pool=settings.llm_pool_timeout,
+    )
+    # http2 needs the optional `h2` package (pip install "httpx[http2]")
+    options = {"limits": limits, "timeout": timeout, "http2": settings.llm_http2, **options}
+    return httpx.AsyncClient(**options)
+
+async def init_http_client():
+    global _client
+    if _client is None:
+        _client = create_http_client()
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    # Created lazily for scripts and tests that run without the app lifespan
+    global _client
+    if _client is None:
+        _client = create_http_client()
+    return _client
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Counter, Gauge, Histogram
+from typing import Dict, Iterator, Optional
+import time
+
+# Stages of a chat turn: db_read, db_write, cache_read, cache_write, retrieval, summarize, window,
+# llm (whole call_llm, including cache and retries), llm_queue, llm_upstream, llm_first_token
+STAGE_SECONDS = Histogram(
+    "botgpt_stage_seconds", "Latency of chat-turn stages", ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_REQUEST_SECONDS = Histogram("botgpt_http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+# Keyed by key family: conversation (history list), conversations (per-user counts), user, users
+CACHE_LOOKUPS = Counter("botgpt_cache_lookups_total", "Redis cache lookups", ["cache", "result"])
+LOCAL_CACHE_LOOKUPS = Counter("botgpt_local_cache_lookups_total", "In-process cache tier lookups", ["cache", "result"])
+WEBSOCKET_SESSIONS = Gauge("botgpt_websocket_sessions", "Open WebSocket chat sessions")
+# Sessions of read-only routes by where they went: replica, primary (no healthy replica) or pinned (read-your-writes)
+DB_READ_SESSIONS = Counter("botgpt_db_read_sessions_total", "Database sessions opened for read-only routes", ["target"])
+# Chat turns whose LLM call failed with an unexpected error, by path: turn, stream (SSE) or socket
+LLM_FAILURES = Counter("botgpt_llm_failures_total", "Chat turns that failed in the LLM call", ["path"])
+DB_REPLICA_HEALTHY = Gauge("botgpt_db_replica_healthy", "Whether a read replica passes its health check", ["replica"])
+
+# Stage totals of the current request, when timing headers are on
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def observe(stage_name: str, seconds: float):
+    STAGE_SECONDS.labels(stage_name).observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage_name] = timings.get(stage_name, 0.0) + seconds
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage_name, time.perf_counter() - start)
+
+def record_cache_lookup(key: str, hit: bool):
+    CACHE_LOOKUPS.labels(key.split(":", 1)[0], "hit" if hit else "miss").inc()
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
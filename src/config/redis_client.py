@@ -1,9 +1,33 @@
-import redis
+import redis.asyncio as redis
+from typing import Optional
 from src.config.settings import settings
 
-def get_redis():
-    r = redis.from_url(settings.redis_url)
-    try:
-        yield r
-    finally:
-        r.close()
+_client: Optional[redis.Redis] = None
+
+def create_redis_client() -> redis.Redis:
+    pool = redis.ConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+    )
+    return redis.Redis(connection_pool=pool)
+
+async def init_redis():
+    global _client
+    if _client is None:
+        _client = create_redis_client()
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose(close_connection_pool=True)
+        _client = None
+
+def get_redis() -> redis.Redis:
+    # One client over a process-wide pool; created lazily outside the app lifespan
+    global _client
+    if _client is None:
+        _client = create_redis_client()
+    return _client
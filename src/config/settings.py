@@ -1,9 +1,150 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, List
 
 class Settings(BaseSettings):
     groq_api_key: str
     redis_url: str = "redis://localhost:6379"
     database_url: str
+    llm_base_url: str = "https://api.groq.com/openai/v1/chat/completions"
+    llm_model: str = "llama-3.1-8b-instant"
+
+    # Async engine connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    # Read replicas for the read-only routes (GET /conversations, /conversations/{id}, /users and
+    # /users/{id}), used round-robin while healthy: each is checked every db_replica_health_interval
+    # seconds and skipped while it does not answer within db_replica_health_timeout or (Postgres)
+    # replays more than db_replica_max_lag seconds behind. For db_read_your_writes_seconds after a
+    # conversation or user is written its reads stay on the primary, so keep that above the lag bound.
+    database_replica_urls: List[str] = []
+    db_replica_health_interval: float = 5.0
+    db_replica_health_timeout: float = 2.0
+    db_replica_max_lag: float = 5.0
+    db_read_your_writes_seconds: float = 10.0
+
+    # Process-wide Redis connection pool
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 5.0
+    redis_health_check_interval: int = 30
+
+    # Most recent messages read from the history cache as the LLM context window
+    history_window_messages: int = 100
+    # Prompt budget, counted with the configured tokenizer ("whitespace", "regex" or "module:Class")
+    context_token_budget: int = 4000
+    tokenizer: str = "regex"
+    # Rolling summary: once unsummarized history passes summary_trigger_tokens, the older part is folded
+    # into a stored per-conversation summary, keeping the newest summary_keep_tokens verbatim
+    conversation_summary: bool = False
+    summary_trigger_tokens: int = 2000
+    summary_keep_tokens: int = 800
+    summary_max_tokens: int = 300
+    # Grounded-mode retrieval: "bm25", "dense" or "hybrid" (reciprocal rank fusion of both)
+    rag_mode: str = "bm25"
+    rag_top_k: int = 3
+    embedder: str = "hashing"
+    embedding_dim: int = 256
+    vector_store_path: str = "data/vectors"
+
+    # JSON implementation for fast-path response bodies and JSON cache values: "json" (stdlib) or "orjson"
+    json_library: str = "json"
+    # Redis cache values (history entries, cached users, LLM replies): "json" or "msgpack", compressed
+    # with "zlib", "zstd" or "lz4" ("none" disables) once at least cache_compress_min_bytes long.
+    # Readers decode every format, so these can change on a running deployment.
+    cache_serializer: str = "json"
+    cache_compression: str = "none"
+    cache_compress_min_bytes: int = 1024
+
+    # In-process LRU tier in front of the Redis caches (users, counts, conversation histories), kept
+    # coherent across workers by invalidations on Redis pub/sub; local_cache_ttl bounds staleness
+    # if one is missed
+    local_cache: bool = False
+    local_cache_max_entries: int = 10000
+    local_cache_ttl: float = 30.0
+
+    # WebSocket chat: a socket with no message for ws_idle_timeout seconds is closed, as is one that
+    # does not take a frame within ws_send_timeout. Up to ws_max_pending_messages are read ahead of
+    # the turn in progress; past that the socket is not read until a turn finishes.
+    ws_idle_timeout: float = 300.0
+    ws_send_timeout: float = 10.0
+    ws_max_pending_messages: int = 4
+
+    # Cold storage: `python -m src.compaction` moves the messages of archived conversations, and of
+    # deleted ones after compaction_deleted_retention_days, into one compressed conversation_archives
+    # row each, every compaction_interval seconds. It takes compaction_batch_conversations
+    # conversations per query and deletes compaction_batch_messages rows per transaction.
+    compaction_interval: float = 3600.0
+    compaction_deleted_retention_days: int = 30
+    compaction_batch_conversations: int = 100
+    compaction_batch_messages: int = 1000
+    archive_compression: str = "zlib"
+
+    # Document uploads: text is normalized and packed into chunks of ingest_chunk_min_tokens to
+    # ingest_chunk_max_tokens, ingest_batch_bytes at a time, in ingest_processes worker processes
+    # (0 = inline on the event loop)
+    ingest_chunk_min_tokens: int = 500
+    ingest_chunk_max_tokens: int = 800
+    ingest_batch_bytes: int = 1048576
+    ingest_processes: int = 2
+    ingest_max_bytes: int = 104857600
+
+    # Bulk import (POST /import, `python -m src.bulk_import`): NDJSON records are written
+    # import_batch_records at a time, each batch one transaction that also advances the run's
+    # checkpoint. Afterwards the history caches of up to import_warm_conversations of the imported
+    # active conversations are filled. Invalid records are skipped; the first import_max_errors
+    # are reported.
+    import_batch_records: int = 5000
+    import_warm_conversations: int = 1000
+    import_max_errors: int = 100
+
+    # Opt-in cache of LLM replies keyed by model + prompt window (can be disabled per conversation)
+    llm_response_cache: bool = False
+    llm_response_cache_ttl: int = 3600
+    llm_response_cache_max_entries: int = 10000
+
+    # Outbound LLM scheduler: budgets (0 = unlimited), queue bound, retries and circuit breaker
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0
+    llm_queue_max: int = 100
+    llm_max_retries: int = 3
+    llm_backoff_base: float = 0.5
+    llm_backoff_max: float = 20.0
+    llm_breaker_threshold: int = 5
+    llm_breaker_cooldown: float = 30.0
+
+    # Shared outbound HTTP client for LLM calls
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry: float = 30.0
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 60.0
+    llm_pool_timeout: float = 10.0
+    llm_http2: bool = False
+
+    # LLM providers as a JSON list of {"name", "base_url", "model", "api_key", "weight"}; model and
+    # api_key default to llm_model and groq_api_key. Empty means the single llm_base_url endpoint.
+    llm_providers: List[Dict] = []
+    # Hedging: a call the chosen provider has not answered within its llm_hedge_percentile latency
+    # (llm_hedge_initial_delay until it has llm_hedge_min_samples) is also sent to the next provider.
+    # llm_hedge_budget caps the duplicates at that fraction of calls.
+    llm_hedge: bool = False
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_samples: int = 20
+    llm_hedge_initial_delay: float = 2.0
+    llm_hedge_budget: float = 0.05
+
+    # Add a Server-Timing header with per-stage durations to every response (stage histograms are always on)
+    timing_headers: bool = False
+
+    # Background chat turns (202 Accepted): "local" (in-process queue) or "redis" (Redis Streams).
+    # turn_workers is the number of worker tasks started with the API; 0 leaves them to `python -m src.worker`.
+    turn_queue_backend: str = "local"
+    turn_workers: int = 4
+    turn_result_ttl: int = 3600
+    turn_claim_idle_ms: int = 60000  # pending turns idle this long are redelivered to another worker
+    turn_max_deliveries: int = 3
+    turn_lease_ms: int = 30000  # a running turn's lease; renewed while it runs, so only a dead worker's expires
 
     class Config:
         env_file = ".env"
@@ -1,15 +1,71 @@
-from fastapi import FastAPI
-from src.models import Base, engine
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from src.config.http_client import init_http_client, close_http_client
+from src.config.metrics import HTTP_REQUEST_SECONDS, request_timings, server_timing
+from src.config.redis_client import init_redis, close_redis, get_redis
+from src.config.settings import settings
+from src.models import Base, engine, get_replica_set
+from src.routes.chat_socket import router as chat_socket_router
 from src.routes.conversations import router as conversations_router
+from src.routes.documents import router as documents_router
+from src.routes.imports import router as imports_router
 from src.routes.users import router as users_router
+from src.routes.llm import router as llm_router
+from src.routes.metrics import router as metrics_router
+from src.routes.turns import router as turns_router
+from src.services.tiered_cache import InvalidationListener, get_local_cache
+from src.services.turn_queue import get_turn_queue
+import time
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="BOT GPT Backend", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_redis()
+    await init_http_client()
+    listener = InvalidationListener(get_redis(), get_local_cache()) if get_local_cache() is not None else None
+    if listener:
+        await listener.start()
+    if settings.turn_workers:
+        await get_turn_queue().start(settings.turn_workers)
+    replicas = get_replica_set()
+    if replicas:
+        await replicas.start()
+    yield
+    if replicas:
+        await replicas.stop()
+    await get_turn_queue().stop()
+    if listener:
+        await listener.stop()
+    await close_http_client()
+    await close_redis()
+
+app = FastAPI(title="BOT GPT Backend", version="1.0.0", lifespan=lifespan)
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    timings = {} if settings.timing_headers else None
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", str(response.status_code)).observe(time.perf_counter() - start)
+    if timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
 
 app.include_router(conversations_router, prefix="/api/v1", tags=["Conversations"])
 app.include_router(users_router, prefix="/api/v1", tags=["Users"])
+app.include_router(documents_router, prefix="/api/v1", tags=["Documents"])
+app.include_router(chat_socket_router, prefix="/api/v1", tags=["Conversations"])
+app.include_router(imports_router, prefix="/api/v1", tags=["Import"])
+app.include_router(llm_router, prefix="/api/v1", tags=["LLM"])
+app.include_router(turns_router, prefix="/api/v1", tags=["Turns"])
+app.include_router(metrics_router)
 
 @app.get("/")
 def root():
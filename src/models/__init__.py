@@ -1,6 +1,7 @@
-from .database import Base, engine, get_db
-from .models import User, Conversation, Message, Document, ChatMode, ConversationState
+from .database import Base, engine, get_db, async_engine, AsyncSessionLocal, get_async_db
+from .replicas import get_read_db, get_replica_set, pin_primary
+from .models import User, Conversation, Message, ConversationArchive, ImportCheckpoint, Document, DocumentChunk, ChunkPosting, ChatMode, ConversationState
 
 __all__ = [
-    Base, engine, get_db, User, Conversation, Message, Document, ChatMode, ConversationState
-]
\ No newline at end of file
+    Base, engine, get_db, async_engine, AsyncSessionLocal, get_async_db, get_read_db, get_replica_set, pin_primary, User, Conversation, Message, ConversationArchive, ImportCheckpoint, Document, DocumentChunk, ChunkPosting, ChatMode, ConversationState
+]
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Boolean, LargeBinary
+from sqlalchemy import Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, true as sa_true
 from sqlalchemy import Enum as SQLEnum
 from .database import Base
 import enum
@@ -26,6 +28,10 @@ class User(Base):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Serves GET /conversations: one range scan per page, newest first
+        Index("ix_conversations_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -49,8 +55,17 @@ class Conversation(Base):
         default=ConversationState.ACTIVE,
         nullable=False,
     )
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Allow replies to come from the shared LLM response cache (when it is enabled)
+    cache_responses = Column(Boolean, default=True, server_default=sa_true(), nullable=False)
+    # Rolling summary of the messages up to and including summary_through_id
+    summary = Column(Text, nullable=True)
+    summary_through_id = Column(Integer, nullable=True)
+    # created_at is a keyset pagination key. SQLite's CURRENT_TIMESTAMP has no fractional seconds,
+    # so bound values are written the same way or row comparisons against a cursor would misorder.
+    created_at = Column(DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite"), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # The source system's id for conversations brought in by a bulk import (NULL otherwise)
+    external_id = Column(String, nullable=True, unique=True, index=True)
 
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
@@ -58,6 +73,10 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    # Serves history range reads (since_id / before_id) in timeline order
+    __table_args__ = (Index("ix_messages_conversation_timestamp_id", "conversation_id", "timestamp", "id"),)
+    # Fetch server-side timestamps on insert so written messages can be cached without a refresh
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -65,15 +84,72 @@ class Message(Base):
     content = Column(Text)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     tokens_used = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True)  # Tokenizer count of content, computed once on write
+    # "{turn id}:user" / "{turn id}:assistant" for turns run by a worker, so a redelivered turn is saved once
+    idempotency_key = Column(String, nullable=True, unique=True, index=True)
 
     conversation = relationship("Conversation", back_populates="messages")
 
+class ConversationArchive(Base):
+    # Cold storage: the messages of an archived (or long-deleted) conversation, moved out of
+    # `messages` by the compaction job into one compressed blob of history entries
+    __tablename__ = "conversation_archives"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)  # Messages up to this id are in `data`
+    data = Column(LargeBinary, nullable=False)  # Encoded with the cache codec (see services/codec.py)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ImportCheckpoint(Base):
+    # Progress of a named bulk import: its NDJSON records up to `line` are committed, so a rerun
+    # under the same name resumes after it (see services/import_service.py)
+    __tablename__ = "import_checkpoints"
+
+    name = Column(String, primary_key=True)
+    line = Column(Integer, default=0, nullable=False)
+    users = Column(Integer, default=0, nullable=False)
+    conversations = Column(Integer, default=0, nullable=False)
+    messages = Column(Integer, default=0, nullable=False)
+    errors = Column(Integer, default=0, nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Document(Base):
     __tablename__ = "documents"
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
     name = Column(String)
-    content = Column(Text)  # Chunked content for RAG
+    content = Column(Text)  # Chunked content for RAG (NULL for uploads, which are stored as chunks only)
+    # Inverted-index statistics, set when the document is indexed (NULL = not indexed yet)
+    chunk_count = Column(Integer, nullable=True)
+    total_length = Column(Integer, nullable=True)
+    # Upload progress: "ingesting" while the body streams in, then "ready" or "failed"
+    status = Column(String, default="ready", server_default="ready", nullable=False)
+    bytes_received = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    conversation = relationship("Conversation", back_populates="documents")
+    chunks = relationship("DocumentChunk", back_populates="document")
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    position = Column(Integer)
+    content = Column(Text)
+    length = Column(Integer)  # Number of index terms
+
+    document = relationship("Document", back_populates="chunks")
+
+class ChunkPosting(Base):
+    # One row per (term, chunk); chunk_length is denormalized so BM25 needs no chunk lookup
+    __tablename__ = "chunk_postings"
 
-    conversation = relationship("Conversation", back_populates="documents")
\ No newline at end of file
+    term = Column(String, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), primary_key=True)
+    chunk_id = Column(Integer, ForeignKey("document_chunks.id"), primary_key=True)
+    term_frequency = Column(Integer)
+    chunk_length = Column(Integer)
\ No newline at end of file
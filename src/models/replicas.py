@@ -0,0 +1,173 @@
+from fastapi import Depends, Request
+from functools import lru_cache
+from sqlalchemy import make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from src.config.metrics import DB_READ_SESSIONS, DB_REPLICA_HEALTHY
+from src.config.redis_client import get_redis
+from src.config.settings import settings
+from .database import AsyncSessionLocal, async_engine, async_engine_kwargs, to_async_url
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import itertools
+import redis.asyncio as redis
+
+# Seconds a replica's replay is behind the primary. A standby that has replayed all it received
+# is current however old its last transaction; a server not in recovery is its own primary.
+LAG_QUERIES = {
+    "postgresql": "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                  "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END",
+}
+
+class ReplicaSession(AsyncSession):
+    # Session on a replica that moves to the primary when a statement fails there: the replica
+    # is marked down and the statement, and the rest of the session, run on the primary instead.
+    # Objects loaded so far are detached rather than expired, so they stay readable.
+    replica: "Replica"
+    replica_set: "ReplicaSet"
+
+    async def _fallback(self, method, *args, **kwargs):
+        try:
+            return await method(*args, **kwargs)
+        except DBAPIError as e:
+            if self.sync_session.bind is async_engine.sync_engine:
+                raise
+            self.replica_set.mark_down(self.replica, e)
+            self.expunge_all()
+            await self.rollback()
+            self.bind, self.sync_session.bind = async_engine, async_engine.sync_engine
+            self.replica_set.metrics["fallbacks"] += 1
+            return await method(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._fallback(super().execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._fallback(super().scalar, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._fallback(super().get, *args, **kwargs)
+
+class Replica:
+    def __init__(self, url: str):
+        async_url = to_async_url(url)
+        self.name = make_url(async_url).render_as_string(hide_password=True)
+        self.engine = create_async_engine(async_url, **async_engine_kwargs(async_url))
+        self.sessionmaker = async_sessionmaker(self.engine, class_=ReplicaSession, autoflush=False, expire_on_commit=False)
+        # Unused until its first health check passes
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+
+class ReplicaSet:
+    # The read replicas behind get_read_db. A monitor task checks each one every
+    # db_replica_health_interval seconds; a replica is used while it answers within
+    # db_replica_health_timeout and is at most db_replica_max_lag seconds behind. A query that
+    # fails on a replica takes it out of rotation until its next passing check, and is retried
+    # on the primary (see ReplicaSession).
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._next = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"replica": 0, "primary": 0, "pinned": 0, "failures": 0, "fallbacks": 0}
+
+    def stats(self) -> Dict:
+        return {**self.metrics, "replicas": [{"name": r.name, "healthy": r.healthy, "lag": r.lag, "error": r.error} for r in self.replicas]}
+
+    def _set_health(self, replica: Replica, healthy: bool, error: Optional[str] = None):
+        replica.healthy, replica.error = healthy, error
+        DB_REPLICA_HEALTHY.labels(replica.name).set(1 if healthy else 0)
+
+    async def check(self, replica: Replica):
+        try:
+            async with asyncio.timeout(settings.db_replica_health_timeout):
+                async with replica.engine.connect() as conn:
+                    replica.lag = float(await conn.scalar(text(LAG_QUERIES.get(conn.dialect.name, "SELECT 0"))) or 0)
+        except Exception as e:
+            self._set_health(replica, False, str(e) or type(e).__name__)
+            return
+        if replica.lag > settings.db_replica_max_lag:
+            self._set_health(replica, False, f"{replica.lag:.1f}s behind the primary")
+        else:
+            self._set_health(replica, True)
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(settings.db_replica_health_interval)
+            await self.check_all()
+
+    async def start(self):
+        # The first check runs before the app serves, so healthy replicas take reads from the start
+        await self.check_all()
+        self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def choose(self) -> Optional[Replica]:
+        # Round-robin over the healthy replicas; None sends the read to the primary
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        return healthy[next(self._next) % len(healthy)] if healthy else None
+
+    def mark_down(self, replica: Replica, error: Exception):
+        self.metrics["failures"] += 1
+        self._set_health(replica, False, str(error))
+
+@lru_cache(maxsize=None)
+def get_replica_set() -> Optional[ReplicaSet]:
+    if not settings.database_replica_urls:
+        return None
+    return ReplicaSet(settings.database_replica_urls)
+
+def pin_key(scope: str) -> str:
+    return f"primary:{scope}"
+
+async def pin_primary(redis_client: redis.Redis, *scopes: str):
+    # Read-your-writes: after writing a conversation ("conversation:{id}") or user ("user:{id}"),
+    # its reads stay on the primary until replicas have had db_read_your_writes_seconds to catch up
+    if get_replica_set() is None or settings.db_read_your_writes_seconds <= 0:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for scope in scopes:
+            pipe.set(pin_key(scope), 1, px=int(settings.db_read_your_writes_seconds * 1000))
+        await pipe.execute()
+
+async def primary_pinned(redis_client: redis.Redis, scopes: List[str]) -> bool:
+    return bool(scopes) and await redis_client.exists(*[pin_key(scope) for scope in scopes]) > 0
+
+def read_scopes(request: Request) -> List[str]:
+    # What a read-only route reads, from its path and query: the conversation and/or user
+    scopes = []
+    if "conversation_id" in request.path_params:
+        scopes.append(f"conversation:{request.path_params['conversation_id']}")
+    user_id = request.path_params.get("user_id", request.query_params.get("user_id"))
+    if user_id is not None:
+        scopes.append(f"user:{user_id}")
+    return scopes
+
+async def get_read_db(request: Request, redis_client: redis.Redis = Depends(get_redis)) -> AsyncIterator[AsyncSession]:
+    # Session for read-only routes: on a healthy replica, unless there is none or what the route
+    # reads was written within db_read_your_writes_seconds. Without replicas, the primary's.
+    replicas = get_replica_set()
+    replica = replicas.choose() if replicas is not None else None
+    target = "replica" if replica is not None else "primary"
+    if replica is not None and await primary_pinned(redis_client, read_scopes(request)):
+        replica, target = None, "pinned"
+    if replicas is not None:
+        replicas.metrics[target] += 1
+        DB_READ_SESSIONS.labels(target).inc()
+    if replica is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    async with replica.sessionmaker() as db:
+        db.replica, db.replica_set = replica, replicas
+        yield db
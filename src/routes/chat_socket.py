@@ -0,0 +1,113 @@
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.metrics import LLM_FAILURES, WEBSOCKET_SESSIONS
+from src.config.redis_client import get_redis
+from src.config.settings import settings
+from src.models import get_async_db
+from src.services.chat_session import ChatSession
+from src.services.codec import get_json_serializer
+from src.services.llm_scheduler import LLMRateLimitError, LLMUnavailableError
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import math
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Application close codes: the conversation is missing or no longer active; the client stopped reading
+CLOSE_NOT_FOUND = 4404
+CLOSE_SLOW_CONSUMER = 4408
+
+class SocketMessage(BaseModel):
+    message: str
+    document_ids: Optional[List[int]] = None
+
+class SlowConsumer(Exception):
+    pass
+
+async def send(websocket: WebSocket, frame: Dict):
+    # A client that does not take a frame within ws_send_timeout is dropped rather than letting
+    # its unsent tokens pile up while the upstream stream stays open. (asyncio.timeout, unlike
+    # wait_for, does not start a task per frame.)
+    try:
+        async with asyncio.timeout(settings.ws_send_timeout):
+            await websocket.send_text(get_json_serializer().dumps(frame).decode())
+    except TimeoutError:
+        raise SlowConsumer()
+
+async def receive_messages(websocket: WebSocket, inbox: asyncio.Queue):
+    # Reads ahead of the turn in progress into a bounded queue. Once it is full the socket is not
+    # read until a turn finishes, so a client sending faster than turns complete is held back by TCP.
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                await inbox.put(SocketMessage.model_validate_json(text))
+            except ValidationError as e:
+                await inbox.put({"type": "error", "detail": json.loads(e.json(include_url=False))})
+    except WebSocketDisconnect:
+        await inbox.put(None)
+
+async def run_turn(websocket: WebSocket, session: ChatSession, request: SocketMessage) -> bool:
+    # Streams one turn to the socket; returns False if the session can not go on
+    try:
+        async with aclosing(session.turn(request.message, request.document_ids)) as events:
+            async for event in events:
+                await send(websocket, {"type": "delta", **event} if "delta" in event else {"type": "done", **event})
+    except ValueError as e:
+        await send(websocket, {"type": "error", "detail": str(e)})
+        await websocket.close(code=CLOSE_NOT_FOUND, reason=str(e))
+        return False
+    except LLMUnavailableError as e:
+        await send(websocket, {"type": "error", "detail": str(e), "retry_after": math.ceil(e.retry_after)})
+    except LLMRateLimitError as e:
+        await send(websocket, {"type": "error", "detail": str(e), "retry_after": math.ceil(e.retry_after or 1)})
+    except (SlowConsumer, WebSocketDisconnect):
+        raise
+    except Exception as e:
+        LLM_FAILURES.labels("socket").inc()
+        logger.exception("LLM failed on conversation socket %s", session.conversation_id)
+        await send(websocket, {"type": "error", "detail": str(e)})
+    return True
+
+@router.websocket("/ws/conversations/{conversation_id}")
+async def conversation_socket(websocket: WebSocket, conversation_id: int, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
+    # Client frames: {"message": str, "document_ids": [int]}. Server frames: "ready" once the
+    # conversation is loaded, then per message "delta"s and a "done" (or an "error").
+    await websocket.accept()
+    try:
+        session = await ChatSession.open(db, redis_client, conversation_id)
+    except ValueError as e:
+        await websocket.close(code=CLOSE_NOT_FOUND, reason=str(e))
+        return
+
+    WEBSOCKET_SESSIONS.inc()
+    inbox = asyncio.Queue(settings.ws_max_pending_messages)
+    reader = asyncio.create_task(receive_messages(websocket, inbox))
+    try:
+        await send(websocket, {"type": "ready", "conversation_id": conversation_id, "messages": len(session.history)})
+        while True:
+            try:
+                request = await asyncio.wait_for(inbox.get(), settings.ws_idle_timeout)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1000, reason="Idle timeout")
+                return
+            if request is None:
+                return
+            if isinstance(request, dict):
+                await send(websocket, request)
+            elif not await run_turn(websocket, session, request):
+                return
+    except SlowConsumer:
+        await websocket.close(code=CLOSE_SLOW_CONSUMER, reason="Client is not reading")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        WEBSOCKET_SESSIONS.dec()
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.metrics import LLM_FAILURES
 from src.config.redis_client import get_redis
-from src.models import get_db, ChatMode
+from src.models import get_async_db, get_read_db, ChatMode
+from src.routes.responses import FastJSONResponse
 from src.services.conversation_service import ConversationService
+from src.services.llm_scheduler import LLMRateLimitError, LLMUnavailableError
+from src.services.turn_queue import get_turn_queue
 from pydantic import BaseModel
-from typing import List, Optional
-import redis
+from typing import AsyncIterator, Dict, List, Optional
+import redis.asyncio as redis
+import json
+import logging
+import math
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 class CreateConversationRequest(BaseModel):
@@ -14,48 +23,92 @@ class CreateConversationRequest(BaseModel):
     first_message: str
     mode: ChatMode = ChatMode.OPEN
     document_ids: Optional[List[int]] = None
+    cache_responses: bool = True
 
 class AddMessageRequest(BaseModel):
     message: str
     document_ids: Optional[List[int]] = None
+    stream: bool = False
+    # Queue the turn and answer 202 with a turn id instead of waiting for the reply
+    background: bool = False
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def sse_stream(events: AsyncIterator[Dict]) -> AsyncIterator[str]:
+    try:
+        async for event in events:
+            yield sse_event(event) if "delta" in event else sse_event(event, "done")
+    except (LLMUnavailableError, LLMRateLimitError) as e:
+        yield sse_event({"detail": str(e)}, "error")
+    except Exception as e:
+        LLM_FAILURES.labels("stream").inc()
+        logger.exception("LLM failed while streaming a reply")
+        yield sse_event({"detail": str(e)}, "error")
 
 @router.post("/conversations", response_model=dict)
-async def create_conversation(request: CreateConversationRequest, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
+async def create_conversation(request: CreateConversationRequest, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
     try:
         service = ConversationService(db, redis_client)
-        conversation = await service.create_conversation(request.user_id, request.first_message, request.mode, request.document_ids)
+        conversation = await service.create_conversation(request.user_id, request.first_message, request.mode, request.document_ids, request.cache_responses)
         return {"conversation_id": conversation.id}
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except LLMRateLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after or 1))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/conversations", response_model=dict)
-def list_conversations(user_id: int, page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
-    service = ConversationService(db, redis_client)
-    return service.list_conversations(user_id, page, limit)
+async def list_conversations(user_id: int, cursor: Optional[str] = None, limit: int = Query(10, ge=1, le=100), include_total: bool = False, page: Optional[int] = Query(None, ge=1), db: AsyncSession = Depends(get_read_db), redis_client: redis.Redis = Depends(get_redis)):
+    try:
+        service = ConversationService(db, redis_client)
+        return FastJSONResponse(await service.list_conversations(user_id, cursor, limit, include_total, page))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/conversations/{conversation_id}", response_model=List[dict])
-def get_conversation_history(conversation_id: int, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
-    service = ConversationService(db, redis_client)
-    return service.get_conversation_history(conversation_id)
+async def get_conversation_history(conversation_id: int, since_id: Optional[int] = None, before_id: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=1000), if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_read_db), redis_client: redis.Redis = Depends(get_redis)):
+    try:
+        service = ConversationService(db, redis_client)
+        etag = await service.history_etag(conversation_id, since_id, before_id, limit)
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+        history = await service.get_conversation_history(conversation_id, since_id, before_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FastJSONResponse(history, headers={"ETag": etag})
 
 @router.post("/conversations/{conversation_id}/messages", response_model=dict)
-async def add_message(conversation_id: int, request: AddMessageRequest, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
+async def add_message(conversation_id: int, request: AddMessageRequest, http_request: Request, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
     try:
         service = ConversationService(db, redis_client)
+        if request.background:
+            await service.get_active_conversation(conversation_id)
+            turn_id = await get_turn_queue().submit(conversation_id, request.message, request.document_ids)
+            return JSONResponse(status_code=202, content={"turn_id": turn_id, "status": "queued"}, headers={"Location": str(http_request.url_for("get_turn", turn_id=turn_id))})
+        if request.stream:
+            events = await service.stream_message(conversation_id, request.message, request.document_ids)
+            return StreamingResponse(sse_stream(events), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
         return await service.add_message(conversation_id, request.message, request.document_ids)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except LLMRateLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after or 1))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/conversations/{conversation_id}")
-def delete_conversation(conversation_id: int, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
+async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
     service = ConversationService(db, redis_client)
-    service.delete_conversation(conversation_id)
+    await service.delete_conversation(conversation_id)
     return {"message": "Conversation deleted"}
 
 @router.patch("/conversations/{conversation_id}/archive")
-def archive_conversation(conversation_id: int, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
+async def archive_conversation(conversation_id: int, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
     service = ConversationService(db, redis_client)
-    service.archive_conversation(conversation_id)
+    await service.archive_conversation(conversation_id)
     return {"message": "Conversation archived"}
\ No newline at end of file
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.settings import settings
+from src.models import get_async_db
+from src.services.ingestion_service import DocumentTooLargeError, IngestionService
+from starlette.requests import ClientDisconnect
+from typing import Dict, List
+
+router = APIRouter()
+
+@router.post("/conversations/{conversation_id}/documents", status_code=201, response_model=dict)
+async def upload_document(conversation_id: int, request: Request, name: str = Query(..., min_length=1), db: AsyncSession = Depends(get_async_db)):
+    # The raw request body is the document (UTF-8 text); it is chunked and indexed as it streams
+    # in, never held whole in memory. GET /documents/{id} reports progress while this runs.
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.ingest_max_bytes:
+        raise HTTPException(status_code=413, detail=f"Document is larger than {settings.ingest_max_bytes} bytes")
+    service = IngestionService(db)
+    try:
+        document = await service.create_document(conversation_id, name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        await service.ingest(document, request.stream())
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ClientDisconnect:
+        raise HTTPException(status_code=400, detail="Upload was interrupted")
+    return JSONResponse(IngestionService.status(document), status_code=201, headers={"Location": f"/api/v1/documents/{document.id}"})
+
+@router.get("/documents/{document_id}", response_model=dict)
+async def get_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return IngestionService.status(await IngestionService(db).get_document(document_id))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/conversations/{conversation_id}/documents", response_model=List[Dict])
+async def list_documents(conversation_id: int, db: AsyncSession = Depends(get_async_db)):
+    return [IngestionService.status(document) for document in await IngestionService(db).list_documents(conversation_id)]
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.redis_client import get_redis
+from src.models import get_async_db
+from src.services.import_service import ImportService
+from starlette.requests import ClientDisconnect
+import redis.asyncio as redis
+
+router = APIRouter()
+
+@router.post("/import", response_model=dict)
+async def bulk_import(request: Request, name: str = Query(..., min_length=1), db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
+    # The raw request body is NDJSON (user, conversation and message records), written in batches
+    # as it streams in. After a failure, send the same body under the same name: the import
+    # resumes after its last committed batch (GET /import/{name} shows how far it got).
+    try:
+        return await ImportService(db, redis_client).run(name, request.stream())
+    except ClientDisconnect:
+        raise HTTPException(status_code=400, detail="Import was interrupted; send it again under the same name to resume")
+
+@router.get("/import/{name}", response_model=dict)
+async def get_import(name: str, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
+    checkpoint = await ImportService(db, redis_client).get_checkpoint(name)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return ImportService.checkpoint_dict(checkpoint)
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from src.config.redis_client import get_redis
+from src.services.llm_providers import get_provider_router
+from src.services.llm_scheduler import get_llm_scheduler
+from src.services.response_cache import ResponseCache
+import redis.asyncio as redis
+
+router = APIRouter()
+
+@router.get("/llm/response-cache", response_model=dict)
+async def response_cache_stats(redis_client: redis.Redis = Depends(get_redis)):
+    return await ResponseCache(redis_client).stats()
+
+@router.get("/llm/scheduler", response_model=dict)
+async def scheduler_stats():
+    return get_llm_scheduler().stats()
+
+@router.get("/llm/providers", response_model=dict)
+async def provider_stats():
+    return get_provider_router().stats()
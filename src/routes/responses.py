@@ -0,0 +1,10 @@
+from fastapi.responses import JSONResponse
+from src.services.codec import get_json_serializer
+from typing import Any
+
+class FastJSONResponse(JSONResponse):
+    # For read paths whose content is already JSON-safe (dicts and lists of str, int, float, bool,
+    # None). Returning it skips FastAPI's response_model validation and jsonable_encoder pass;
+    # the response_model on the route still documents the shape.
+    def render(self, content: Any) -> bytes:
+        return get_json_serializer().dumps(content)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, HTTPException, Query
+from src.services.turn_queue import get_turn_queue
+
+router = APIRouter()
+
+@router.get("/turns/{turn_id}", response_model=dict)
+async def get_turn(turn_id: str, wait: float = Query(0, ge=0, le=30)):
+    # wait > 0 long-polls: the request returns as soon as the turn finishes (via Redis pub/sub)
+    queue = get_turn_queue()
+    turn = await queue.wait(turn_id, wait) if wait else await queue.get(turn_id)
+    if turn is None:
+        raise HTTPException(status_code=404, detail="Turn not found")
+    return turn
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from src.models import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import get_async_db, get_read_db
+from src.routes.responses import FastJSONResponse
 from src.config.redis_client import get_redis
 from src.services.user_service import UserService
 from pydantic import BaseModel
-from typing import List
-import redis
+from typing import List, Optional
+import redis.asyncio as redis
 
 router = APIRouter()
 
@@ -22,10 +23,10 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 @router.post("/users", response_model=UserResponse, tags=["Users"])
-def create_user(request: CreateUserRequest, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
+async def create_user(request: CreateUserRequest, db: AsyncSession = Depends(get_async_db), redis_client: redis.Redis = Depends(get_redis)):
     try:
         service = UserService(db, redis_client)
-        user = service.create_user(username=request.username, email=request.email)
+        user = await service.create_user(username=request.username, email=request.email)
         return user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -33,15 +34,26 @@ def create_user(request: CreateUserRequest, db: Session = Depends(get_db), redis
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/users/{user_id}", response_model=UserResponse, tags=["Users"])
-def get_user(user_id: int, db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db), redis_client: redis.Redis = Depends(get_redis)):
     try:
         service = UserService(db, redis_client)
-        user = service.get_user(user_id)
+        user = await service.get_user(user_id)
         return user
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 @router.get("/users", response_model=List[UserResponse], tags=["Users"])
-def list_users(db: Session = Depends(get_db), redis_client: redis.Redis = Depends(get_redis)):
-    service = UserService(db, redis_client)
-    return service.list_users()
+async def list_users(cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1, le=500), include_total: bool = False, db: AsyncSession = Depends(get_read_db), redis_client: redis.Redis = Depends(get_redis)):
+    # The body stays a plain list; paging state travels in headers. Without cursor or limit
+    # it is every user, as before paging (cached until a user is added); X-Next-Cursor is set whenever more follow.
+    try:
+        service = UserService(db, redis_client)
+        page = await service.list_users(cursor, limit, include_total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {}
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    if include_total:
+        headers["X-Total-Count"] = str(page["total"])
+    return FastJSONResponse([{"id": u["id"], "username": u["username"], "email": u["email"]} for u in page["users"]], headers=headers)
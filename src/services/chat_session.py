@@ -0,0 +1,61 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from src.config.settings import settings
+from src.models import Conversation
+from src.services.conversation_service import ConversationService
+from src.services.llm_service import LLMService
+from typing import AsyncIterator, Dict, List, Optional
+import redis.asyncio as redis
+
+class ChatSession:
+    # A conversation held open by one WebSocket connection. The conversation row and its history
+    # window are loaded once; each turn extends the window in memory and writes through to the DB
+    # and the history cache. Instead of the conversation lookup and history read of a REST turn,
+    # a turn starts with one Redis GET of the history version, and only reloads when a turn sent
+    # from elsewhere (REST, another socket) has moved it.
+    def __init__(self, service: ConversationService, conversation_id: int):
+        self.service = service
+        self.conversation_id = conversation_id
+        self.conversation: Optional[Conversation] = None
+        self.history: List[Dict] = []
+        self.version: Optional[int] = None
+        self.metrics = {"turns": 0, "reloads": 0}
+
+    @classmethod
+    async def open(cls, db: AsyncSession, redis_client: redis.Redis, conversation_id: int, llm_service: Optional[LLMService] = None) -> "ChatSession":
+        session = cls(ConversationService(db, redis_client, llm_service), conversation_id)
+        await session.load()
+        return session
+
+    async def load(self):
+        # The version is read first: an append racing with the load shows up as a mismatch next turn
+        self.version = await self.service.history_cache.version(self.conversation_id)
+        self.conversation, self.history = await self.service.load_context(self.conversation_id)
+        await self.service.db.commit()
+
+    def _extend(self, entries: List[Dict], summary: Optional[Dict]):
+        self.history += [{"id": e["id"], "role": e["role"], "content": e["content"], "token_count": e["token_count"]} for e in entries]
+        # Same bounds as a fresh load: the newest messages within the token budget and the cache window
+        self.history = self.service.llm_service.context_window(self.history, settings.context_token_budget)[-settings.history_window_messages:]
+        if summary:
+            # Already written by commit_turn; set without marking the row dirty
+            set_committed_value(self.conversation, "summary", summary["summary"])
+            set_committed_value(self.conversation, "summary_through_id", summary["summary_through_id"])
+
+    async def turn(self, user_message: str, document_ids: Optional[List[int]] = None) -> AsyncIterator[Dict]:
+        # Same events as ConversationService.stream_message: {"delta": str}s, then the turn result.
+        # Closing the generator mid-stream persists nothing, as with a dropped SSE client.
+        if await self.service.history_cache.version(self.conversation_id) != self.version:
+            self.metrics["reloads"] += 1
+            await self.load()
+        turn = await self.service.prepare_turn(self.conversation, list(self.history), user_message, document_ids)
+        async for event in self.service.llm_service.stream_llm(turn["prompt"]):
+            if "delta" in event:
+                yield event
+                continue
+            result, entries, version = await self.service.commit_turn(self.conversation_id, turn, event)
+            self._extend(entries, turn["summary"])
+            # Anything other than our own increment means another writer appended in between
+            self.version = version if version == self.version + 1 else None
+            self.metrics["turns"] += 1
+            yield result
@@ -0,0 +1,147 @@
+from functools import lru_cache
+from src.config.settings import settings
+from typing import Any, Optional
+import json
+import zlib
+
+# Redis values written as uncompressed JSON stay plain JSON text, as they were before codecs
+# existed. Anything else starts with a 3-byte header: 0x00, format id, compressor id. JSON text
+# never starts with 0x00, so readers tell the two apart and decode whatever a replica with
+# different settings wrote.
+MAGIC = 0
+JSON_FORMAT = 1
+MSGPACK_FORMAT = 2
+
+class JSONSerializer:
+    # Default json.dumps options: the C encoder's fastest path, and the bytes cache values always had
+    format_id = JSON_FORMAT
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+class ORJSONSerializer:
+    # Same bytes on the wire as JSONSerializer, several times faster; needs `pip install orjson`
+    format_id = JSON_FORMAT
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def dumps(self, value: Any) -> bytes:
+        return self.orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return self.orjson.loads(data)
+
+class MsgpackSerializer:
+    # Needs `pip install msgpack`
+    format_id = MSGPACK_FORMAT
+
+    def __init__(self):
+        import msgpack
+        self.msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes:
+        return self.msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self.msgpack.unpackb(data, raw=False)
+
+class ZlibCompressor:
+    id = 1
+
+    def __init__(self, level: int = 1):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+class ZstdCompressor:
+    # Needs `pip install zstandard`
+    id = 2
+
+    def __init__(self, level: int = 3):
+        import zstandard
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data)
+
+class LZ4Compressor:
+    # Needs `pip install lz4`
+    id = 3
+
+    def __init__(self):
+        import lz4.frame
+        self.frame = lz4.frame
+
+    def compress(self, data: bytes) -> bytes:
+        return self.frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.frame.decompress(data)
+
+JSON_LIBRARIES = {"json": JSONSerializer, "orjson": ORJSONSerializer}
+COMPRESSORS = {"zlib": ZlibCompressor, "zstd": ZstdCompressor, "lz4": LZ4Compressor}
+COMPRESSOR_IDS = {cls.id: name for name, cls in COMPRESSORS.items()}
+
+@lru_cache(maxsize=None)
+def get_json_serializer(name: Optional[str] = None):
+    return JSON_LIBRARIES[name or settings.json_library]()
+
+@lru_cache(maxsize=None)
+def _compressor(name: str):
+    return COMPRESSORS[name]()
+
+class Codec:
+    def __init__(self, serializer: Optional[str] = None, compression: Optional[str] = None, compress_min_bytes: Optional[int] = None, json_library: Optional[str] = None):
+        serializer = serializer or settings.cache_serializer
+        compression = compression or settings.cache_compression
+        if serializer not in ("json", "msgpack"):
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if compression != "none" and compression not in COMPRESSORS:
+            raise ValueError(f"Unknown cache compression: {compression}")
+        self.json = get_json_serializer(json_library)
+        self._msgpack = None
+        self.serializer = self.json if serializer == "json" else self._msgpack_serializer()
+        self.compressor = _compressor(compression) if compression != "none" else None
+        self.compress_min_bytes = settings.cache_compress_min_bytes if compress_min_bytes is None else compress_min_bytes
+
+    def _msgpack_serializer(self) -> MsgpackSerializer:
+        if self._msgpack is None:
+            self._msgpack = MsgpackSerializer()
+        return self._msgpack
+
+    def encode(self, value: Any) -> bytes:
+        data = self.serializer.dumps(value)
+        compressor = self.compressor if self.compressor and len(data) >= self.compress_min_bytes else None
+        if compressor is None and self.serializer.format_id == JSON_FORMAT:
+            return data
+        if compressor is not None:
+            data = compressor.compress(data)
+        return bytes((MAGIC, self.serializer.format_id, compressor.id if compressor else 0)) + data
+
+    def decode(self, data: bytes) -> Any:
+        if data[0] != MAGIC:
+            return self.json.loads(data)
+        format_id, compressor_id = data[1], data[2]
+        payload = memoryview(data)[3:]
+        if compressor_id:
+            payload = _compressor(COMPRESSOR_IDS[compressor_id]).decompress(payload)
+        if format_id == MSGPACK_FORMAT:
+            return self._msgpack_serializer().loads(payload)
+        return self.json.loads(bytes(payload))
+
+@lru_cache(maxsize=None)
+def get_codec() -> Codec:
+    return Codec()
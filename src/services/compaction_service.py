@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, exists, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.settings import settings
+from src.models import Conversation, ConversationArchive, ConversationState, Message
+from src.services.codec import Codec, get_codec
+from src.services.history_cache import HistoryCache
+from typing import Dict, List, Optional
+
+# Tables whose size the compaction job reports, with their indexes
+REPORTED_TABLES = ["messages", "conversation_archives"]
+
+def archive_entry(message: Message) -> Dict:
+    return {**HistoryCache.entry(message), "tokens_used": message.tokens_used}
+
+async def load_archive(db: AsyncSession, conversation_id: int) -> Optional[List[Dict]]:
+    # Archived history entries oldest first, decompressed on demand; None if nothing was archived
+    data = await db.scalar(select(ConversationArchive.data).where(ConversationArchive.conversation_id == conversation_id))
+    if data is None:
+        return None
+    return [{k: v for k, v in entry.items() if k != "tokens_used"} for entry in get_codec().decode(data)]
+
+def slice_history(history: List[Dict], since_id: Optional[int], before_id: Optional[int], limit: Optional[int]) -> List[Dict]:
+    # The range semantics of ConversationService._load_range over an in-memory timeline
+    ids = [entry["id"] for entry in history]
+    start, end = 0, len(history)
+    if since_id is not None:
+        if since_id not in ids:
+            return []
+        start = ids.index(since_id) + 1
+    if before_id is not None:
+        if before_id not in ids:
+            return []
+        end = ids.index(before_id)
+    history = history[start:end]
+    if limit is None:
+        return history
+    return history[-limit:] if since_id is None else history[:limit]
+
+async def table_sizes(db: AsyncSession) -> Dict[str, int]:
+    # Bytes used by each reported table and its indexes
+    if db.bind.dialect.name == "sqlite":
+        # dbstat counts the pages each b-tree holds; pages freed by deletes go to the freelist
+        names = await db.execute(text("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+        owners = {name: table for name, table in names if table in REPORTED_TABLES}
+        result = await db.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+        sizes = {}
+        for name, size in result:
+            if name in owners:
+                key = owners[name] if name == owners[name] else f"{owners[name]} indexes"
+                sizes[key] = sizes.get(key, 0) + size
+        return sizes
+    sizes = {}
+    for table in REPORTED_TABLES:
+        row = (await db.execute(text("SELECT pg_table_size(CAST(:t AS regclass)), pg_indexes_size(CAST(:t AS regclass))"), {"t": table})).one()
+        sizes[table], sizes[f"{table} indexes"] = row
+    return sizes
+
+class CompactionService:
+    # Moves the messages of archived conversations, and of deleted ones once they have been deleted
+    # for compaction_deleted_retention_days, out of the hot messages table into one compressed
+    # ConversationArchive row each. Per conversation the archive row is committed first, then the
+    # moved messages are deleted compaction_batch_messages at a time, each batch its own short
+    # transaction. A run interrupted in between leaves messages that are both archived and hot;
+    # the next run only deletes them. Archived histories stay readable throughout, since readers
+    # prefer the archive row.
+    def __init__(self, db: AsyncSession, codec: Optional[Codec] = None, batch_conversations: Optional[int] = None, batch_messages: Optional[int] = None):
+        self.db = db
+        self.codec = codec or Codec(compression=settings.archive_compression, compress_min_bytes=0)
+        self.batch_conversations = batch_conversations or settings.compaction_batch_conversations
+        self.batch_messages = batch_messages or settings.compaction_batch_messages
+        # bytes_in counts message text archived, bytes_out the archive data written for it
+        self.metrics = {"conversations": 0, "messages": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def stats(self) -> Dict:
+        return {**self.metrics, "ratio": self.metrics["bytes_in"] / self.metrics["bytes_out"] if self.metrics["bytes_out"] else None}
+
+    async def candidates(self) -> List[int]:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.compaction_deleted_retention_days)
+        result = await self.db.execute(
+            select(Conversation.id)
+            .where(
+                or_(
+                    Conversation.state == ConversationState.ARCHIVED,
+                    (Conversation.state == ConversationState.DELETED) & (func.coalesce(Conversation.updated_at, Conversation.created_at) < cutoff),
+                ),
+                exists().where(Message.conversation_id == Conversation.id),
+            )
+            .order_by(Conversation.id)
+            .limit(self.batch_conversations)
+        )
+        conversation_ids = result.scalars().all()
+        await self.db.commit()
+        return conversation_ids
+
+    async def compact_conversation(self, conversation_id: int):
+        archive = await self.db.get(ConversationArchive, conversation_id, populate_existing=True)
+        archived_through = archive.last_message_id if archive else 0
+        result = await self.db.execute(select(Message).where(Message.conversation_id == conversation_id, Message.id > archived_through).order_by(Message.timestamp, Message.id))
+        new_entries = [archive_entry(message) for message in result.scalars().all()]
+        if new_entries:
+            entries = (self.codec.decode(archive.data) if archive else []) + new_entries
+            data = self.codec.encode(entries)
+            if archive is None:
+                archive = ConversationArchive(conversation_id=conversation_id)
+                self.db.add(archive)
+            archive.data = data
+            archive.message_count = len(entries)
+            archive.last_message_id = max(entry["id"] for entry in entries)
+            self.metrics["bytes_in"] += sum(len(entry["content"] or "") for entry in entries)
+            self.metrics["bytes_out"] += len(data)
+        last_message_id = archive.last_message_id if archive else 0
+        await self.db.commit()
+
+        while True:
+            batch = select(Message.id).where(Message.conversation_id == conversation_id, Message.id <= last_message_id).limit(self.batch_messages)
+            deleted = await self.db.execute(delete(Message).where(Message.id.in_(batch)).execution_options(synchronize_session=False))
+            await self.db.commit()
+            self.metrics["messages"] += deleted.rowcount
+            if deleted.rowcount < self.batch_messages:
+                break
+        self.metrics["conversations"] += 1
+
+    async def run(self, max_conversations: Optional[int] = None) -> Dict:
+        # Compacts candidates batch by batch until none are left (or max_conversations is reached)
+        while max_conversations is None or self.metrics["conversations"] < max_conversations:
+            conversation_ids = await self.candidates()
+            if not conversation_ids:
+                break
+            for conversation_id in conversation_ids:
+                await self.compact_conversation(conversation_id)
+        return self.stats()
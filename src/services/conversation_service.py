@@ -1,94 +1,353 @@
-from sqlalchemy.orm import Session
-from src.models import Conversation, Message, Document, ChatMode, ConversationState
+from datetime import datetime
+from sqlalchemy import select, func, literal, or_, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from src.models import Conversation, ConversationArchive, Message, ChatMode, ConversationState, pin_primary
+from src.config.metrics import LLM_FAILURES, stage
+from src.config.settings import settings
+from src.services.compaction_service import load_archive, slice_history
+from src.services.history_cache import HistoryCache
+from src.services.llm_scheduler import LLMRateLimitError, LLMUnavailableError
 from src.services.llm_service import LLMService
-from typing import List, Dict, Optional
-import redis
-import json
+from src.services.pagination import cached_count, decode_cursor, encode_cursor
+from src.services.rag_service import RAGService
+from src.services.response_cache import ResponseCache
+from src.services.tiered_cache import invalidate
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+import logging
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
 
 class ConversationService:
-    def __init__(self, db: Session, redis_client: redis.Redis):
+    def __init__(self, db: AsyncSession, redis_client: redis.Redis, llm_service: Optional[LLMService] = None):
         self.db = db
         self.redis = redis_client
-        self.llm_service = LLMService()
+        self.llm_service = llm_service or LLMService(response_cache=ResponseCache(redis_client) if settings.llm_response_cache else None)
+        self.history_cache = HistoryCache(redis_client)
+        self.rag_service = RAGService(db)
+        # History version read by a cold load that found no messages, per conversation (see _save_turn)
+        self._empty_histories: Dict[int, int] = {}
+
+    async def _get_conversation(self, conversation_id: int) -> Optional[Conversation]:
+        # populate_existing: turns write state and summary with Core updates, so never trust the identity map
+        result = await self.db.execute(select(Conversation).where(Conversation.id == conversation_id).execution_options(populate_existing=True))
+        return result.scalars().first()
+
+    async def get_active_conversation(self, conversation_id: int) -> Conversation:
+        conversation = await self._get_conversation(conversation_id)
+        if not conversation or conversation.state != ConversationState.ACTIVE:
+            raise ValueError("Conversation not found or not active")
+        return conversation
 
-    async def create_conversation(self, user_id: int, first_message: str, mode: ChatMode = ChatMode.OPEN, document_ids: Optional[List[int]] = None) -> Conversation:
-        conversation = Conversation(user_id=user_id, mode=mode, state=ConversationState.ACTIVE)
+    async def create_conversation(self, user_id: int, first_message: str, mode: ChatMode = ChatMode.OPEN, document_ids: Optional[List[int]] = None, cache_responses: bool = True) -> Conversation:
+        conversation = Conversation(user_id=user_id, mode=mode, state=ConversationState.ACTIVE, cache_responses=cache_responses)
         self.db.add(conversation)
-        self.db.commit()
-        self.db.refresh(conversation)
+        await self.db.flush()
+        # Pinned before the commit, so no read can reach a replica between the two (same below)
+        await pin_primary(self.redis, f"conversation:{conversation.id}", f"user:{user_id}")
+        await self.db.commit()
+        await self.db.refresh(conversation)
 
         response = await self.add_message(conversation.id, first_message, document_ids)
-        self.redis.delete(f"conversations:{user_id}")
+        await invalidate(self.redis, self.count_key(user_id))
         return conversation
 
-    async def add_message(self, conversation_id: int, user_message: str, document_ids: Optional[List[int]] = None) -> Dict:
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if not conversation or conversation.state != ConversationState.ACTIVE:
-            raise ValueError("Conversation not found or not active")
+    async def load_context(self, conversation_id: int) -> Tuple[Conversation, List[Dict]]:
+        # Start of a turn: the conversation and its history window, from the history cache when it
+        # is warm. Raises ValueError if the conversation is missing or not active.
+        with stage("db_read"):
+            conversation = await self.get_active_conversation(conversation_id)
 
-        existing_messages = self.db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp).all()
-        history = [{"role": msg.role, "content": msg.content} for msg in existing_messages]
+        with stage("cache_read"):
+            cached_history = await self.history_cache.get(conversation_id, last=settings.history_window_messages)
+        if cached_history is None:
+            # Cold: load the whole history and fill the cache with it, so later turns (whose
+            # appends only extend an existing list) are served from Redis
+            with stage("db_read"):
+                version = await self.history_cache.version(conversation_id)
+                cached_history = await self._load_history(conversation_id, version)
+            if not cached_history:
+                # An empty history can not be cached; the turn that starts it fills the cache instead
+                self._empty_histories[conversation_id] = version
+            cached_history = self._window(cached_history, settings.context_token_budget)
+        return conversation, [{"id": h.get("id"), "role": h["role"], "content": h["content"], "token_count": h.get("token_count")} for h in cached_history]
 
-        history.append({"role": "user", "content": user_message})
+    async def _prepare_turn(self, conversation: Conversation, history: List[Dict], user_message: str, document_ids: Optional[List[int]] = None) -> List[Dict]:
+        # Appends the user message to the window and puts retrieved context in front of it
+        history.append({"role": "user", "content": user_message, "token_count": self.llm_service.tokenizer.count(user_message)})
         if conversation.mode == ChatMode.GROUNDED and document_ids:
-            document_chunks = []
-            for doc_id in document_ids:
-                doc = self.db.query(Document).filter(Document.id == doc_id).first()
-                if doc:
-                    document_chunks.extend(doc.content.split("\n\n"))
-            rag_context = self.llm_service.retrieve_rag_context(user_message, document_chunks)
+            with stage("retrieval"):
+                rag_context = " ".join(await self.rag_service.retrieve(user_message, document_ids, settings.rag_top_k))
             if rag_context:
                 history.insert(0, {"role": "system", "content": f"Relevant context: {rag_context}"})
+        await self.db.commit()
+        return history
 
-        try:
-            llm_response = await self.llm_service.call_llm(history)
-        except Exception as e:
-            print(f"LLM Failed: {e}")
-            raise e
-        user_msg = Message(conversation_id=conversation_id, role="user", content=user_message)
-        assistant_msg = Message(conversation_id=conversation_id, role="assistant", content=llm_response["content"], tokens_used=llm_response["tokens_used"])
+    async def prepare_turn(self, conversation: Conversation, history: List[Dict], user_message: str, document_ids: Optional[List[int]] = None) -> Dict:
+        # Everything before the model call. The user message and retrieved context join the window
+        # (ending the read transaction, so no pooled connection is held through LLM calls), then
+        # older messages are folded into the rolling summary. Returns the turn for commit_turn:
+        # its "prompt", "user_entry" and summary bookkeeping ("summary", "tokens_used", "tokens_saved").
+        history = await self._prepare_turn(conversation, history, user_message, document_ids)
+        prompt, fold = await self._fold_history(conversation, history)
+        return {"prompt": prompt, "user_entry": history[-1], **fold}
+
+    async def commit_turn(self, conversation_id: int, turn: Dict, llm_response: Dict, idempotency_key: Optional[str] = None) -> Tuple[Dict, List[Dict], int]:
+        # Saves the user message and the reply, the turn charged for its summarization call too.
+        # Returns the turn result, the two new history entries and the history version after them.
+        llm_response = {**llm_response, "tokens_used": llm_response["tokens_used"] + turn["tokens_used"]}
+        entries, version = await self._save_turn(conversation_id, turn["user_entry"], llm_response, turn["summary"], idempotency_key)
+        result = {"user_message": turn["user_entry"]["content"], "assistant_response": llm_response["content"], "tokens_used": llm_response["tokens_used"], "tokens_saved": turn["tokens_saved"]}
+        return result, entries, version
+
+    def _window(self, history: List[Dict], budget: int) -> List[Dict]:
+        # Newest messages until the token budget is spent (the message crossing it included; call_llm trims it)
+        tokenizer = self.llm_service.tokenizer
+        start, spent = len(history), 0
+        while start > 0 and spent < budget:
+            start -= 1
+            spent += history[start].get("token_count") or tokenizer.count(history[start]["content"])
+        return history[start:]
+
+    async def _fold_history(self, conversation: Conversation, history: List[Dict]) -> Tuple[List[Dict], Dict]:
+        # Rolling summary. Messages already folded into conversation.summary are replaced by it, and
+        # once the rest passes summary_trigger_tokens its older part is folded in as well (one LLM
+        # call, made outside any DB transaction). Returns the prompt and the turn's summary bookkeeping.
+        fold = {"summary": None, "tokens_used": 0, "tokens_saved": 0}
+        if not settings.conversation_summary:
+            return history, fold
+        llm = self.llm_service
+        system = history[0] if history[0]["role"] == "system" else None
+        through_id = conversation.summary_through_id or 0
+        messages = [m for m in (history[1:] if system else history) if not m.get("id") or m["id"] > through_id]
+        summary = conversation.summary
+
+        if sum(llm.count_tokens(m) for m in messages) > settings.summary_trigger_tokens:
+            # Keep the newest messages within summary_keep_tokens (always the new user message)
+            keep = len(messages) - 1
+            kept_tokens = llm.count_tokens(messages[-1])
+            while keep > 0 and kept_tokens + llm.count_tokens(messages[keep - 1]) <= settings.summary_keep_tokens:
+                keep -= 1
+                kept_tokens += llm.count_tokens(messages[keep])
+            evicted = [m for m in messages[:keep] if m.get("id")]
+            if evicted:
+                with stage("summarize"):
+                    response = await llm.summarize(summary, evicted)
+                summary = response["content"]
+                fold["summary"] = {"summary": summary, "summary_through_id": evicted[-1]["id"]}
+                fold["tokens_used"] = response["tokens_used"]
+                messages = messages[keep:]
+
+        parts = ([f"Summary of the earlier conversation: {summary}"] if summary else []) + ([system["content"]] if system else [])
+        prompt = ([{"role": "system", "content": "\n\n".join(parts)}] if parts else []) + messages
+        # Saved = what the plain newest-messages window of the same history would have sent, minus this prompt
+        budget = settings.context_token_budget
+        fold["tokens_saved"] = sum(llm.count_tokens(m) for m in llm.context_window(history, budget)) - sum(llm.count_tokens(m) for m in llm.context_window(prompt, budget))
+        return prompt, fold
+
+    async def _save_turn(self, conversation_id: int, user_entry: Dict, llm_response: Dict, summary: Optional[Dict] = None, idempotency_key: Optional[str] = None) -> Tuple[List[Dict], int]:
+        # Returns the two new history entries and the history version after appending them
+        with stage("db_write"):
+            user_msg, assistant_msg = await self._write_turn(conversation_id, user_entry, llm_response, summary, idempotency_key)
+        entries = [HistoryCache.entry(user_msg), HistoryCache.entry(assistant_msg)]
+        with stage("cache_write"):
+            version = await self.history_cache.append(conversation_id, entries)
+            started = self._empty_histories.pop(conversation_id, None)
+            if started is not None and version == started + 1:
+                # Nothing was written since the history was read empty: these are all of it
+                await self.history_cache.fill(conversation_id, entries, version)
+        return entries, version
+
+    async def _write_turn(self, conversation_id: int, user_entry: Dict, llm_response: Dict, summary: Optional[Dict], idempotency_key: Optional[str] = None) -> Tuple[Message, Message]:
+        # Write phase: the conversation may have been archived or deleted during the LLM call,
+        # so the insert only goes ahead if a guarded update still finds it active
+        result = await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id, Conversation.state == ConversationState.ACTIVE)
+            .values(updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            await self.db.rollback()
+            raise ValueError("Conversation not found or not active")
+        if summary:
+            # Only ever move the summary forward: a concurrent turn may have folded further already
+            await self.db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id, or_(Conversation.summary_through_id.is_(None), Conversation.summary_through_id < summary["summary_through_id"]))
+                .values(**summary)
+                .execution_options(synchronize_session=False)
+            )
+
+        user_msg = Message(conversation_id=conversation_id, role="user", content=user_entry["content"], token_count=user_entry["token_count"])
+        assistant_msg = Message(conversation_id=conversation_id, role="assistant", content=llm_response["content"], tokens_used=llm_response["tokens_used"], token_count=self.llm_service.tokenizer.count(llm_response["content"]))
+        if idempotency_key is not None:
+            user_msg.idempotency_key, assistant_msg.idempotency_key = f"{idempotency_key}:user", f"{idempotency_key}:assistant"
         self.db.add(user_msg)
         self.db.add(assistant_msg)
-        self.db.commit()
+        # Before the commit: a read of the conversation once the turn is visible must not hit a lagging replica
+        await pin_primary(self.redis, f"conversation:{conversation_id}")
+        await self.db.commit()
+        return user_msg, assistant_msg
+
+    async def _saved_turn(self, idempotency_key: str) -> Optional[Dict]:
+        # The result of a turn already saved under this key (its tokens_saved is not stored)
+        result = await self.db.execute(select(Message.role, Message.content, Message.tokens_used).where(Message.idempotency_key.in_([f"{idempotency_key}:user", f"{idempotency_key}:assistant"])))
+        saved = {message.role: message for message in result}
+        await self.db.commit()
+        if len(saved) != 2:
+            return None
+        return {"user_message": saved["user"].content, "assistant_response": saved["assistant"].content, "tokens_used": saved["assistant"].tokens_used, "tokens_saved": 0}
+
+    async def add_message(self, conversation_id: int, user_message: str, document_ids: Optional[List[int]] = None, idempotency_key: Optional[str] = None) -> Dict:
+        # With an idempotency_key (the turn queue passes the turn id), a turn that was already
+        # saved returns its stored result instead of calling the LLM and writing it again
+        if idempotency_key is not None:
+            saved = await self._saved_turn(idempotency_key)
+            if saved is not None:
+                return saved
+        conversation, history = await self.load_context(conversation_id)
+        try:
+            turn = await self.prepare_turn(conversation, history, user_message, document_ids)
+            with stage("llm"):
+                llm_response = await self.llm_service.call_llm(turn["prompt"], use_cache=conversation.cache_responses)
+        except (LLMUnavailableError, LLMRateLimitError):
+            # Load shedding, answered with a Retry-After rather than counted as a failure
+            raise
+        except Exception:
+            LLM_FAILURES.labels("turn").inc()
+            logger.exception("LLM failed on conversation %s", conversation_id)
+            raise
+        try:
+            result, _, _ = await self.commit_turn(conversation_id, turn, llm_response, idempotency_key)
+        except IntegrityError:
+            # Another delivery of the same turn saved it first
+            await self.db.rollback()
+            saved = await self._saved_turn(idempotency_key) if idempotency_key is not None else None
+            if saved is None:
+                raise
+            return saved
+        return result
+
+    async def stream_message(self, conversation_id: int, user_message: str, document_ids: Optional[List[int]] = None) -> AsyncIterator[Dict]:
+        # Validation runs eagerly so callers can still answer 404 before the stream starts
+        conversation, history = await self.load_context(conversation_id)
+        await self.db.commit()
+        return self._stream_turn(conversation, history, user_message, document_ids)
 
-        self.redis.delete(f"conversation:{conversation_id}:history")
+    async def _stream_turn(self, conversation: Conversation, history: List[Dict], user_message: str, document_ids: Optional[List[int]]) -> AsyncIterator[Dict]:
+        # If the client disconnects, the generator is closed mid-stream: the upstream
+        # request is released by stream_llm and nothing from the turn is persisted.
+        turn = await self.prepare_turn(conversation, history, user_message, document_ids)
+        async for event in self.llm_service.stream_llm(turn["prompt"]):
+            if "delta" in event:
+                yield event
+            else:
+                result, _, _ = await self.commit_turn(conversation.id, turn, event)
+                yield result
 
-        return {"user_message": user_message, "assistant_response": llm_response["content"]}
+    async def history_etag(self, conversation_id: int, since_id: Optional[int] = None, before_id: Optional[int] = None, limit: Optional[int] = None) -> str:
+        # Messages are append-only, so the newest message id versions the whole history; a range
+        # read (see get_conversation_history) adds its parameters, as each range is its own body.
+        # Hot conversations answer from Redis alone; cold ones fall back to the DB.
+        last_id = await self.history_cache.last_id(conversation_id)
+        if last_id is None:
+            conversation = await self._get_conversation(conversation_id)
+            if not conversation or conversation.state == ConversationState.DELETED:
+                raise ValueError("Conversation not found")
+            last_id = await self.db.scalar(select(func.max(Message.id)).where(Message.conversation_id == conversation_id)) or 0
+            if conversation.state == ConversationState.ARCHIVED:
+                last_id = max(last_id, await self.db.scalar(select(ConversationArchive.last_message_id).where(ConversationArchive.conversation_id == conversation_id)) or 0)
+        window = "".join(f"-{name}{value}" for name, value in (("s", since_id), ("b", before_id), ("l", limit)) if value is not None)
+        return f'"{conversation_id}-{last_id}{window}"'
 
-    def get_conversation_history(self, conversation_id: int) -> List[Dict]:
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    async def get_conversation_history(self, conversation_id: int, since_id: Optional[int] = None, before_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        conversation = await self._get_conversation(conversation_id)
         if not conversation or conversation.state == ConversationState.DELETED:
             raise ValueError("Conversation not found")
+        if conversation.state == ConversationState.ARCHIVED:
+            # Compacted conversations are read from cold storage; the archive row is always complete
+            archived = await load_archive(self.db, conversation_id)
+            if archived is not None:
+                return slice_history(archived, since_id, before_id, limit)
+
+        if since_id is None and before_id is None:
+            cached_history = await self.history_cache.get(conversation_id, last=limit)
+            if cached_history is not None:
+                return cached_history
+            if limit is None:
+                return await self._load_history(conversation_id)
+        return await self._load_range(conversation_id, since_id, before_id, limit)
+
+    async def _load_range(self, conversation_id: int, since_id: Optional[int], before_id: Optional[int], limit: Optional[int]) -> List[Dict]:
+        # Range reads walk the (conversation_id, timestamp, id) index from the anchor message
+        query = select(Message).where(Message.conversation_id == conversation_id)
+        position = tuple_(Message.timestamp, Message.id)
+        anchor = aliased(Message)
+        if since_id is not None:
+            query = query.where(position > select(anchor.timestamp, anchor.id).where(anchor.id == since_id, anchor.conversation_id == conversation_id).scalar_subquery())
+        if before_id is not None:
+            query = query.where(position < select(anchor.timestamp, anchor.id).where(anchor.id == before_id, anchor.conversation_id == conversation_id).scalar_subquery())
 
-        cached_history = self.redis.get(f"conversation:{conversation_id}:history")
-        if cached_history:
-            return json.loads(cached_history)
+        if since_id is None and limit is not None:
+            # Newest `limit` messages before the anchor (or overall), returned oldest first
+            result = await self.db.execute(query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit))
+            return [HistoryCache.entry(msg) for msg in reversed(result.scalars().all())]
+        result = await self.db.execute(query.order_by(Message.timestamp, Message.id).limit(limit))
+        return [HistoryCache.entry(msg) for msg in result.scalars().all()]
 
-        messages = self.db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.timestamp).all()
-        history = [{"role": msg.role, "content": msg.content, "timestamp": msg.timestamp.isoformat()} for msg in messages]
-        self.redis.set(f"conversation:{conversation_id}:history", json.dumps(history), ex=3600) # Cache for 1 hour
+    async def _load_history(self, conversation_id: int, version: Optional[int] = None) -> List[Dict]:
+        # Cold path: rebuild the history cache from the DB. `version` is read before the load if not given.
+        if version is None:
+            version = await self.history_cache.version(conversation_id)
+        result = await self.db.execute(select(Message).where(Message.conversation_id == conversation_id).order_by(Message.timestamp, Message.id))
+        history = [HistoryCache.entry(msg) for msg in result.scalars().all()]
+        await self.history_cache.fill(conversation_id, history, version)
         return history
 
-    def list_conversations(self, user_id: int, page: int = 1, limit: int = 10) -> Dict:
-        offset = (page - 1) * limit
-        total = self.db.query(Conversation).filter(Conversation.user_id == user_id, Conversation.state != ConversationState.DELETED).count()
-        conversations = self.db.query(Conversation).filter(Conversation.user_id == user_id, Conversation.state != ConversationState.DELETED).order_by(Conversation.created_at.desc()).offset(offset).limit(limit).all()
+    @staticmethod
+    def count_key(user_id: int) -> str:
+        return f"conversations:{user_id}:count"
+
+    async def list_conversations(self, user_id: int, cursor: Optional[str] = None, limit: int = 10, include_total: bool = False, page: Optional[int] = None) -> Dict:
+        # Keyset pagination over (created_at, id) newest first, so every page costs the same.
+        # `page` is the old OFFSET-based paging, kept for existing clients.
+        filters = [Conversation.user_id == user_id, Conversation.state != ConversationState.DELETED]
+        query = select(Conversation).where(*filters).order_by(Conversation.created_at.desc(), Conversation.id.desc())
+        if page is not None:
+            query = query.offset((page - 1) * limit)
+        elif cursor:
+            created_at, conversation_id = decode_cursor(cursor, str, int)
+            query = query.where(tuple_(Conversation.created_at, Conversation.id) < tuple_(literal(datetime.fromisoformat(created_at), Conversation.created_at.type), conversation_id))
+        result = await self.db.execute(query.limit(limit + 1))
+        conversations = result.scalars().all()
+
+        next_cursor = None
+        if len(conversations) > limit:
+            conversations = conversations[:limit]
+            next_cursor = encode_cursor(conversations[-1].created_at.isoformat(), conversations[-1].id)
         conversation_list = [{"id": c.id, "title": c.title, "mode": c.mode.value, "state": c.state.value, "created_at": c.created_at.isoformat()} for c in conversations]
-        return {"conversations": conversation_list, "page": page, "limit": limit, "total": total}
+        response = {"conversations": conversation_list, "limit": limit, "next_cursor": next_cursor}
+        if page is not None:
+            response["page"] = page
+        if include_total:
+            response["total"] = await cached_count(self.redis, self.count_key(user_id), lambda: self.db.scalar(select(func.count()).select_from(Conversation).where(*filters)))
+        return response
 
-    def delete_conversation(self, conversation_id: int):
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    async def delete_conversation(self, conversation_id: int):
+        conversation = await self._get_conversation(conversation_id)
         if conversation and conversation.state != ConversationState.DELETED:
             conversation.state = ConversationState.DELETED
-            self.db.commit()
-            self.redis.delete(f"conversation:{conversation_id}:history")
-            self.redis.delete(f"conversations:{conversation.user_id}")
+            await pin_primary(self.redis, f"conversation:{conversation_id}", f"user:{conversation.user_id}")
+            await self.db.commit()
+            await invalidate(self.redis, HistoryCache.key(conversation_id), self.count_key(conversation.user_id))
 
-    def archive_conversation(self, conversation_id: int):
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    async def archive_conversation(self, conversation_id: int):
+        conversation = await self._get_conversation(conversation_id)
         if conversation and conversation.state == ConversationState.ACTIVE:
             conversation.state = ConversationState.ARCHIVED
-            self.db.commit()
-            self.redis.delete(f"conversation:{conversation_id}:history")
-            self.redis.delete(f"conversations:{conversation.user_id}")
-
+            await pin_primary(self.redis, f"conversation:{conversation_id}", f"user:{conversation.user_id}")
+            await self.db.commit()
+            await invalidate(self.redis, HistoryCache.key(conversation_id), self.count_key(conversation.user_id))
@@ -0,0 +1,56 @@
+from functools import lru_cache
+from importlib import import_module
+from typing import List, Protocol
+from src.config.settings import settings
+import numpy as np
+import re
+import zlib
+
+class Embedder(Protocol):
+    dim: int
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+class HashingEmbedder:
+    # Offline, model-free embeddings: word unigrams and character trigrams hashed into
+    # `dim` signed buckets, then L2-normalized so a dot product is cosine similarity.
+    # crc32 keeps the buckets stable across processes (str hash() is salted per process).
+    pattern = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = self.pattern.findall(text.lower())
+        trigrams = [f"#{word}#"[i:i + 3] for word in words for i in range(len(word))]
+        return words + trigrams
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(zlib.crc32(feature.encode()) for feature in features)
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), hashes % self.dim), signs)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+}
+
+@lru_cache(maxsize=None)
+def get_embedder(name: str = None) -> Embedder:
+    # Accepts a registered name or a "package.module:ClassName" import path
+    name = name or settings.embedder
+    if name in EMBEDDERS:
+        return EMBEDDERS[name](settings.embedding_dim)
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown embedder: {name}")
+    return getattr(import_module(module_name), class_name)()
@@ -0,0 +1,120 @@
+import redis.asyncio as redis
+from src.config.metrics import record_cache_lookup
+from src.models import Message
+from src.services.codec import Codec, get_codec
+from src.services.tiered_cache import INVALIDATION_CHANNEL, LocalCache, get_local_cache, invalidation_message
+from typing import List, Dict, Optional
+
+class HistoryCache:
+    # Append-only Redis list of a conversation's messages, oldest first.
+    # Writers only push while the list exists (RPUSHX); a cold list is rebuilt from
+    # the DB by the next reader, and that rebuild is dropped if an append bumped the
+    # version in the meantime, so a stale snapshot never overwrites newer messages.
+    # With the local tier on, each worker also keeps the decoded tail it last read
+    # (dropped on every append via pub/sub), and serves reads and last_id from it.
+
+    ttl = 3600  # 1 hour, refreshed on every append
+
+    def __init__(self, redis_client: redis.Redis, codec: Optional[Codec] = None, local: Optional[LocalCache] = None):
+        self.redis = redis_client
+        self.codec = codec or get_codec()
+        self.local = local if local is not None else get_local_cache()
+
+    @staticmethod
+    def key(conversation_id: int) -> str:
+        return f"conversation:{conversation_id}:messages"
+
+    @staticmethod
+    def version_key(conversation_id: int) -> str:
+        return f"conversation:{conversation_id}:version"
+
+    @staticmethod
+    def entry(message: Message) -> Dict:
+        return {"id": message.id, "role": message.role, "content": message.content, "timestamp": message.timestamp.isoformat(), "token_count": message.token_count}
+
+    async def version(self, conversation_id: int) -> int:
+        return int(await self.redis.get(self.version_key(conversation_id)) or 0)
+
+    def _local_tail(self, conversation_id: int, last: Optional[int]) -> Optional[List[Dict]]:
+        # The local copy answers if it holds the whole list, or at least the `last` newest entries
+        if self.local is None:
+            return None
+        cached = self.local.get(self.key(conversation_id))
+        if cached is None:
+            return None
+        entries, complete = cached
+        if last is None:
+            return entries if complete else None
+        return entries[-last:] if complete or len(entries) >= last else None
+
+    async def last_id(self, conversation_id: int) -> Optional[int]:
+        local = self._local_tail(conversation_id, 1)
+        if local:
+            return local[-1].get("id")
+        # Id of the newest cached message, without decoding the rest of the list
+        entry = await self.redis.lindex(self.key(conversation_id), -1)
+        record_cache_lookup(self.key(conversation_id), entry is not None)
+        return self.codec.decode(entry).get("id") if entry else None
+
+    async def get(self, conversation_id: int, last: Optional[int] = None) -> Optional[List[Dict]]:
+        local = self._local_tail(conversation_id, last)
+        if local is not None:
+            return list(local)
+        generation = self.local.generation if self.local is not None else None
+        entries = await self.redis.lrange(self.key(conversation_id), -last if last else 0, -1)
+        record_cache_lookup(self.key(conversation_id), bool(entries))
+        if not entries:
+            return None
+        history = [self.codec.decode(e) for e in entries]
+        if self.local is not None:
+            # Fewer entries than asked for means this is the whole list
+            self.local.set(self.key(conversation_id), (history, last is None or len(history) < last), generation)
+        return list(history)
+
+    async def fill(self, conversation_id: int, history: List[Dict], version: int) -> bool:
+        if not history:
+            return False
+        version_key = self.version_key(conversation_id)
+        generation = self.local.generation if self.local is not None else None
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(version_key)
+                if int(await pipe.get(version_key) or 0) != version:
+                    return False
+                pipe.multi()
+                pipe.delete(self.key(conversation_id))
+                pipe.rpush(self.key(conversation_id), *[self.codec.encode(h) for h in history])
+                pipe.expire(self.key(conversation_id), self.ttl)
+                await pipe.execute()
+                if self.local is not None:
+                    self.local.set(self.key(conversation_id), (list(history), True), generation)
+                return True
+            except redis.WatchError:
+                return False
+
+    async def append(self, conversation_id: int, history: List[Dict]) -> int:
+        # Returns the new version
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self.version_key(conversation_id))
+            pipe.expire(self.version_key(conversation_id), self.ttl)
+            pipe.rpushx(self.key(conversation_id), *[self.codec.encode(h) for h in history])
+            pipe.expire(self.key(conversation_id), self.ttl)
+            if self.local is not None:
+                self.local.invalidate([self.key(conversation_id)])
+                pipe.publish(INVALIDATION_CHANNEL, invalidation_message([self.key(conversation_id)]))
+            return (await pipe.execute())[0]
+
+    async def reset(self, conversation_ids: List[int], batch: int = 1000):
+        # For messages written without append (bulk import): drops the cached lists and bumps the
+        # versions, so a rebuild that read the DB before the write is not stored either
+        for start in range(0, len(conversation_ids), batch):
+            keys = [self.key(conversation_id) for conversation_id in conversation_ids[start:start + batch]]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for conversation_id in conversation_ids[start:start + batch]:
+                    pipe.incr(self.version_key(conversation_id))
+                    pipe.expire(self.version_key(conversation_id), self.ttl)
+                pipe.delete(*keys)
+                if self.local is not None:
+                    self.local.invalidate(keys)
+                    pipe.publish(INVALIDATION_CHANNEL, invalidation_message(keys))
+                await pipe.execute()
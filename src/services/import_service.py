@@ -0,0 +1,273 @@
+from datetime import datetime, timezone
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.settings import settings
+from src.models import ChatMode, Conversation, ConversationState, ImportCheckpoint, Message, User, pin_primary
+from src.services.conversation_service import ConversationService
+from src.services.history_cache import HistoryCache
+from src.services.tiered_cache import invalidate
+from src.services.tokenizer import get_tokenizer
+from src.services.user_service import UserService
+from typing import Annotated, AsyncIterator, Dict, Iterable, List, Literal, Optional, Tuple, Union
+import redis.asyncio as redis
+
+class UserRecord(BaseModel):
+    type: Literal["user"]
+    username: str = Field(min_length=1)
+    email: str = Field(min_length=1)
+
+class ConversationRecord(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    type: Literal["conversation"]
+    id: str = Field(min_length=1)  # The source system's id, which its messages refer to
+    user: str  # Username of a user record or of an existing user
+    title: Optional[str] = None
+    mode: ChatMode = ChatMode.OPEN
+    state: ConversationState = ConversationState.ACTIVE
+    created_at: Optional[datetime] = None
+
+class MessageRecord(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    type: Literal["message"]
+    conversation: str  # Source id of a conversation record or of a previously imported conversation
+    role: Literal["user", "assistant", "system"]
+    content: str
+    timestamp: Optional[datetime] = None
+    tokens_used: Optional[int] = None
+
+# One NDJSON line, validated straight from its bytes
+Record = TypeAdapter(Annotated[Union[UserRecord, ConversationRecord, MessageRecord], Field(discriminator="type")])
+
+def utc(value: Optional[datetime], default: datetime) -> datetime:
+    # Naive timestamps are taken as UTC. Everything is stored in UTC, as SQLite keeps no offset.
+    if value is None:
+        return default
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    # (line number, line) pairs, numbered from 1, from a byte stream cut anywhere
+    number, rest = 0, b""
+    async for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            number += 1
+            yield number, line
+    if rest:
+        yield number + 1, rest
+
+class ImportService:
+    # Bulk import of NDJSON: one JSON object per line with "type" "user", "conversation" or
+    # "message". Lines are validated as they stream in. Invalid ones, and records referring to a
+    # user or conversation that does not exist, are skipped and reported. Every batch_records
+    # records are written with one multi-row insert per table, in one transaction that also moves
+    # the run's ImportCheckpoint to the batch's last line. A run that fails partway is rerun
+    # under the same name with the same input and carries on after its last committed batch.
+    # Users are matched by username and conversations by source id (Conversation.external_id),
+    # so records that already exist are left as they are.
+    def __init__(self, db: AsyncSession, redis_client: redis.Redis, batch_records: Optional[int] = None):
+        self.db = db
+        self.redis = redis_client
+        self.history_cache = HistoryCache(redis_client)
+        self.tokenizer = get_tokenizer()
+        self.batch_records = batch_records or settings.import_batch_records
+        # Resolved ids: username -> user id, source conversation id -> conversation id
+        self.users: Dict[str, int] = {}
+        self.conversations: Dict[str, int] = {}
+        # Conversations that got messages, least recently written first (a dict as an ordered set)
+        self.written: Dict[int, None] = {}
+        self.errors: List[Dict] = []
+        self.checkpointed_errors = 0
+        self.metrics = {"lines": 0, "resumed_after": 0, "users": 0, "conversations": 0, "messages": 0, "existing": 0, "errors": 0, "warmed": 0}
+
+    def stats(self) -> Dict:
+        return {**self.metrics, "error_lines": self.errors}
+
+    def _error(self, line: int, detail: str):
+        self.metrics["errors"] += 1
+        if len(self.errors) < settings.import_max_errors:
+            self.errors.append({"line": line, "detail": detail})
+
+    async def get_checkpoint(self, name: str) -> Optional[ImportCheckpoint]:
+        return await self.db.get(ImportCheckpoint, name, populate_existing=True)
+
+    @staticmethod
+    def checkpoint_dict(checkpoint: ImportCheckpoint) -> Dict:
+        return {
+            "name": checkpoint.name,
+            "line": checkpoint.line,
+            "users": checkpoint.users,
+            "conversations": checkpoint.conversations,
+            "messages": checkpoint.messages,
+            "errors": checkpoint.errors,
+            "completed": checkpoint.completed_at is not None,
+        }
+
+    async def run(self, name: str, chunks: AsyncIterator[bytes]) -> Dict:
+        checkpoint = await self.get_checkpoint(name)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(name=name, line=0, users=0, conversations=0, messages=0, errors=0)
+            self.db.add(checkpoint)
+            await self.db.commit()
+        self.metrics["resumed_after"] = checkpoint.line
+        batch, number = [], 0
+        try:
+            async for number, line in ndjson_lines(chunks):
+                if number <= checkpoint.line or not line.strip():
+                    continue
+                self.metrics["lines"] += 1
+                try:
+                    batch.append((number, Record.validate_json(line)))
+                except ValidationError as e:
+                    self._error(number, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors(include_url=False)))
+                if len(batch) >= self.batch_records:
+                    await self._write(checkpoint, batch, number)
+                    batch = []
+            await self._write(checkpoint, batch, max(number, checkpoint.line), done=True)
+        except Exception:
+            # The checkpoint stays at the last committed batch
+            await self.db.rollback()
+            raise
+        await self.warm()
+        return self.stats()
+
+    async def _write(self, checkpoint: ImportCheckpoint, batch: List[Tuple[int, BaseModel]], line: int, done: bool = False):
+        now = datetime.now(timezone.utc)
+        users = [(n, r) for n, r in batch if isinstance(r, UserRecord)]
+        conversations = [(n, r) for n, r in batch if isinstance(r, ConversationRecord)]
+        messages = [(n, r) for n, r in batch if isinstance(r, MessageRecord)]
+        new_users = await self._insert_users(users, conversations)
+        new_conversations, owners = await self._insert_conversations(conversations, messages, now)
+        new_messages, written = await self._insert_messages(messages, now)
+
+        checkpoint.line = line
+        checkpoint.users += new_users
+        checkpoint.conversations += new_conversations
+        checkpoint.messages += new_messages
+        checkpoint.errors += self.metrics["errors"] - self.checkpointed_errors
+        if done:
+            checkpoint.completed_at = now
+        if written:
+            # Pinned before the commit, so the batch is never read from a replica that lacks it
+            await pin_primary(self.redis, *[f"conversation:{conversation_id}" for conversation_id in written])
+        await self.db.commit()
+        self.checkpointed_errors = self.metrics["errors"]
+        if written:
+            # Histories cached (or being rebuilt) before this batch are missing its messages
+            await self.history_cache.reset(written)
+        # Cached totals (Redis and local tiers) no longer count this batch's users and conversations
+        stale = ([UserService.count_key, UserService.list_key] if new_users else []) + [ConversationService.count_key(user_id) for user_id in owners]
+        if stale:
+            await invalidate(self.redis, *stale)
+        self.metrics["users"] += new_users
+        self.metrics["conversations"] += new_conversations
+        self.metrics["messages"] += new_messages
+
+    async def _resolve_users(self, usernames: Iterable[str]):
+        missing = [u for u in set(usernames) if u not in self.users]
+        if missing:
+            result = await self.db.execute(select(User.username, User.id).where(User.username.in_(missing)))
+            self.users.update(result.tuples().all())
+
+    async def _insert_users(self, users: List[Tuple[int, UserRecord]], conversations: List[Tuple[int, ConversationRecord]]) -> int:
+        await self._resolve_users([r.username for _, r in users] + [r.user for _, r in conversations])
+        rows = {}
+        for number, record in users:
+            if record.username in self.users or record.username in rows:
+                self.metrics["existing"] += 1
+            else:
+                rows[record.username] = (number, {"username": record.username, "email": record.email})
+        if not rows:
+            return 0
+        taken = set((await self.db.scalars(select(User.email).where(User.email.in_([row["email"] for _, row in rows.values()])))).all())
+        for username, (number, row) in list(rows.items()):
+            if row["email"] in taken:
+                del rows[username]
+                self._error(number, f"Email {row['email']} is already registered")
+            taken.add(row["email"])
+        if not rows:
+            return 0
+        users_table = User.__table__
+        result = await self.db.execute(insert(users_table).returning(users_table.c.id, sort_by_parameter_order=True), [row for _, row in rows.values()])
+        self.users.update(zip(rows, result.scalars().all()))
+        return len(rows)
+
+    async def _resolve_conversations(self, external_ids: Iterable[str]):
+        missing = [c for c in set(external_ids) if c not in self.conversations]
+        if missing:
+            result = await self.db.execute(select(Conversation.external_id, Conversation.id).where(Conversation.external_id.in_(missing)))
+            self.conversations.update(result.tuples().all())
+
+    async def _insert_conversations(self, conversations: List[Tuple[int, ConversationRecord]], messages: List[Tuple[int, MessageRecord]], now: datetime) -> Tuple[int, List[int]]:
+        # Returns the number of conversations written and the users they belong to
+        await self._resolve_conversations([r.id for _, r in conversations] + [r.conversation for _, r in messages])
+        rows = {}
+        for number, record in conversations:
+            if record.id in self.conversations or record.id in rows:
+                self.metrics["existing"] += 1
+            elif record.user not in self.users:
+                self._error(number, f"User {record.user} not found")
+            else:
+                rows[record.id] = {
+                    "external_id": record.id,
+                    "user_id": self.users[record.user],
+                    "title": record.title,
+                    "mode": record.mode.value,
+                    "state": record.state.value,
+                    "cache_responses": True,
+                    "created_at": utc(record.created_at, now),
+                }
+        if not rows:
+            return 0, []
+        conversations_table = Conversation.__table__
+        result = await self.db.execute(insert(conversations_table).returning(conversations_table.c.id, sort_by_parameter_order=True), list(rows.values()))
+        self.conversations.update(zip(rows, result.scalars().all()))
+        return len(rows), list({row["user_id"] for row in rows.values()})
+
+    async def _insert_messages(self, messages: List[Tuple[int, MessageRecord]], now: datetime) -> Tuple[int, List[int]]:
+        # Returns the number of messages written and the conversations they went to
+        rows, written = [], {}
+        for number, record in messages:
+            conversation_id = self.conversations.get(record.conversation)
+            if conversation_id is None:
+                self._error(number, f"Conversation {record.conversation} not found")
+                continue
+            rows.append({
+                "conversation_id": conversation_id,
+                "role": record.role,
+                "content": record.content,
+                "timestamp": utc(record.timestamp, now),
+                "tokens_used": record.tokens_used,
+                "token_count": self.tokenizer.count(record.content),
+            })
+            written[conversation_id] = None
+        if rows:
+            await self.db.execute(insert(Message.__table__), rows)
+        for conversation_id in written:
+            self.written.pop(conversation_id, None)
+            self.written[conversation_id] = None
+        return len(rows), list(written)
+
+    async def warm(self, batch: int = 100):
+        # Fills the history caches of the most recently written active conversations, so their
+        # first reads after the import are served from Redis
+        candidates = list(self.written)[-settings.import_warm_conversations:] if settings.import_warm_conversations else []
+        for start in range(0, len(candidates), batch):
+            conversation_ids = candidates[start:start + batch]
+            active = (await self.db.scalars(select(Conversation.id).where(Conversation.id.in_(conversation_ids), Conversation.state == ConversationState.ACTIVE))).all()
+            if not active:
+                continue
+            versions = {conversation_id: await self.history_cache.version(conversation_id) for conversation_id in active}
+            result = await self.db.execute(
+                select(Message.conversation_id, Message.id, Message.role, Message.content, Message.timestamp, Message.token_count)
+                .where(Message.conversation_id.in_(active))
+                .order_by(Message.conversation_id, Message.timestamp, Message.id)
+            )
+            histories: Dict[int, List[Dict]] = {}
+            for message in result:
+                histories.setdefault(message.conversation_id, []).append(HistoryCache.entry(message))
+            await self.db.commit()
+            for conversation_id, history in histories.items():
+                if await self.history_cache.fill(conversation_id, history, versions[conversation_id]):
+                    self.metrics["warmed"] += 1
@@ -0,0 +1,238 @@
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.settings import settings
+from src.models import Conversation, ConversationState, Document, DocumentChunk, ChunkPosting
+from src.services.rag_service import RAGService, analyze
+from src.services.tokenizer import Tokenizer, get_tokenizer
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import codecs
+import multiprocessing
+import re
+import unicodedata
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+CONTROL_CHARACTERS = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+POSTING_COLUMNS = ["term", "document_id", "chunk_id", "term_frequency", "chunk_length"]
+
+class DocumentTooLargeError(Exception):
+    pass
+
+def normalize(paragraph: str) -> str:
+    # NFKC folds compatibility forms (ligatures, full-width letters); whitespace runs become one space
+    return " ".join(unicodedata.normalize("NFKC", CONTROL_CHARACTERS.sub(" ", paragraph)).split())
+
+def split_to_fit(text: str, max_tokens: int, tokenizer: Tokenizer) -> List[Tuple[str, int]]:
+    # Cuts text longer than max_tokens at sentence ends, then at words, then inside a word
+    count = tokenizer.count(text)
+    if count <= max_tokens:
+        return [(text, count)]
+    units = SENTENCE_END.split(text)
+    if len(units) == 1:
+        units = text.split(" ")
+    if len(units) == 1:
+        size = len(text) // (count // max_tokens + 1) or 1
+        units = [text[i:i + size] for i in range(0, len(text), size)]
+
+    pieces, current, current_tokens = [], [], 0
+    for unit in units:
+        for part, tokens in split_to_fit(unit, max_tokens, tokenizer):
+            if current and current_tokens + tokens > max_tokens:
+                pieces.append((" ".join(current), current_tokens))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += tokens
+    if current:
+        pieces.append((" ".join(current), current_tokens))
+    return pieces
+
+def chunk_text(text: str, min_tokens: int, max_tokens: int, tokenizer_name: Optional[str] = None) -> List[Tuple[str, Dict[str, int], int]]:
+    # Runs in the ingest worker processes. Paragraphs are cut into pieces of at most
+    # max_tokens - min_tokens and packed greedily up to max_tokens, so every chunk except the
+    # last of a batch holds more than min_tokens. Returns (content, term frequencies, length).
+    tokenizer = get_tokenizer(tokenizer_name)
+    piece_limit = max(1, max_tokens - min_tokens)
+    chunks, paragraphs, current_tokens = [], [], 0
+
+    def close():
+        content = "\n\n".join(" ".join(paragraph) for paragraph in paragraphs)
+        terms = analyze(content)
+        chunks.append((content, dict(Counter(terms)), len(terms)))
+
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = normalize(paragraph)
+        if not paragraph:
+            continue
+        paragraphs_open = False
+        for piece, tokens in split_to_fit(paragraph, piece_limit, tokenizer):
+            if paragraphs and current_tokens + tokens > max_tokens:
+                close()
+                paragraphs, current_tokens, paragraphs_open = [], 0, False
+            if paragraphs_open:
+                paragraphs[-1].append(piece)  # the rest of a split paragraph stays one paragraph
+            else:
+                paragraphs.append([piece])
+                paragraphs_open = True
+            current_tokens += tokens
+    if paragraphs:
+        close()
+    return chunks
+
+@lru_cache(maxsize=None)
+def get_ingest_pool() -> Optional[ProcessPoolExecutor]:
+    # Spawned, not forked: the API process runs threads (DB drivers, uvicorn) that fork would not carry over safely
+    if settings.ingest_processes <= 0:
+        return None
+    return ProcessPoolExecutor(settings.ingest_processes, mp_context=multiprocessing.get_context("spawn"))
+
+class IngestionService:
+    # Streams an upload into DocumentChunk and ChunkPosting rows. The body is decoded and cut
+    # into batches at paragraph breaks; batches are chunked in the worker pool while earlier
+    # ones are written, with at most one batch per worker (plus one) in flight, so memory stays
+    # bounded by the batch size whatever the upload size. Progress is committed per batch.
+    def __init__(self, db: AsyncSession, pool: Optional[ProcessPoolExecutor] = None, batch_bytes: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.db = db
+        self._pool = pool
+        self.batch_bytes = batch_bytes or settings.ingest_batch_bytes
+        self.max_bytes = max_bytes or settings.ingest_max_bytes
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        # Resolved on first upload, so status reads never start worker processes
+        if self._pool is None:
+            self._pool = get_ingest_pool()
+        return self._pool
+
+    async def create_document(self, conversation_id: int, name: str) -> Document:
+        conversation = await self.db.get(Conversation, conversation_id)
+        if not conversation or conversation.state != ConversationState.ACTIVE:
+            raise ValueError("Conversation not found or not active")
+        document = Document(conversation_id=conversation_id, name=name, status="ingesting", chunk_count=0, total_length=0, bytes_received=0)
+        self.db.add(document)
+        await self.db.commit()
+        return document
+
+    async def _batches(self, body: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, int]]:
+        # Yields (text, bytes received so far), cutting at the last paragraph break (or space) before batch_bytes
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer, received = "", 0
+        async for data in body:
+            received += len(data)
+            if received > self.max_bytes:
+                raise DocumentTooLargeError(f"Document is larger than {self.max_bytes} bytes")
+            buffer += decoder.decode(data)
+            encoded = buffer.encode()
+            while len(encoded) >= self.batch_bytes:
+                # batch_bytes counts UTF-8 bytes; cuts are searched in the characters that fit in it
+                limit = max(1, len(encoded[:self.batch_bytes].decode("utf-8", errors="ignore")))
+                cut = buffer.rfind("\n\n", 0, limit)
+                if cut <= 0:
+                    cut = buffer.rfind(" ", 0, limit)
+                if cut <= 0:
+                    cut = limit
+                yield buffer[:cut], received
+                buffer = buffer[cut:]
+                encoded = buffer.encode()
+        buffer += decoder.decode(b"", final=True)
+        if buffer.strip():
+            yield buffer, received
+
+    def _chunk(self, text: str) -> asyncio.Future:
+        args = (text, settings.ingest_chunk_min_tokens, settings.ingest_chunk_max_tokens, settings.tokenizer)
+        if self.pool is None:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(chunk_text(*args))
+            return future
+        return asyncio.get_running_loop().run_in_executor(self.pool, chunk_text, *args)
+
+    async def _store(self, document: Document, chunks: List[Tuple[str, Dict[str, int], int]], received: int):
+        if chunks:
+            # Core inserts against the tables skip the ORM's per-row bookkeeping, which dominated at
+            # ~80 postings per chunk. Chunks go in as multi-row INSERT ... RETURNING, so postings can
+            # reference the new ids without a flush per row.
+            rows = [{"document_id": document.id, "position": document.chunk_count + i, "content": content, "length": length} for i, (content, _, length) in enumerate(chunks)]
+            chunks_table = DocumentChunk.__table__
+            chunk_ids = (await self.db.execute(insert(chunks_table).returning(chunks_table.c.id, sort_by_parameter_order=True), rows)).scalars().all()
+            document_id = document.id
+            postings = [
+                (term, document_id, chunk_id, term_frequency, length)
+                for chunk_id, (_, terms, length) in zip(chunk_ids, chunks)
+                for term, term_frequency in terms.items()
+            ]
+            await self._insert_postings(postings)
+        document.chunk_count += len(chunks)
+        document.total_length += sum(length for _, _, length in chunks)
+        document.bytes_received = received
+        await self.db.commit()
+
+    async def _insert_postings(self, postings: List[Tuple]):
+        # Postings are sent to the driver's executemany as plain tuples: SQLAlchemy's per-row
+        # parameter processing cost more than SQLite's own inserts at several hundred thousand rows
+        connection = await self.db.connection()
+        statement = insert(ChunkPosting.__table__).compile(dialect=connection.dialect, column_keys=POSTING_COLUMNS)
+        order = [POSTING_COLUMNS.index(key) for key in statement.positiontup]
+        if order != sorted(order):
+            postings = [tuple(posting[i] for i in order) for posting in postings]
+        await connection.exec_driver_sql(str(statement), postings)
+
+    async def ingest(self, document: Document, body: AsyncIterator[bytes]) -> Document:
+        pending = deque()
+        max_in_flight = (self.pool._max_workers if self.pool else 0) + 1
+        try:
+            async for text, received in self._batches(body):
+                pending.append((self._chunk(text), received))
+                if len(pending) >= max_in_flight:
+                    future, batch_received = pending.popleft()
+                    await self._store(document, await future, batch_received)
+            while pending:
+                future, batch_received = pending.popleft()
+                await self._store(document, await future, batch_received)
+        except BaseException as e:
+            for future, _ in pending:
+                future.cancel()
+            if isinstance(e, BrokenProcessPool):
+                get_ingest_pool.cache_clear()  # a worker died; the next upload starts a fresh pool
+            await self._fail(document, e)
+            raise
+
+        document.status = "ready"
+        await self.db.commit()
+        # Chunks were written outside index_document, so refresh any dense matrix built mid-upload
+        rag = RAGService(self.db)
+        rag.vector_store.delete(document.id)
+        if rag.mode != "bm25":
+            await rag.ensure_embedded([document.id])
+        return document
+
+    async def _fail(self, document: Document, error: BaseException):
+        # Partial chunks are dropped so retrieval never sees half a document
+        document_id = document.id
+        await self.db.rollback()
+        await self.db.execute(delete(ChunkPosting).where(ChunkPosting.document_id == document_id))
+        await self.db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document_id))
+        document = await self.db.get(Document, document_id, populate_existing=True)
+        document.status = "failed"
+        document.error = str(error) or type(error).__name__
+        document.chunk_count = 0
+        document.total_length = 0
+        await self.db.commit()
+
+    @staticmethod
+    def status(document: Document) -> Dict:
+        return {"id": document.id, "conversation_id": document.conversation_id, "name": document.name, "status": document.status, "bytes_received": document.bytes_received, "chunk_count": document.chunk_count, "error": document.error}
+
+    async def get_document(self, document_id: int) -> Document:
+        document = await self.db.get(Document, document_id, populate_existing=True)
+        if not document:
+            raise ValueError("Document not found")
+        return document
+
+    async def list_documents(self, conversation_id: int) -> List[Document]:
+        result = await self.db.execute(select(Document).where(Document.conversation_id == conversation_id).order_by(Document.id).execution_options(populate_existing=True))
+        return result.scalars().all()
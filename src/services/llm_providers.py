@@ -0,0 +1,239 @@
+from collections import deque
+from functools import lru_cache
+from src.config.settings import settings
+from src.services.llm_scheduler import LLMRateLimitError, LLMUpstreamError
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import httpx
+import math
+import random
+import time
+
+class LatencyWindow:
+    # Durations of a provider's most recent completions, for percentile-based hedge delays
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        values = sorted(self.samples)
+        return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class LLMProvider:
+    # One OpenAI-compatible chat completions endpoint and the model to ask for there
+    def __init__(self, name: str, base_url: str, model: Optional[str] = None, api_key: Optional[str] = None, weight: float = 1.0):
+        self.name = name
+        self.base_url = base_url
+        self.model = model or settings.llm_model
+        self.api_key = api_key or settings.groq_api_key
+        self.weight = weight
+        self.latency = LatencyWindow()
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def headers(self) -> Dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def record_success(self, seconds: float):
+        self.latency.add(seconds)
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_failure(self, threshold: int, cooldown: float):
+        self.failures += 1
+        if self.failures >= threshold:
+            self.down_until = time.monotonic() + cooldown
+
+    def record_rate_limit(self, retry_after: Optional[float]):
+        self.down_until = max(self.down_until, time.monotonic() + (retry_after or 1.0))
+
+    def stats(self) -> Dict:
+        return {
+            "model": self.model,
+            "weight": self.weight,
+            "available": self.available,
+            "samples": len(self.latency),
+            "p50_seconds": self.latency.percentile(50),
+            "p95_seconds": self.latency.percentile(95),
+        }
+
+class HedgeBudget:
+    # Every call earns `ratio` of a hedge, up to `burst`; a hedge spends one. Duplicate
+    # requests therefore stay under ratio x calls however slow the providers get.
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.level = 0.0
+
+    def earn(self):
+        self.level = min(self.burst, self.level + self.ratio)
+
+    def spend(self) -> bool:
+        if self.level < 1:
+            return False
+        self.level -= 1
+        return True
+
+def retryable(error: BaseException) -> bool:
+    # Worth sending to another provider: rate limits, server errors and transport failures
+    if isinstance(error, LLMUpstreamError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+class ProviderRouter:
+    # Spreads completions over the configured providers by weight, skipping providers that
+    # are cooling down after failures or a 429, and fails over to the next one on a retryable
+    # error. With hedging on, a call the primary has not answered within its latency
+    # percentile is also sent to the next provider and the first success wins. Budgets,
+    # retries with backoff and the global circuit breaker stay in LLMScheduler around this.
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedge: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        hedge_initial_delay: Optional[float] = None,
+        hedge_budget: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        failure_cooldown: Optional[float] = None,
+    ):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        self.providers = providers
+        self.hedge = settings.llm_hedge if hedge is None else hedge
+        self.hedge_percentile = settings.llm_hedge_percentile if hedge_percentile is None else hedge_percentile
+        self.hedge_min_samples = settings.llm_hedge_min_samples if hedge_min_samples is None else hedge_min_samples
+        self.hedge_initial_delay = settings.llm_hedge_initial_delay if hedge_initial_delay is None else hedge_initial_delay
+        self.budget = HedgeBudget(settings.llm_hedge_budget if hedge_budget is None else hedge_budget)
+        self.failure_threshold = settings.llm_breaker_threshold if failure_threshold is None else failure_threshold
+        self.failure_cooldown = settings.llm_breaker_cooldown if failure_cooldown is None else failure_cooldown
+        self.metrics = {"calls": 0, "failovers": 0, "hedged": 0, "hedge_wins": 0, "hedges_denied": 0}
+
+    @property
+    def primary(self) -> LLMProvider:
+        return self.providers[0]
+
+    def stats(self) -> Dict:
+        return {**self.metrics, "hedge": self.hedge, "providers": {p.name: p.stats() for p in self.providers}}
+
+    def candidates(self) -> List[LLMProvider]:
+        # Available providers in weighted random order, weight 0 ones (standbys for failover and
+        # hedges) last. If none is available, all of them, since the scheduler's circuit breaker
+        # already decides when to stop calling upstream.
+        pool = [p for p in self.providers if p.available] or list(self.providers)
+        ordered = []
+        while pool:
+            weights = [p.weight for p in pool]
+            if sum(weights) <= 0:
+                return ordered + pool
+            provider = random.choices(pool, weights)[0]
+            ordered.append(provider)
+            pool.remove(provider)
+        return ordered
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        if len(provider.latency) < self.hedge_min_samples:
+            return self.hedge_initial_delay
+        return provider.latency.percentile(self.hedge_percentile)
+
+    def record_error(self, provider: LLMProvider, error: BaseException):
+        if isinstance(error, LLMRateLimitError):
+            provider.record_rate_limit(error.retry_after)
+        elif retryable(error):
+            provider.record_failure(self.failure_threshold, self.failure_cooldown)
+
+    async def _attempt(self, send: Callable[[LLMProvider], Awaitable[Dict]], provider: LLMProvider) -> Dict:
+        started = time.perf_counter()
+        try:
+            result = await send(provider)
+        except asyncio.CancelledError:
+            # A hedge loser: its time so far is a lower bound, but keeps the tail in the window
+            provider.latency.add(time.perf_counter() - started)
+            raise
+        except Exception as e:
+            self.record_error(provider, e)
+            raise
+        provider.record_success(time.perf_counter() - started)
+        return result
+
+    async def _failover(self, send: Callable[[LLMProvider], Awaitable[Dict]], providers: List[LLMProvider], error: Optional[BaseException] = None) -> Dict:
+        for provider in providers:
+            if error is not None:
+                self.metrics["failovers"] += 1
+            try:
+                return await self._attempt(send, provider)
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                error = e
+        raise error
+
+    async def _hedged(self, send: Callable[[LLMProvider], Awaitable[Dict]], providers: List[LLMProvider]) -> Dict:
+        primary, backup = providers[0], providers[1]
+        first = asyncio.create_task(self._attempt(send, primary))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(primary))
+        if not done and not self.budget.spend():
+            self.metrics["hedges_denied"] += 1
+            done = {first}
+        if done:
+            try:
+                return await first
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                return await self._failover(send, providers[1:], e)
+
+        self.metrics["hedged"] += 1
+        hedge = asyncio.create_task(self._attempt(send, backup))
+        pending = {first, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.metrics["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                    if not retryable(error):
+                        raise error
+        finally:
+            for task in pending:
+                task.cancel()
+        return await self._failover(send, providers[2:], error)
+
+    async def call(self, send: Callable[[LLMProvider], Awaitable[Dict]]) -> Dict:
+        # send(provider) makes one request to that provider
+        self.metrics["calls"] += 1
+        self.budget.earn()
+        providers = self.candidates()
+        if self.hedge and len(providers) > 1:
+            return await self._hedged(send, providers)
+        return await self._failover(send, providers)
+
+def providers_from_settings() -> List[LLMProvider]:
+    if not settings.llm_providers:
+        return [LLMProvider("default", settings.llm_base_url, settings.llm_model, settings.groq_api_key)]
+    return [
+        LLMProvider(p.get("name", f"provider{i}"), p["base_url"], p.get("model"), p.get("api_key"), p.get("weight", 1.0))
+        for i, p in enumerate(settings.llm_providers)
+    ]
+
+@lru_cache(maxsize=None)
+def get_provider_router() -> ProviderRouter:
+    return ProviderRouter(providers_from_settings())
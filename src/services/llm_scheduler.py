@@ -0,0 +1,235 @@
+from functools import lru_cache
+from src.config.metrics import observe
+from src.config.settings import settings
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import heapq
+import httpx
+import itertools
+import random
+import time
+
+class LLMUpstreamError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+class LLMRateLimitError(LLMUpstreamError):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(429, message)
+        self.retry_after = retry_after
+
+class LLMUnavailableError(Exception):
+    # Raised instead of calling upstream: queue full or circuit open
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        # per_minute <= 0 disables the budget
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # Requests larger than the whole bucket wait for a full bucket rather than forever
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float):
+        if self.rate > 0:
+            self._refill()
+            self.level -= amount
+
+    def refund(self, amount: float):
+        if self.rate > 0 and amount > 0:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def check(self) -> bool:
+        # Returns True if the caller is the one probe let through while half open; it must call
+        # end_probe when done, whatever the outcome
+        state = self.state
+        if state == "open" or (state == "half_open" and self.probing):
+            raise LLMUnavailableError("LLM circuit open", retry_after=max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) or 1.0)
+        if state == "half_open":
+            self.probing = True  # let exactly one request through to probe upstream
+            return True
+        return False
+
+    def end_probe(self):
+        # A probe that was cancelled or failed in an unexpected way recorded no outcome; the next
+        # call probes again rather than the circuit staying shut
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+class LLMScheduler:
+    # Every outbound LLM call waits here for a requests-per-minute and tokens-per-minute
+    # budget. Waiters are served from a bounded priority queue (lower number first), and
+    # a 429's retry-after pauses the whole queue, not just the request that hit it.
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        breaker_threshold: Optional[int] = None,
+        breaker_cooldown: Optional[float] = None,
+    ):
+        self.requests = TokenBucket(settings.llm_requests_per_minute if requests_per_minute is None else requests_per_minute)
+        self.tokens = TokenBucket(settings.llm_tokens_per_minute if tokens_per_minute is None else tokens_per_minute)
+        self.max_queue = settings.llm_queue_max if max_queue is None else max_queue
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        self.backoff_base = settings.llm_backoff_base if backoff_base is None else backoff_base
+        self.backoff_max = settings.llm_backoff_max if backoff_max is None else backoff_max
+        self.breaker = CircuitBreaker(
+            settings.llm_breaker_threshold if breaker_threshold is None else breaker_threshold,
+            settings.llm_breaker_cooldown if breaker_cooldown is None else breaker_cooldown,
+        )
+        self.paused_until = 0.0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.metrics = {"queue_wait_seconds_total": 0.0, "queue_wait_seconds_max": 0.0, "granted": 0, "rejected": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+
+    def stats(self) -> Dict:
+        return {**self.metrics, "queued": len(self._waiters), "circuit": self.breaker.state}
+
+    def _wait_time(self, tokens: float) -> float:
+        return max(self.paused_until - time.monotonic(), self.requests.time_until(1), self.tokens.time_until(tokens))
+
+    def _dispatch(self):
+        self._timer = None
+        while self._waiters:
+            priority, sequence, future, tokens = self._waiters[0]
+            if future.done():  # cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            future.set_result(None)
+
+    async def acquire(self, tokens: float, priority: int = 0) -> bool:
+        # Returns whether this call is the circuit breaker's probe (see CircuitBreaker.check)
+        probe = self.breaker.check()
+        try:
+            if len(self._waiters) >= self.max_queue:
+                self.metrics["rejected"] += 1
+                raise LLMUnavailableError("LLM request queue is full", retry_after=max(1.0, self._wait_time(tokens)))
+
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, [priority, next(self._sequence), future, tokens])
+            started = time.monotonic()
+            if self._timer is None:
+                self._dispatch()
+            await future
+        except BaseException:
+            if probe:
+                self.breaker.end_probe()
+            raise
+        waited = time.monotonic() - started
+        observe("llm_queue", waited)
+        self.metrics["granted"] += 1
+        self.metrics["queue_wait_seconds_total"] += waited
+        self.metrics["queue_wait_seconds_max"] = max(self.metrics["queue_wait_seconds_max"], waited)
+        return probe
+
+    def record(self, error: Optional[BaseException] = None):
+        # Breaker bookkeeping for a finished call: only server errors and transport failures count
+        # against upstream; a 429 or another client error means it is up
+        if isinstance(error, httpx.TransportError) or (isinstance(error, LLMUpstreamError) and error.status_code >= 500):
+            self.breaker.record_failure()
+            self.metrics["failures"] += 1
+        else:
+            self.breaker.record_success()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    async def run(self, call: Callable[[], Awaitable[Dict]], tokens: float, priority: int = 0) -> Dict:
+        attempt = 0
+        while True:
+            probe = await self.acquire(tokens, priority)
+            try:
+                result = await call()
+            except LLMRateLimitError as e:
+                # A 429 means upstream is healthy but busy: no breaker failure
+                self.record(e)
+                self.metrics["rate_limited"] += 1
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                self._pause(delay)
+                error = e
+            except LLMUpstreamError as e:
+                self.record(e)
+                if e.status_code < 500:
+                    raise
+                delay, error = self._backoff(attempt), e
+            except httpx.TransportError as e:
+                self.record(e)
+                delay, error = self._backoff(attempt), e
+            else:
+                self.record()
+                # Return the unused part of the token estimate to the budget
+                self.tokens.refund(tokens - result.get("tokens_used", tokens))
+                return result
+            finally:
+                if probe:
+                    self.breaker.end_probe()
+
+            if attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            self.metrics["retries"] += 1
+            await asyncio.sleep(delay)
+
+@lru_cache(maxsize=None)
+def get_llm_scheduler() -> LLMScheduler:
+    return LLMScheduler()
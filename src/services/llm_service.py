@@ -1,56 +1,170 @@
 import httpx
+from src.config.http_client import get_http_client
+from src.config.metrics import observe, stage
 from src.config.settings import settings
-from typing import List, Dict, Optional
+from src.services.llm_providers import LLMProvider, ProviderRouter, get_provider_router, retryable
+from src.services.rag_service import BM25
+from src.services.llm_scheduler import LLMScheduler, LLMRateLimitError, LLMUpstreamError, get_llm_scheduler
+from src.services.response_cache import ResponseCache
+from src.services.tokenizer import get_tokenizer
+from typing import AsyncIterator, List, Dict, Optional
 import json
+import time
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a chat between a user and an assistant. "
+    "Update the summary with the new messages. Keep names, facts, decisions, preferences and open questions; "
+    "drop pleasantries. Reply with the updated summary only."
+)
 
 class LLMService:
-    def __init__(self):
-        self.api_key = settings.groq_api_key
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
-        self.model = "llama-3.1-8b-instant"
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, response_cache: Optional[ResponseCache] = None, scheduler: Optional[LLMScheduler] = None, router: Optional[ProviderRouter] = None):
+        self.client = client or get_http_client()
+        self.response_cache = response_cache
+        self.scheduler = scheduler or get_llm_scheduler()
+        self.router = router or get_provider_router()
+        # Response-cache keys use the primary provider's model whichever provider answers
+        self.model = self.router.primary.model
+        self.tokenizer = get_tokenizer()
+
+    def count_tokens(self, message: Dict) -> int:
+        count = message.get("token_count")
+        return count if count is not None else self.tokenizer.count(message["content"])
 
-    async def call_llm(self, messages: List[Dict], context_limit: int = 4000) -> Dict:
+    def context_window(self, messages: List[Dict], context_limit: int) -> List[Dict]:
+        # Keeps the newest messages that fit the budget (always at least the last one),
+        # using stored token counts and a reverse running sum instead of re-tokenizing
         system_message = None
         if messages and messages[0].get("role") == "system":
-            system_message = messages.pop(0)
-        system_tokens = len(system_message["content"].split()) if system_message else 0
-    
-        available_limit = context_limit - system_tokens
-        total_tokens = sum(len(msg['content'].split()) for msg in messages)
-        while total_tokens > available_limit and len(messages) > 1:
-            removed_msg = messages.pop(0) 
-            total_tokens -= len(removed_msg['content'].split())
-        if system_message:
-            messages.insert(0, system_message)
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": 1000
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.base_url, json=payload, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "content": data["choices"][0]["message"]["content"],
-                    "tokens_used": data.get("usage", {}).get("total_tokens", 0)
-                }
-            else:
-                raise Exception(f"LLM API error: {response.status_code} - {response.text}")
-
-    def retrieve_rag_context(self, query: str, document_chunks: List[str]) -> str:
-        # Simple keyword-based retrieval
-        query_words = set(query.lower().split())
-        relevant_chunks = []
-        for chunk in document_chunks:
-            chunk_words = set(chunk.lower().split())
-            if query_words & chunk_words:  # Intersection
-                relevant_chunks.append(chunk)
-        if not relevant_chunks:
-            return ""
-        return " ".join(relevant_chunks[:3])  # Top 3 chunks
\ No newline at end of file
+            system_message = messages[0]
+            messages = messages[1:]
+        available_limit = context_limit - (self.count_tokens(system_message) if system_message else 0)
+
+        start = len(messages)
+        total_tokens = 0
+        while start > 0:
+            total_tokens += self.count_tokens(messages[start - 1])
+            if total_tokens > available_limit and start < len(messages):
+                break
+            start -= 1
+
+        return ([system_message] if system_message else []) + messages[start:]
+
+    def _apply_context_window(self, messages: List[Dict], context_limit: int) -> List[Dict]:
+        return [{"role": msg["role"], "content": msg["content"]} for msg in self.context_window(messages, context_limit)]
+
+    def _token_estimate(self, payload: Dict) -> int:
+        # Budgeted against tokens-per-minute before the call; refunded to actual usage after
+        return sum(self.count_tokens(m) for m in payload["messages"]) + payload["max_tokens"]
+
+    @staticmethod
+    def _raise_for_status(status_code: int, headers: httpx.Headers, text: str):
+        message = f"LLM API error: {status_code} - {text}"
+        if status_code == 429:
+            try:
+                retry_after = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+            raise LLMRateLimitError(message, retry_after)
+        raise LLMUpstreamError(status_code, message)
+
+    async def call_llm(self, messages: List[Dict], context_limit: Optional[int] = None, use_cache: bool = True, max_tokens: int = 1000) -> Dict:
+        with stage("window"):
+            payload = {
+                "model": self.model,
+                "messages": self._apply_context_window(messages, context_limit or settings.context_token_budget),
+                "max_tokens": max_tokens
+            }
+        call = lambda: self.scheduler.run(lambda: self.router.call(lambda provider: self._post(provider, payload)), self._token_estimate(payload))
+        if self.response_cache and use_cache:
+            key = ResponseCache.key_for(self.model, payload["messages"])
+            return await self.response_cache.get_or_call(key, call)
+        return await call()
+
+    async def summarize(self, summary: Optional[str], messages: List[Dict]) -> Dict:
+        # Folds messages into the running summary of a conversation; returns {"content", "tokens_used"}
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (f"Summary so far:\n{summary}\n\n" if summary else "") + f"New messages:\n{transcript}"
+        return await self.call_llm([{"role": "system", "content": SUMMARY_INSTRUCTIONS}, {"role": "user", "content": prompt}], use_cache=False, max_tokens=settings.summary_max_tokens)
+
+    async def _post(self, provider: LLMProvider, payload: Dict) -> Dict:
+        with stage("llm_upstream"):
+            response = await self.client.post(provider.base_url, json={**payload, "model": provider.model}, headers=provider.headers())
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                "content": data["choices"][0]["message"]["content"],
+                "tokens_used": data.get("usage", {}).get("total_tokens", 0)
+            }
+        self._raise_for_status(response.status_code, response.headers, response.text)
+
+    async def stream_llm(self, messages: List[Dict], context_limit: Optional[int] = None) -> AsyncIterator[Dict]:
+        # Yields {"delta": str} per token chunk, then one {"content": str, "tokens_used": int}
+        with stage("window"):
+            payload = {
+                "model": self.model,
+                "messages": self._apply_context_window(messages, context_limit or settings.context_token_budget),
+                "max_tokens": 1000,
+                "stream": True,
+                "stream_options": {"include_usage": True}
+            }
+        # Streams take a scheduler slot but are not retried or hedged: deltas may already be relayed.
+        # They only fail over to another provider if one refuses before the first delta.
+        tokens = self._token_estimate(payload)
+        probe = await self.scheduler.acquire(tokens)
+        try:
+            providers = self.router.candidates()
+            for provider in providers:
+                relayed = False
+                try:
+                    async for event in self._stream_from(provider, payload):
+                        relayed = True
+                        if "tokens_used" in event:
+                            # Like a completed call: upstream is up, and the unused estimate goes back
+                            self.scheduler.record()
+                            self.scheduler.tokens.refund(tokens - event["tokens_used"])
+                        yield event
+                    return
+                except (LLMUpstreamError, httpx.TransportError) as e:
+                    self.router.record_error(provider, e)
+                    if relayed or not retryable(e) or provider is providers[-1]:
+                        self.scheduler.record(e)
+                        raise
+                    self.router.metrics["failovers"] += 1
+        finally:
+            # Also covers a stream closed early by its consumer, which records no outcome
+            if probe:
+                self.scheduler.breaker.end_probe()
+
+    async def _stream_from(self, provider: LLMProvider, payload: Dict) -> AsyncIterator[Dict]:
+        content = []
+        usage = {}
+        started = time.perf_counter()
+        first_token = None
+        async with self.client.stream("POST", provider.base_url, json={**payload, "model": provider.model}, headers=provider.headers()) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                self._raise_for_status(response.status_code, response.headers, body.decode(errors="replace"))
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                # Groq reports usage under x_groq on the final chunk
+                usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+                for choice in chunk.get("choices", []):
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                            observe("llm_first_token", first_token)
+                        content.append(delta)
+                        yield {"delta": delta}
+        observe("llm_upstream", time.perf_counter() - started)
+        yield {"content": "".join(content), "tokens_used": usage.get("total_tokens", 0)}
+
+    def retrieve_rag_context(self, query: str, document_chunks: List[str], top_k: int = 3) -> str:
+        # BM25-ranked keyword retrieval over chunks already in memory
+        return " ".join(BM25().rank(query, document_chunks, top_k))
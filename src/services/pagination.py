@@ -0,0 +1,26 @@
+from typing import Awaitable, Callable, List
+import redis.asyncio as redis
+from src.services.tiered_cache import TieredCache
+import base64
+import json
+
+COUNT_TTL = 60  # Totals are cached briefly; they only need to be roughly current
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types: type) -> List:
+    # `types` are the expected type of each value; anything else is a client error, not a query
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    if types and (len(values) != len(types) or any(isinstance(v, bool) or not isinstance(v, t) for v, t in zip(values, types))):
+        raise ValueError("Invalid cursor")
+    return values
+
+async def cached_count(redis_client: redis.Redis, key: str, count: Callable[[], Awaitable[int]], ttl: int = COUNT_TTL) -> int:
+    return await TieredCache(redis_client).get_or_load(key, count, ttl)
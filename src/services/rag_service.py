@@ -0,0 +1,178 @@
+from collections import Counter, defaultdict
+from sqlalchemy import delete, insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.settings import settings
+from src.models import Document, DocumentChunk, ChunkPosting
+from src.services.embeddings import get_embedder
+from src.services.vector_store import get_vector_store
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import heapq
+import math
+import re
+
+TERM_PATTERN = re.compile(r"\w+")
+# Very common words carry almost no BM25 weight but have the longest postings lists
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or that the this to was were what when where which who will with you your".split()
+)
+
+def analyze(text: str) -> List[str]:
+    return [term for term in TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+def split_chunks(content: str) -> List[str]:
+    return [chunk.strip() for chunk in content.split("\n\n") if chunk.strip()]
+
+class BM25:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def idf(self, document_frequency: int, chunk_count: int) -> float:
+        return math.log(1 + (chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def score(self, postings: Iterable[Tuple[str, int, int, int]], chunk_count: int, average_length: float) -> Dict[int, float]:
+        # postings: (term, chunk_id, term_frequency, chunk_length) for the query terms only
+        by_term = defaultdict(list)
+        for term, chunk_id, term_frequency, chunk_length in postings:
+            by_term[term].append((chunk_id, term_frequency, chunk_length))
+
+        scores = defaultdict(float)
+        for term, matches in by_term.items():
+            idf = self.idf(len(matches), chunk_count)
+            for chunk_id, term_frequency, chunk_length in matches:
+                norm = self.k1 * (1 - self.b + self.b * chunk_length / average_length)
+                scores[chunk_id] += idf * term_frequency * (self.k1 + 1) / (term_frequency + norm)
+        return scores
+
+    def top_k(self, scores: Dict[int, float], k: int) -> List[int]:
+        return [chunk_id for chunk_id, _ in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))]
+
+    def rank(self, query: str, chunks: List[str], k: int = 3) -> List[str]:
+        # In-memory ranking for callers that already hold the chunk texts
+        query_terms = set(analyze(query))
+        postings = []
+        lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            terms = analyze(chunk)
+            lengths.append(len(terms))
+            for term, term_frequency in Counter(terms).items():
+                if term in query_terms:
+                    postings.append((term, chunk_id, term_frequency, len(terms)))
+        if not postings:
+            return []
+        scores = self.score(postings, len(chunks), sum(lengths) / len(chunks) or 1.0)
+        return [chunks[chunk_id] for chunk_id in self.top_k(scores, k)]
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int, constant: int = 60) -> List[int]:
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] += 1 / (constant + rank + 1)
+    return [chunk_id for chunk_id, _ in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))]
+
+class RAGService:
+    def __init__(self, db: AsyncSession, mode: Optional[str] = None):
+        self.db = db
+        self.mode = mode or settings.rag_mode
+        self.bm25 = BM25()
+        self.embedder = get_embedder()
+        self.vector_store = get_vector_store()
+
+    async def index_document(self, document: Document):
+        # (Re)builds the chunks and postings of one document; other documents are untouched
+        await self.db.execute(delete(ChunkPosting).where(ChunkPosting.document_id == document.id))
+        await self.db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document.id))
+
+        chunks = split_chunks(document.content or "")
+        analyzed = [analyze(chunk) for chunk in chunks]
+        chunk_rows = [
+            DocumentChunk(document_id=document.id, position=position, content=chunk, length=len(terms))
+            for position, (chunk, terms) in enumerate(zip(chunks, analyzed))
+        ]
+        self.db.add_all(chunk_rows)
+        await self.db.flush()
+
+        postings = [
+            {"term": term, "document_id": document.id, "chunk_id": row.id, "term_frequency": term_frequency, "chunk_length": row.length}
+            for row, terms in zip(chunk_rows, analyzed)
+            for term, term_frequency in Counter(terms).items()
+        ]
+        if postings:
+            await self.db.execute(insert(ChunkPosting), postings)
+        document.chunk_count = len(chunk_rows)
+        document.total_length = sum(row.length for row in chunk_rows)
+        if self.mode != "bm25":
+            await self._embed(document.id, [row.id for row in chunk_rows], chunks)
+        else:
+            # Drop any matrix built for the old chunks; it is rebuilt if dense retrieval is enabled
+            self.vector_store.delete(document.id)
+
+    async def ensure_embedded(self, document_ids: List[int]):
+        # Documents indexed while dense retrieval was off get their matrix built on first use
+        for document_id in document_ids:
+            if self.vector_store.load(document_id) is None:
+                result = await self.db.execute(select(DocumentChunk.id, DocumentChunk.content).where(DocumentChunk.document_id == document_id).order_by(DocumentChunk.position))
+                rows = result.all()
+                if rows:
+                    await self._embed(document_id, [row.id for row in rows], [row.content for row in rows])
+
+    async def _embed(self, document_id: int, chunk_ids: List[int], chunks: List[str]):
+        # Embedding and writing the matrix are CPU and disk bound: run them off the event loop
+        await asyncio.to_thread(lambda: self.vector_store.write(document_id, chunk_ids, self.embedder.embed(chunks)))
+
+    async def ensure_indexed(self, document_ids: List[int]) -> List[int]:
+        # Documents loaded without going through index_document are indexed once, on first use.
+        # Returns the ids that can be searched: uploads still ingesting, or failed, are left out.
+        result = await self.db.execute(select(Document.id, Document.chunk_count).where(Document.id.in_(document_ids), Document.status == "ready"))
+        ready = result.all()
+        unindexed = [row.id for row in ready if row.chunk_count is None]
+        if unindexed:
+            for document in (await self.db.scalars(select(Document).where(Document.id.in_(unindexed)))).all():
+                await self.index_document(document)
+            await self.db.commit()
+        return [row.id for row in ready]
+
+    async def retrieve(self, query: str, document_ids: List[int], top_k: int = 3) -> List[str]:
+        if not document_ids:
+            return []
+        document_ids = await self.ensure_indexed(document_ids)
+        if not document_ids:
+            return []
+
+        if self.mode == "dense":
+            best = await self._dense_ranking(query, document_ids, top_k)
+        elif self.mode == "hybrid":
+            # Fuse deeper candidate lists so a chunk ranked well by one side can still surface
+            depth = top_k * 4
+            best = reciprocal_rank_fusion([await self._bm25_ranking(query, document_ids, depth), await self._dense_ranking(query, document_ids, depth)], top_k)
+        else:
+            best = await self._bm25_ranking(query, document_ids, top_k)
+        if not best:
+            return []
+
+        result = await self.db.execute(select(DocumentChunk.id, DocumentChunk.content).where(DocumentChunk.id.in_(best)))
+        content = dict(result.all())
+        return [content[chunk_id] for chunk_id in best if chunk_id in content]
+
+    async def _bm25_ranking(self, query: str, document_ids: List[int], top_k: int) -> List[int]:
+        query_terms = set(analyze(query))
+        if not query_terms:
+            return []
+        stats = await self.db.execute(select(func.sum(Document.chunk_count), func.sum(Document.total_length)).where(Document.id.in_(document_ids)))
+        chunk_count, total_length = stats.one()
+        if not chunk_count:
+            return []
+
+        result = await self.db.execute(
+            select(ChunkPosting.term, ChunkPosting.chunk_id, ChunkPosting.term_frequency, ChunkPosting.chunk_length)
+            .where(ChunkPosting.term.in_(query_terms), ChunkPosting.document_id.in_(document_ids))
+        )
+        scores = self.bm25.score(result.all(), chunk_count, (total_length / chunk_count) or 1.0)
+        return self.bm25.top_k(scores, top_k)
+
+    async def _dense_ranking(self, query: str, document_ids: List[int], top_k: int) -> List[int]:
+        await self.ensure_embedded(document_ids)
+        # Embedding the query and scoring the mapped matrices are CPU and disk bound, like _embed
+        results = await asyncio.to_thread(lambda: self.vector_store.search(document_ids, self.embedder.embed([query])[0], top_k))
+        return [chunk_id for chunk_id, score in results if score > 0]
@@ -0,0 +1,106 @@
+import redis.asyncio as redis
+from src.config.settings import settings
+from src.services.codec import Codec, get_codec
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import time
+
+# Calls in flight in this process, keyed by prompt hash (single-flight)
+_inflight: Dict[str, asyncio.Future] = {}
+
+class ResponseCache:
+    prefix = "llm:response:"
+    index_key = "llm:response:index"  # sorted set of cached keys by insert time, for the size cap
+    stats_key = "llm:response:stats"
+
+    def __init__(self, redis_client: redis.Redis, ttl: Optional[int] = None, max_entries: Optional[int] = None, lease_ms: int = 30000, codec: Optional[Codec] = None):
+        self.redis = redis_client
+        self.codec = codec or get_codec()
+        self.ttl = ttl or settings.llm_response_cache_ttl
+        self.max_entries = max_entries or settings.llm_response_cache_max_entries
+        self.lease_ms = lease_ms
+
+    @classmethod
+    def key_for(cls, model: str, messages: List[Dict]) -> str:
+        # messages is the trimmed window actually sent, so RAG context (the system message) is part of the key
+        canonical = json.dumps(
+            {"model": model, "messages": [{"role": m["role"], "content": m["content"].strip()} for m in messages]},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+        )
+        return cls.prefix + hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        cached = await self.redis.get(key)
+        return self.codec.decode(cached) if cached else None
+
+    async def set(self, key: str, value: Dict):
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, self.codec.encode(value), ex=self.ttl)
+            pipe.zadd(self.index_key, {key: now})
+            pipe.zremrangebyscore(self.index_key, "-inf", now - self.ttl)
+            pipe.zcard(self.index_key)
+            size = (await pipe.execute())[-1]
+        if size > self.max_entries:
+            evicted = await self.redis.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                await self.redis.delete(*[member for member, _ in evicted])
+
+    async def stats(self) -> Dict:
+        counts = await self.redis.hgetall(self.stats_key)
+        stats = {name: int(counts.get(name.encode(), 0)) for name in ("hits", "misses", "coalesced")}
+        stats["entries"] = await self.redis.zcard(self.index_key)
+        return stats
+
+    async def _count(self, name: str):
+        await self.redis.hincrby(self.stats_key, name, 1)
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[Dict]]) -> Dict:
+        # Cache hits and coalesced followers report tokens_used=0: no provider tokens were spent for them
+        cached = await self.get(key)
+        if cached is not None:
+            await self._count("hits")
+            return {**cached, "tokens_used": 0}
+
+        if key in _inflight:
+            await self._count("coalesced")
+            return {**await asyncio.shield(_inflight[key]), "tokens_used": 0}
+
+        await self._count("misses")
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            result = await self._call_with_lease(key, call)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            _inflight.pop(key, None)
+            if not future.done():
+                # Leader was cancelled (e.g. client disconnect): release followers with an error
+                future.set_exception(Exception("LLM call was cancelled"))
+            future.exception()  # mark any exception retrieved when nobody else was waiting
+
+    async def _call_with_lease(self, key: str, call: Callable[[], Awaitable[Dict]]) -> Dict:
+        # A short Redis lease extends single-flight across workers: the holder calls upstream,
+        # everyone else polls for its result until the lease runs out
+        lease = f"{key}:lease"
+        held = await self.redis.set(lease, 1, nx=True, px=self.lease_ms)
+        if not held:
+            deadline = time.monotonic() + self.lease_ms / 1000
+            while time.monotonic() < deadline and await self.redis.exists(lease):
+                await asyncio.sleep(0.05)
+                cached = await self.get(key)
+                if cached is not None:
+                    return {**cached, "tokens_used": 0}
+        try:
+            result = await call()
+            await self.set(key, {"content": result["content"]})
+            return result
+        finally:
+            if held:
+                await self.redis.delete(lease)
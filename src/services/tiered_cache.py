@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from functools import lru_cache
+from src.config.metrics import LOCAL_CACHE_LOOKUPS, record_cache_lookup
+from src.config.settings import settings
+from src.services.codec import Codec, get_codec
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+import asyncio
+import json
+import logging
+import redis.asyncio as redis
+import time
+
+logger = logging.getLogger(__name__)
+
+# Every worker drops the keys published here from its in-process tier
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Loads in flight in this process, keyed by cache key (single-flight)
+_inflight: Dict[str, asyncio.Future] = {}
+
+class LocalCache:
+    # Bounded in-process LRU in front of Redis. Entries are dropped when any worker publishes an
+    # invalidation for their key, and expire after `ttl` in case a message was missed.
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        # Bumped by every invalidation: a value read from Redis before one is not stored
+        self.generation = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self.entries.get(key)
+        hit = item is not None and item[0] > time.monotonic()
+        LOCAL_CACHE_LOOKUPS.labels(key.split(":", 1)[0], "hit" if hit else "miss").inc()
+        if not hit:
+            if item is not None:
+                del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return item[1]
+
+    def set(self, key: str, value: Any, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[str]):
+        self.generation += 1
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
+
+@lru_cache(maxsize=None)
+def get_local_cache() -> Optional[LocalCache]:
+    if not settings.local_cache:
+        return None
+    return LocalCache(settings.local_cache_max_entries, settings.local_cache_ttl)
+
+def invalidation_message(keys: Iterable[str]) -> str:
+    return json.dumps(list(keys))
+
+async def invalidate(redis_client: redis.Redis, *keys: str, local: Optional[LocalCache] = None):
+    # Deletes keys from Redis and, with the local tier on, from every worker's local tier
+    local = local if local is not None else get_local_cache()
+    if local is None:
+        await redis_client.delete(*keys)
+        return
+    local.invalidate(keys)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.delete(*keys)
+        pipe.publish(INVALIDATION_CHANNEL, invalidation_message(keys))
+        await pipe.execute()
+
+async def single_flight(key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    # Concurrent misses for the same key in this process share one load
+    if key in _inflight:
+        return await asyncio.shield(_inflight[key])
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await load()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        _inflight.pop(key, None)
+        if not future.done():
+            future.set_exception(Exception("Cache load was cancelled"))
+        future.exception()  # mark any exception retrieved when nobody else was waiting
+
+class TieredCache:
+    # Read-through cache for single values: local tier, then Redis, then `load` (once per key per
+    # process however many requests miss together). None is never cached.
+    def __init__(self, redis_client: redis.Redis, codec: Optional[Codec] = None, local: Optional[LocalCache] = None):
+        self.redis = redis_client
+        self.codec = codec or get_codec()
+        self.local = local if local is not None else get_local_cache()
+
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+        return await single_flight(key, lambda: self._load(key, load, ttl))
+
+    async def _load(self, key: str, load: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+        generation = self.local.generation if self.local is not None else None
+        cached = await self.redis.get(key)
+        record_cache_lookup(key, cached is not None)
+        if cached is not None:
+            value = self.codec.decode(cached)
+        else:
+            value = await load()
+            if value is None:
+                return None
+            await self.redis.set(key, self.codec.encode(value), ex=ttl)
+        if self.local is not None:
+            self.local.set(key, value, generation)
+        return value
+
+class InvalidationListener:
+    # Subscribes to INVALIDATION_CHANNEL for the life of the app and applies what other workers
+    # publish to this process's local tier. After (re)subscribing the local tier is cleared,
+    # since invalidations sent while unsubscribed are lost.
+    def __init__(self, redis_client: redis.Redis, local: LocalCache):
+        self.redis = redis_client
+        self.local = local
+        self._task: Optional[asyncio.Task] = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self.local.clear()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self.local.invalidate(json.loads(message["data"]))
+            except Exception as e:
+                # Anything but cancellation resubscribes, so the local tier is never left unwatched
+                if isinstance(e, redis.RedisError):
+                    logger.warning("Cache invalidation listener lost Redis, resubscribing: %s", e)
+                else:
+                    logger.exception("Cache invalidation listener failed, resubscribing")
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
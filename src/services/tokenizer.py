@@ -0,0 +1,47 @@
+from functools import lru_cache
+from importlib import import_module
+from typing import Protocol
+from src.config.settings import settings
+import math
+import re
+
+class Tokenizer(Protocol):
+    def count(self, text: str) -> int:
+        ...
+
+class WhitespaceTokenizer:
+    # The original estimate: one token per whitespace-separated word
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+class RegexTokenizer:
+    # Offline approximation of Llama/GPT BPE: words split the way the BPE pre-tokenizer
+    # splits them, punctuation counted separately, and long words charged ~4 chars per token
+    pattern = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+        # With a whole number n of chars per token, \w{1,n} cuts each word into exactly
+        # ceil(len / n) matches, so the count is the number of matches with no per-piece Python
+        self.chunk_pattern = re.compile(rf"\w{{1,{int(chars_per_token)}}}|[^\w\s]") if chars_per_token == int(chars_per_token) >= 1 else None
+
+    def count(self, text: str) -> int:
+        if self.chunk_pattern is not None:
+            return len(self.chunk_pattern.findall(text))
+        return sum(max(1, math.ceil(len(piece) / self.chars_per_token)) for piece in self.pattern.findall(text))
+
+TOKENIZERS = {
+    "whitespace": WhitespaceTokenizer,
+    "regex": RegexTokenizer,
+}
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name: str = None) -> Tokenizer:
+    # Accepts a registered name or a "package.module:ClassName" import path
+    name = name or settings.tokenizer
+    if name in TOKENIZERS:
+        return TOKENIZERS[name]()
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown tokenizer: {name}")
+    return getattr(import_module(module_name), class_name)()
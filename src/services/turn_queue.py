@@ -0,0 +1,229 @@
+from abc import ABC, abstractmethod
+import redis.asyncio as redis
+from src.config.redis_client import get_redis
+from src.config.settings import settings
+from src.models import AsyncSessionLocal
+from src.services.conversation_service import ConversationService
+from src.services.llm_scheduler import LLMUnavailableError
+from typing import Dict, List, Optional
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+
+FINISHED = ("done", "failed")
+
+class TurnQueue(ABC):
+    # Chat turns accepted with 202 and run by workers off the request path. Each turn's status
+    # and result live in a Redis hash (turn:{id}) for polling, and every status change is
+    # published on turn:{id}:events. Subclasses only decide how jobs travel to the workers.
+    # A worker holds a lease (turn:{id}:lease) while it runs a turn, renewed every third of
+    # lease_ms, so a redelivery that arrives meanwhile waits instead of running the turn twice.
+
+    def __init__(self, redis_client: redis.Redis, session_factory=None, service_factory=None, result_ttl: Optional[int] = None, max_deliveries: Optional[int] = None, retry_delay: Optional[float] = None, lease_ms: Optional[int] = None):
+        self.redis = redis_client
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.service_factory = service_factory or ConversationService
+        self.result_ttl = result_ttl or settings.turn_result_ttl
+        self.max_deliveries = max_deliveries or settings.turn_max_deliveries
+        self.retry_delay = settings.turn_claim_idle_ms / 1000 if retry_delay is None else retry_delay
+        self.lease_ms = lease_ms or settings.turn_lease_ms
+        self._workers: List[asyncio.Task] = []
+
+    @staticmethod
+    def key(turn_id: str) -> str:
+        return f"turn:{turn_id}"
+
+    @staticmethod
+    def channel(turn_id: str) -> str:
+        return f"turn:{turn_id}:events"
+
+    @staticmethod
+    def lease_key(turn_id: str) -> str:
+        return f"turn:{turn_id}:lease"
+
+    async def submit(self, conversation_id: int, message: str, document_ids: Optional[List[int]] = None) -> str:
+        turn_id = uuid.uuid4().hex
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key(turn_id), mapping={"status": "queued", "conversation_id": conversation_id, "submitted_at": time.time(), "attempts": 0})
+            pipe.expire(self.key(turn_id), self.result_ttl)
+            await pipe.execute()
+        await self._enqueue({"turn_id": turn_id, "conversation_id": conversation_id, "message": message, "document_ids": document_ids})
+        return turn_id
+
+    async def get(self, turn_id: str) -> Optional[Dict]:
+        record = {k.decode(): v.decode() for k, v in (await self.redis.hgetall(self.key(turn_id))).items()}
+        if "status" not in record:
+            return None
+        turn = {"turn_id": turn_id, "status": record["status"], "conversation_id": int(record["conversation_id"]), "attempts": int(record["attempts"])}
+        if "result" in record:
+            turn["result"] = json.loads(record["result"])
+        if "error" in record:
+            turn["error"] = record["error"]
+        return turn
+
+    async def wait(self, turn_id: str, timeout: float) -> Optional[Dict]:
+        # Subscribe before reading the status, so a turn finishing in between is not missed
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.channel(turn_id))
+        try:
+            deadline = time.monotonic() + timeout
+            turn = await self.get(turn_id)
+            while turn is not None and turn["status"] not in FINISHED and deadline > time.monotonic():
+                if await pubsub.get_message(ignore_subscribe_messages=True, timeout=deadline - time.monotonic()):
+                    turn = await self.get(turn_id)
+            return turn
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    async def _set_status(self, turn_id: str, status: str, **fields):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key(turn_id), mapping={"status": status, **fields})
+            pipe.expire(self.key(turn_id), self.result_ttl)
+            pipe.publish(self.channel(turn_id), json.dumps({"turn_id": turn_id, "status": status}))
+            await pipe.execute()
+
+    async def _run(self, job: Dict) -> bool:
+        # Runs one delivery of a turn. Returns False if the turn should be delivered again later.
+        turn_id = job["turn_id"]
+        token = uuid.uuid4().hex
+        if not await self.redis.set(self.lease_key(turn_id), token, nx=True, px=self.lease_ms):
+            return False  # still running on another worker, which settles it
+        renewal = asyncio.create_task(self._renew_lease(turn_id, token))
+        try:
+            return await self._run_leased(turn_id, job)
+        finally:
+            renewal.cancel()
+            if await self.redis.get(self.lease_key(turn_id)) == token.encode():
+                await self.redis.delete(self.lease_key(turn_id))
+
+    async def _renew_lease(self, turn_id: str, token: str):
+        while True:
+            await asyncio.sleep(self.lease_ms / 3000)
+            if await self.redis.get(self.lease_key(turn_id)) != token.encode():
+                return
+            await self.redis.pexpire(self.lease_key(turn_id), self.lease_ms)
+
+    async def _run_leased(self, turn_id: str, job: Dict) -> bool:
+        # The status is read under the lease, so a turn another worker just settled is not rerun
+        status = await self.redis.hget(self.key(turn_id), "status")
+        if status is None or status.decode() in FINISHED:
+            return True  # expired, or a redelivery of a turn that already settled
+        attempts = await self.redis.hincrby(self.key(turn_id), "attempts", 1)
+        if attempts > self.max_deliveries:
+            await self._set_status(turn_id, "failed", error=f"Gave up after {self.max_deliveries} deliveries")
+            return True
+
+        await self._set_status(turn_id, "running")
+        try:
+            async with self.session_factory() as db:
+                # Keyed by the turn id, so a turn whose worker died after saving it is not saved twice
+                result = await self.service_factory(db, self.redis).add_message(job["conversation_id"], job["message"], job["document_ids"], idempotency_key=turn_id)
+        except LLMUnavailableError as e:
+            # Circuit open or LLM queue full: hand the turn back for a later delivery
+            await self._set_status(turn_id, "queued", error=str(e))
+            return False
+        except Exception as e:
+            print(f"Turn {turn_id} failed: {e}")
+            await self._set_status(turn_id, "failed", error=str(e))
+            return True
+        await self._set_status(turn_id, "done", result=json.dumps(result), finished_at=time.time())
+        return True
+
+    async def _prepare(self):
+        pass
+
+    @abstractmethod
+    async def _enqueue(self, job: Dict):
+        ...
+
+    @abstractmethod
+    async def _work(self, consumer: str):
+        ...
+
+    async def start(self, workers: int):
+        await self._prepare()
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._workers = [asyncio.create_task(self._work(f"{prefix}-{i}")) for i in range(workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+class LocalTurnQueue(TurnQueue):
+    # In-process queue for tests and single-process deployments; turns still queued are lost on restart
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def _enqueue(self, job: Dict):
+        self.queue.put_nowait(job)
+
+    async def _work(self, consumer: str):
+        while True:
+            job = await self.queue.get()
+            try:
+                if not await self._run(job):
+                    asyncio.get_running_loop().call_later(self.retry_delay, self.queue.put_nowait, job)
+            finally:
+                self.queue.task_done()
+
+class RedisTurnQueue(TurnQueue):
+    # Redis Stream with one consumer group: each turn goes to a single worker and is acked once it
+    # settles. Entries left pending by a worker that crashed, or by a turn handed back while the
+    # LLM is unavailable, are claimed by another worker once idle for retry_delay. A claimed turn
+    # whose first worker is still running it is left pending (its lease is held) and acked by
+    # that worker when it settles.
+    stream = "turns:stream"
+    group = "turn-workers"
+
+    def __init__(self, *args, block_ms: int = 5000, max_length: int = 100000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.block_ms = block_ms
+        self.max_length = max_length
+
+    async def _prepare(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _enqueue(self, job: Dict):
+        await self.redis.xadd(self.stream, {"job": json.dumps(job)}, maxlen=self.max_length, approximate=True)
+
+    async def _handle(self, entry_id: bytes, fields: Optional[Dict]):
+        if not fields or await self._run(json.loads(fields[b"job"])):
+            await self.redis.xack(self.stream, self.group, entry_id)
+
+    async def _work(self, consumer: str):
+        while True:
+            try:
+                claimed = (await self.redis.xautoclaim(self.stream, self.group, consumer, min_idle_time=int(self.retry_delay * 1000), start_id="0-0", count=10))[1]
+                for entry_id, fields in claimed:
+                    await self._handle(entry_id, fields)
+                entries = await self.redis.xreadgroup(self.group, consumer, {self.stream: ">"}, count=1, block=self.block_ms)
+                for _, messages in entries:
+                    for entry_id, fields in messages:
+                        await self._handle(entry_id, fields)
+                if not claimed and not entries:
+                    await asyncio.sleep(0.05)  # in case BLOCK returned early (e.g. an in-memory Redis)
+            except redis.RedisError as e:
+                print(f"Turn worker {consumer}: {e}")
+                await asyncio.sleep(1)
+
+TURN_QUEUES = {"local": LocalTurnQueue, "redis": RedisTurnQueue}
+
+_queue: Optional[TurnQueue] = None
+
+def get_turn_queue() -> TurnQueue:
+    global _queue
+    if _queue is None:
+        _queue = TURN_QUEUES[settings.turn_queue_backend](get_redis())
+    return _queue
@@ -1,48 +1,81 @@
-from sqlalchemy.orm import Session
-from src.models import User
-from pydantic import BaseModel
-from typing import List, Dict
-import redis
-import json
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import User, pin_primary
+from src.services.pagination import cached_count, decode_cursor, encode_cursor
+from src.services.tiered_cache import TieredCache, invalidate
+from typing import Dict, List, Optional
+import redis.asyncio as redis
 
 class UserService:
-    def __init__(self, db: Session, redis_client: redis.Redis):
+    count_key = "users:count"
+    # The unpaginated listing (GET /users without cursor or limit), as the baseline cached it
+    list_key = "users"
+
+    def __init__(self, db: AsyncSession, redis_client: redis.Redis):
         self.db = db
         self.redis = redis_client
+        self.cache = TieredCache(redis_client)
 
-    def create_user(self, username: str, email: str) -> User:
+    async def create_user(self, username: str, email: str) -> User:
         # Check if user already exists
-        if self.db.query(User).filter(User.username == username).first():
+        if await self.db.scalar(select(User.id).where(User.username == username)):
             raise ValueError("Username already registered")
-        if self.db.query(User).filter(User.email == email).first():
+        if await self.db.scalar(select(User.id).where(User.email == email)):
             raise ValueError("Email already registered")
             
         new_user = User(username=username, email=email)
         self.db.add(new_user)
-        self.db.commit()
-        self.db.refresh(new_user)
-        self.redis.delete("users")
+        await self.db.flush()
+        await pin_primary(self.redis, f"user:{new_user.id}")  # before the commit, for read-your-writes
+        await self.db.commit()
+        await self.db.refresh(new_user)
+        await invalidate(self.redis, self.count_key, self.list_key)
         return new_user
 
-    def get_user(self, user_id: int) -> User:
-        cached_user = self.redis.get(f"user:{user_id}")
-        if cached_user:
-            return User(**json.loads(cached_user))
-            
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
+    @staticmethod
+    def user_dict(user: User) -> Dict:
+        return {"id": user.id, "username": user.username, "email": user.email, "created_at": user.created_at.isoformat()}
+
+    async def get_user(self, user_id: int) -> Dict:
+        # Served from the local tier or Redis as a plain dict; the DB is only read on a miss
+        user = await self.cache.get_or_load(f"user:{user_id}", lambda: self._load_user(user_id), 3600)  # Cache for 1 hour
+        if user is None:
             raise ValueError("User not found")
-        
-        user_dict = {"id": user.id, "username": user.username, "email": user.email, "created_at": user.created_at.isoformat()}
-        self.redis.set(f"user:{user_id}", json.dumps(user_dict), ex=3600) # Cache for 1 hour
         return user
 
-    def list_users(self) -> List[Dict]:
-        cached_users = self.redis.get("users")
-        if cached_users:
-            return json.loads(cached_users)
+    async def _load_user(self, user_id: int) -> Optional[Dict]:
+        user = await self.db.get(User, user_id)
+        return self.user_dict(user) if user else None
+
+    async def _load_all_users(self) -> List[Dict]:
+        result = await self.db.execute(select(User).order_by(User.id))
+        return [self.user_dict(u) for u in result.scalars().all()]
+
+    async def list_users(self, cursor: Optional[str] = None, limit: Optional[int] = None, include_total: bool = False) -> Dict:
+        # Keyset pagination by id: each page is one primary-key range scan. Without a cursor or
+        # limit every user is returned, as before paging existed, from a cache dropped whenever a
+        # user is added; a cursor alone pages by 50.
+        if cursor and limit is None:
+            limit = 50
+        if limit is None:
+            user_list = await self.cache.get_or_load(self.list_key, self._load_all_users, 3600)  # Cache for 1 hour
+            response = {"users": user_list, "limit": None, "next_cursor": None}
+            if include_total:
+                response["total"] = len(user_list)
+            return response
+        query = select(User).order_by(User.id).limit(limit + 1)
+        if cursor:
+            (after_id,) = decode_cursor(cursor, int)
+            query = query.where(User.id > after_id)
+        result = await self.db.execute(query)
+        users = result.scalars().all()
 
-        users = self.db.query(User).all()
-        user_list = [{"id": u.id, "username": u.username, "email": u.email, "created_at": u.created_at.isoformat()} for u in users]
-        self.redis.set("users", json.dumps(user_list), ex=3600) # Cache for 1 hour
-        return user_list
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1].id)
+        user_list = [self.user_dict(u) for u in users]
+        response = {"users": user_list, "limit": limit, "next_cursor": next_cursor}
+        if include_total:
+            response["total"] = await cached_count(self.redis, self.count_key, lambda: self.db.scalar(select(func.count()).select_from(User)))
+        return response
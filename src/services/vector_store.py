@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from functools import lru_cache
+from src.config.settings import settings
+from typing import List, Optional, Tuple
+import numpy as np
+import os
+import threading
+
+class VectorStore:
+    # One contiguous float32 matrix per document (row i = chunk_ids[i]), stored as .npy
+    # and memory-mapped on read, so only the pages a query touches are loaded. Open maps are
+    # kept per process and keyed by the matrix file's inode and mtime, so a document re-indexed
+    # by another worker is reopened on its next search instead of scored from stale vectors.
+    # Searches run in worker threads (see RAGService), so the map cache is guarded by a lock.
+    def __init__(self, path: str, max_open: int = 256):
+        self.path = path
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _files(self, document_id: int) -> Tuple[str, str]:
+        base = os.path.join(self.path, f"document_{document_id}")
+        return f"{base}.f32.npy", f"{base}.ids.npy"
+
+    def write(self, document_id: int, chunk_ids: List[int], matrix: np.ndarray):
+        os.makedirs(self.path, exist_ok=True)
+        matrix_file, ids_file = self._files(document_id)
+        with self._lock:
+            self._open.pop(document_id, None)
+        # Write to temp files then rename, so concurrent readers never see a partial matrix
+        np.save(f"{ids_file}.tmp.npy", np.asarray(chunk_ids, dtype=np.int64))
+        np.save(f"{matrix_file}.tmp.npy", np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(f"{ids_file}.tmp.npy", ids_file)
+        os.replace(f"{matrix_file}.tmp.npy", matrix_file)
+
+    def delete(self, document_id: int):
+        with self._lock:
+            self._open.pop(document_id, None)
+        for file in self._files(document_id):
+            if os.path.exists(file):
+                os.remove(file)
+
+    def load(self, document_id: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        matrix_file, ids_file = self._files(document_id)
+        try:
+            stat = os.stat(matrix_file)
+        except FileNotFoundError:
+            with self._lock:
+                self._open.pop(document_id, None)
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._open.get(document_id)
+            if cached is not None and cached[0] == version:
+                self._open.move_to_end(document_id)
+                return cached[1]
+        loaded = (np.load(matrix_file, mmap_mode="r"), np.load(ids_file))
+        if len(loaded[0]) != len(loaded[1]):
+            return None  # caught between the two renames of a write; the next search sees both
+        with self._lock:
+            self._open[document_id] = (version, loaded)
+            self._open.move_to_end(document_id)
+            if len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return loaded
+
+    def search(self, document_ids: List[int], query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        # Each document's mapped matrix is scored in place and cut to its own top k, so a query
+        # holds at most k candidates per document beyond the scores of the one being read
+        best_scores, best_ids = [], []
+        for document_id in document_ids:
+            loaded = self.load(document_id)
+            if loaded is None or not len(loaded[1]):
+                continue
+            matrix, chunk_ids = loaded
+            scores = matrix @ query
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                scores, chunk_ids = scores[top], chunk_ids[top]
+            best_scores.append(scores)
+            best_ids.append(chunk_ids)
+        if not best_scores:
+            return []
+        scores = np.concatenate(best_scores)
+        ids = np.concatenate(best_ids)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+@lru_cache(maxsize=None)
+def get_vector_store() -> VectorStore:
+    return VectorStore(settings.vector_store_path)
@@ -0,0 +1,36 @@
+import fakeredis
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.models import Base
+
+# ---------------------------
+# Test DB setup
+# ---------------------------
+TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+
+@pytest_asyncio.fixture(scope="function")
+async def db_session():
+    engine = create_async_engine(TEST_DATABASE_URL)
+    TestingSessionLocal = async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+@pytest_asyncio.fixture
+async def mock_redis():
+    redis = fakeredis.FakeAsyncRedis()
+    yield redis
+    await redis.aclose()
@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy import select, func
+
+from src.models import Conversation, Message, ChatMode
+from src.services.chat_session import ChatSession
+from src.services.conversation_service import ConversationService
+
+def fake_stream(prompts):
+    async def stream_llm(messages, context_limit=None):
+        prompts.append(messages)
+        yield {"delta": "Hi"}
+        yield {"delta": " there"}
+        yield {"content": "Hi there", "tokens_used": 7}
+    return stream_llm
+
+async def open_session(db_session, mock_redis, prompts):
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+    db_session.add_all([Message(conversation_id=conversation.id, role="user", content="Hello"), Message(conversation_id=conversation.id, role="assistant", content="Hey")])
+    await db_session.commit()
+    session = await ChatSession.open(db_session, mock_redis, conversation.id)
+    session.service.llm_service.stream_llm = fake_stream(prompts)
+    return session
+
+@pytest.mark.asyncio
+async def test_turns_extend_the_window_in_memory_and_write_through(db_session, mock_redis):
+    prompts = []
+    session = await open_session(db_session, mock_redis, prompts)
+    session.service.load_context = AsyncMock(side_effect=AssertionError("history reloaded"))
+
+    first = [event async for event in session.turn("How are you?")]
+    second = [event async for event in session.turn("And then?")]
+
+    assert [e["delta"] for e in first[:-1]] == ["Hi", " there"]
+    assert second[-1] == {"user_message": "And then?", "assistant_response": "Hi there", "tokens_used": 7, "tokens_saved": 0}
+    assert [m["content"] for m in prompts[1]] == ["Hello", "Hey", "How are you?", "Hi there", "And then?"]
+    assert session.metrics == {"turns": 2, "reloads": 0}
+    count = await db_session.scalar(select(func.count()).select_from(Message).where(Message.conversation_id == session.conversation_id))
+    assert count == 6
+
+@pytest.mark.asyncio
+async def test_turn_from_elsewhere_reloads_the_window(db_session, mock_redis, monkeypatch):
+    prompts = []
+    session = await open_session(db_session, mock_redis, prompts)
+    [event async for event in session.turn("First")]
+
+    rest = ConversationService(db_session, mock_redis)
+    monkeypatch.setattr(rest.llm_service, "call_llm", AsyncMock(return_value={"content": "From REST", "tokens_used": 3}))
+    await rest.add_message(session.conversation_id, "Over REST")
+    [event async for event in session.turn("Second")]
+
+    assert session.metrics["reloads"] == 1
+    assert [m["content"] for m in prompts[-1]][-3:] == ["Over REST", "From REST", "Second"]
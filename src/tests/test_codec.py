@@ -0,0 +1,56 @@
+import json
+import pytest
+from unittest.mock import AsyncMock
+
+from src.models import Conversation, ChatMode
+from src.routes.responses import FastJSONResponse
+from src.services.codec import Codec
+from src.services.conversation_service import ConversationService
+from src.services.history_cache import HistoryCache
+
+ENTRY = {"id": 7, "role": "assistant", "content": "déjà vu " * 200, "timestamp": "2024-01-01T00:00:00", "token_count": 400}
+
+# ---------------------------
+# Tests
+# ---------------------------
+
+def test_small_json_values_stay_plain_and_large_ones_are_compressed():
+    codec = Codec("json", "zlib", compress_min_bytes=1024)
+    small = {"id": 1, "content": "hi"}
+
+    assert json.loads(codec.encode(small)) == small
+    encoded = codec.encode(ENTRY)
+    assert encoded[:3] == bytes((0, 1, 1))
+    assert len(encoded) < len(json.dumps(ENTRY)) / 5
+    assert codec.decode(encoded) == ENTRY
+
+def test_values_written_with_other_settings_still_decode():
+    legacy = json.dumps(ENTRY).encode()
+    compressed = Codec("json", "zlib", compress_min_bytes=0).encode(ENTRY)
+    reader = Codec("json", "none")
+
+    assert reader.decode(legacy) == ENTRY
+    assert reader.decode(compressed) == ENTRY
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    codec = Codec("msgpack", "none")
+    assert codec.decode(codec.encode(ENTRY)) == ENTRY
+
+@pytest.mark.asyncio
+async def test_history_cache_reads_back_compressed_entries(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+    service.history_cache = HistoryCache(mock_redis, Codec("json", "zlib", compress_min_bytes=0))
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+    monkeypatch.setattr(service.llm_service, "call_llm", AsyncMock(return_value={"content": "Hi!", "tokens_used": 5}))
+    await service.add_message(conversation.id, "Hello")
+
+    cold = await service.get_conversation_history(conversation.id)  # fills the cache
+    warm = await service.get_conversation_history(conversation.id)
+
+    assert warm == cold
+    assert [m["content"] for m in warm] == ["Hello", "Hi!"]
+    assert await service.history_cache.last_id(conversation.id) == warm[-1]["id"]
+    assert json.loads(FastJSONResponse(warm).body) == warm
@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+
+from src.models import Conversation, ConversationArchive, Message, ChatMode, ConversationState
+from src.services.compaction_service import CompactionService
+from src.services.conversation_service import ConversationService
+
+async def add_conversation(db_session, state: ConversationState, messages: int = 5, updated_at=None) -> Conversation:
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN, state=state, updated_at=updated_at)
+    db_session.add(conversation)
+    await db_session.commit()
+    db_session.add_all([Message(conversation_id=conversation.id, role="user" if i % 2 == 0 else "assistant", content=f"message {i} " * 20, token_count=40, tokens_used=i) for i in range(messages)])
+    await db_session.commit()
+    return conversation
+
+async def hot_count(db_session, conversation_id: int) -> int:
+    return await db_session.scalar(select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id))
+
+@pytest.mark.asyncio
+async def test_archived_history_moves_to_cold_storage_and_reads_the_same(db_session, mock_redis):
+    service = ConversationService(db_session, mock_redis)
+    archived = await add_conversation(db_session, ConversationState.ARCHIVED, messages=7)
+    active = await add_conversation(db_session, ConversationState.ACTIVE)
+    recently_deleted = await add_conversation(db_session, ConversationState.DELETED)
+    long_deleted = await add_conversation(db_session, ConversationState.DELETED, updated_at=datetime.now(timezone.utc) - timedelta(days=90))
+    history = await service.get_conversation_history(archived.id)
+    ids = [entry["id"] for entry in history]
+    etag = await service.history_etag(archived.id)
+
+    stats = await CompactionService(db_session, batch_conversations=1, batch_messages=2).run()
+
+    assert stats["conversations"] == 2 and stats["messages"] == 12 and stats["ratio"] > 1
+    assert [await hot_count(db_session, c.id) for c in (archived, active, recently_deleted, long_deleted)] == [0, 5, 5, 0]
+    assert await service.get_conversation_history(archived.id) == history
+    assert await service.get_conversation_history(archived.id, since_id=ids[1], limit=2) == history[2:4]
+    assert await service.get_conversation_history(archived.id, before_id=ids[5], limit=2) == history[3:5]
+    assert await service.history_etag(archived.id) == etag
+
+@pytest.mark.asyncio
+async def test_interrupted_compaction_is_finished_by_the_next_run(db_session, mock_redis):
+    conversation = await add_conversation(db_session, ConversationState.ARCHIVED, messages=4)
+    history = await ConversationService(db_session, mock_redis).get_conversation_history(conversation.id)
+    compaction = CompactionService(db_session)
+    await compaction.compact_conversation(conversation.id)
+    # As if the job had stopped after writing the archive: two messages are back in the hot table
+    db_session.add_all([Message(id=entry["id"], conversation_id=conversation.id, role=entry["role"], content=entry["content"]) for entry in history[:2]])
+    await db_session.commit()
+
+    await CompactionService(db_session).run()
+
+    archive = await db_session.get(ConversationArchive, conversation.id, populate_existing=True)
+    assert archive.message_count == 4 and archive.last_message_id == history[-1]["id"]
+    assert await hot_count(db_session, conversation.id) == 0
+    assert await ConversationService(db_session, mock_redis).get_conversation_history(conversation.id) == history
@@ -1,43 +1,11 @@
 import pytest
-from unittest.mock import AsyncMock, MagicMock
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from unittest.mock import AsyncMock
+from sqlalchemy import select, func
 
-from src.models import Base, Conversation, Message, ChatMode
+from src.config.settings import settings
+from src.models import Conversation, Message, ChatMode
 from src.services.conversation_service import ConversationService
 
-# ---------------------------
-# Test DB setup
-# ---------------------------
-TEST_DATABASE_URL = "sqlite:///./test.db"
-
-engine = create_engine(
-    TEST_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
-
-TestingSessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
-)
-
-@pytest.fixture(scope="function")
-def db_session():
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture
-def mock_redis():
-    redis = MagicMock()
-    redis.get.return_value = None
-    return redis
-
 # ---------------------------
 # Tests
 # ---------------------------
@@ -61,11 +29,12 @@ async def test_create_conversation(db_session, mock_redis, monkeypatch):
 
     assert conversation.id is not None
 
-    messages = (
-        db_session.query(Message)
-        .filter(Message.conversation_id == conversation.id)
-        .all()
+    result = await db_session.execute(
+        select(Message)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.id)
     )
+    messages = result.scalars().all()
     assert len(messages) == 2
     assert messages[0].role == "user"
     assert messages[1].role == "assistant"
@@ -77,16 +46,265 @@ async def test_get_conversation_history(db_session, mock_redis):
 
     conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
     db_session.add(conversation)
-    db_session.commit()
+    await db_session.commit()
 
     db_session.add_all([
         Message(conversation_id=conversation.id, role="user", content="Hello"),
         Message(conversation_id=conversation.id, role="assistant", content="Hi")
     ])
-    db_session.commit()
+    await db_session.commit()
 
-    history = service.get_conversation_history(conversation.id)
+    history = await service.get_conversation_history(conversation.id)
 
     assert len(history) == 2
     assert history[0]["content"] == "Hello"
     assert history[1]["content"] == "Hi"
+
+
+@pytest.mark.asyncio
+async def test_stream_message_persists_assembled_reply(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+
+    async def fake_stream(messages):
+        yield {"delta": "Hi"}
+        yield {"delta": " there"}
+        yield {"content": "Hi there", "tokens_used": 4}
+
+    monkeypatch.setattr(service.llm_service, "stream_llm", fake_stream)
+
+    events = await service.stream_message(conversation.id, "Hello")
+    received = [event async for event in events]
+
+    assert received[:2] == [{"delta": "Hi"}, {"delta": " there"}]
+    assert received[-1]["assistant_response"] == "Hi there"
+
+    result = await db_session.execute(
+        select(Message)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.id)
+    )
+    messages = result.scalars().all()
+    assert [m.role for m in messages] == ["user", "assistant"]
+    assert messages[1].content == "Hi there"
+    assert messages[1].tokens_used == 4
+
+
+@pytest.mark.asyncio
+async def test_add_message_appends_to_warm_history_cache(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+    call_llm = AsyncMock(return_value={"content": "Hi!", "tokens_used": 5})
+    monkeypatch.setattr(service.llm_service, "call_llm", call_llm)
+
+    conversation = await service.create_conversation(user_id=1, first_message="Hello")
+    # First read is a cold miss that fills the cache from the DB
+    assert [h["content"] for h in await service.get_conversation_history(conversation.id)] == ["Hello", "Hi!"]
+
+    await service.add_message(conversation.id, "How are you?")
+
+    # The turn's context window came from the cache, not a history query
+    sent = call_llm.await_args.args[0]
+    assert [m["content"] for m in sent] == ["Hello", "Hi!", "How are you?"]
+
+    cached = await service.history_cache.get(conversation.id)
+    assert [h["content"] for h in cached] == ["Hello", "Hi!", "How are you?", "Hi!"]
+    assert await service.get_conversation_history(conversation.id) == cached
+
+
+@pytest.mark.asyncio
+async def test_stale_history_fill_is_discarded(db_session, mock_redis):
+    service = ConversationService(db_session, mock_redis)
+    cache = service.history_cache
+
+    version = await cache.version(1)
+    await cache.append(1, [{"role": "user", "content": "newer", "timestamp": "t"}])
+
+    assert await cache.fill(1, [{"role": "user", "content": "stale", "timestamp": "t"}], version) is False
+    assert await cache.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_cold_window_selects_newest_messages_within_budget(db_session, mock_redis, monkeypatch):
+    monkeypatch.setattr("src.services.conversation_service.settings.context_token_budget", 25)
+    service = ConversationService(db_session, mock_redis)
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+
+    db_session.add_all([
+        Message(conversation_id=conversation.id, role="user", content=f"message {i}", token_count=10)
+        for i in range(5)
+    ])
+    await db_session.commit()
+
+    _, window = await service.load_context(conversation.id)
+
+    # The third-newest message crosses the budget; it is returned and trimmed later by call_llm
+    assert [m["content"] for m in window] == ["message 2", "message 3", "message 4"]
+    assert all(m["token_count"] == 10 for m in window)
+    # The cold load filled the history cache with the whole conversation
+    assert len(await service.history_cache.get(conversation.id)) == 5
+
+
+@pytest.mark.asyncio
+async def test_second_turn_after_a_cold_start_is_served_from_redis(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+    monkeypatch.setattr(service.llm_service, "call_llm", AsyncMock(return_value={"content": "Hi!", "tokens_used": 5}))
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+
+    await service.add_message(conversation.id, "Hello")
+    load_history = AsyncMock(wraps=service._load_history)
+    monkeypatch.setattr(service, "_load_history", load_history)
+    await service.add_message(conversation.id, "And again")
+
+    load_history.assert_not_awaited()
+    assert [h["content"] for h in await service.history_cache.get(conversation.id)] == ["Hello", "Hi!", "And again", "Hi!"]
+
+
+@pytest.mark.asyncio
+async def test_list_conversations_keyset_pages(db_session, mock_redis):
+    service = ConversationService(db_session, mock_redis)
+
+    db_session.add_all([Conversation(user_id=1, mode=ChatMode.OPEN) for _ in range(5)])
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        page = await service.list_conversations(user_id=1, cursor=cursor, limit=2, include_total=True)
+        assert page["total"] == 5
+        seen.extend(c["id"] for c in page["conversations"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 5
+    assert seen == sorted(seen, reverse=True)
+    assert await mock_redis.get(ConversationService.count_key(1)) == b"5"
+
+
+@pytest.mark.asyncio
+async def test_history_range_reads(db_session, mock_redis):
+    service = ConversationService(db_session, mock_redis)
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+    messages = [Message(conversation_id=conversation.id, role="user", content=f"message {i}") for i in range(6)]
+    db_session.add_all(messages)
+    await db_session.commit()
+    ids = [m.id for m in messages]
+
+    since = await service.get_conversation_history(conversation.id, since_id=ids[3])
+    assert [h["id"] for h in since] == ids[4:]
+
+    before = await service.get_conversation_history(conversation.id, before_id=ids[4], limit=2)
+    assert [h["id"] for h in before] == ids[2:4]
+
+    latest = await service.get_conversation_history(conversation.id, limit=2)
+    assert [h["id"] for h in latest] == ids[4:]
+
+
+@pytest.mark.asyncio
+async def test_history_etag_changes_when_a_message_is_added(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+    monkeypatch.setattr(service.llm_service, "call_llm", AsyncMock(return_value={"content": "Hi!", "tokens_used": 5}))
+
+    conversation = await service.create_conversation(user_id=1, first_message="Hello")
+    cold = await service.history_etag(conversation.id)
+    await service.get_conversation_history(conversation.id)
+    # Warm cache: answered from Redis, and agrees with the DB fallback
+    assert await service.history_etag(conversation.id) == cold
+
+    await service.add_message(conversation.id, "How are you?")
+    assert await service.history_etag(conversation.id) != cold
+
+    # Each range of the same history is a different representation
+    ranges = [(None, None, None), (None, None, 2), (1, None, None), (None, 3, None), (1, 3, 2)]
+    assert len({await service.history_etag(conversation.id, *window) for window in ranges}) == len(ranges)
+
+
+@pytest.mark.asyncio
+async def test_add_message_holds_no_transaction_during_llm_call(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+
+    async def call_llm(messages, use_cache=True):
+        assert not db_session.in_transaction()
+        return {"content": "Hi!", "tokens_used": 5}
+
+    monkeypatch.setattr(service.llm_service, "call_llm", call_llm)
+    await service.add_message(conversation.id, "Hello")
+    assert [h["content"] for h in await service.get_conversation_history(conversation.id)] == ["Hello", "Hi!"]
+
+
+@pytest.mark.asyncio
+async def test_turn_is_not_saved_if_conversation_archived_during_llm_call(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+    conversation_id = conversation.id
+
+    async def call_llm(messages, use_cache=True):
+        await service.archive_conversation(conversation_id)
+        return {"content": "Hi!", "tokens_used": 5}
+
+    monkeypatch.setattr(service.llm_service, "call_llm", call_llm)
+    with pytest.raises(ValueError):
+        await service.add_message(conversation_id, "Hello")
+
+    count = await db_session.scalar(select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id))
+    assert count == 0
+
+
+@pytest.mark.asyncio
+async def test_rolling_summary_bounds_prompt_size(db_session, mock_redis, monkeypatch):
+    monkeypatch.setattr(settings, "conversation_summary", True)
+    monkeypatch.setattr(settings, "summary_trigger_tokens", 60)
+    monkeypatch.setattr(settings, "summary_keep_tokens", 30)
+    service = ConversationService(db_session, mock_redis)
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+    conversation_id = conversation.id
+
+    prompts = []
+
+    async def call_llm(messages, use_cache=True):
+        prompts.append(messages)
+        return {"content": "a reply of about eight tokens long", "tokens_used": 10}
+
+    folded = []
+
+    async def summarize(summary, messages):
+        folded.append([m["id"] for m in messages])
+        return {"content": f"summary {len(folded)}", "tokens_used": 3}
+
+    monkeypatch.setattr(service.llm_service, "call_llm", call_llm)
+    monkeypatch.setattr(service.llm_service, "summarize", summarize)
+
+    results = [await service.add_message(conversation_id, f"question number {i} from the user") for i in range(30)]
+
+    count = service.llm_service.count_tokens
+    assert max(sum(count(m) for m in prompt) for prompt in prompts[5:]) <= 60 + 10
+    assert prompts[-1][0]["content"].startswith("Summary of the earlier conversation: summary")
+    # Each fold only sends messages that were not folded before
+    flat = [message_id for batch in folded for message_id in batch]
+    assert len(flat) == len(set(flat)) and flat == sorted(flat)
+    assert results[-1]["tokens_saved"] > 0
+
+    refreshed = await db_session.get(Conversation, conversation_id, populate_existing=True)
+    assert refreshed.summary == f"summary {len(folded)}"
+    assert refreshed.summary_through_id == flat[-1]
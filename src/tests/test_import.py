@@ -0,0 +1,92 @@
+import json
+import pytest
+from sqlalchemy import select, func
+
+from src.models import Conversation, Message, User
+from src.services.conversation_service import ConversationService
+from src.services.history_cache import HistoryCache
+from src.services.import_service import ImportService
+from src.services.user_service import UserService
+
+def ndjson(*records) -> bytes:
+    return b"".join((record if isinstance(record, bytes) else json.dumps(record).encode()) + b"\n" for record in records)
+
+async def body(data: bytes, size: int = 7, fail_after: int = None):
+    for i, start in enumerate(range(0, len(data), size)):
+        if fail_after is not None and i == fail_after:
+            raise ConnectionError("stream broken")
+        yield data[start:start + size]
+
+async def count(db_session, model) -> int:
+    return await db_session.scalar(select(func.count()).select_from(model))
+
+RECORDS = [
+    {"type": "user", "username": "alice", "email": "alice@example.com"},
+    {"type": "conversation", "id": 17, "user": "alice", "title": "Trip", "created_at": "2024-03-01T10:00:00+02:00"},
+    {"type": "message", "conversation": "17", "role": "user", "content": "Where should I go?", "timestamp": "2024-03-01T10:00:00+02:00"},
+    {"type": "message", "conversation": "17", "role": "assistant", "content": "Lisbon.", "timestamp": "2024-03-01T08:00:05Z", "tokens_used": 12},
+    b"{not json",
+    {"type": "message", "conversation": "99", "role": "user", "content": "orphan"},
+    {"type": "conversation", "id": "18", "user": "bob"},
+    {"type": "message", "conversation": "17", "role": "robot", "content": "?"},
+    {"type": "conversation", "id": "19", "user": "alice", "state": "archived"},
+    {"type": "message", "conversation": "19", "role": "user", "content": "old"},
+    {"type": "message", "conversation": "17", "role": "user", "content": "Thanks!", "timestamp": "2024-03-01T08:01:00"},
+]
+
+@pytest.mark.asyncio
+async def test_import_writes_valid_records_and_reports_the_rest(db_session, mock_redis):
+    stats = await ImportService(db_session, mock_redis, batch_records=2).run("logs", body(ndjson(*RECORDS)))
+
+    assert (stats["users"], stats["conversations"], stats["messages"], stats["errors"], stats["warmed"]) == (1, 2, 4, 4, 1)
+    assert sorted(error["line"] for error in stats["error_lines"]) == [5, 6, 7, 8]
+    conversation_id = await db_session.scalar(select(Conversation.id).where(Conversation.external_id == "17"))
+    history = await ConversationService(db_session, mock_redis).get_conversation_history(conversation_id)
+    assert [(h["role"], h["content"]) for h in history] == [("user", "Where should I go?"), ("assistant", "Lisbon."), ("user", "Thanks!")]
+    assert history[0]["timestamp"].startswith("2024-03-01T08:00:00") and all(h["token_count"] for h in history)
+    # The history cache was filled by the import itself
+    assert await HistoryCache(mock_redis).get(conversation_id) == history
+
+@pytest.mark.asyncio
+async def test_failed_import_resumes_after_its_last_committed_batch(db_session, mock_redis):
+    data = ndjson(*RECORDS)
+    with pytest.raises(ConnectionError):
+        await ImportService(db_session, mock_redis, batch_records=2).run("logs", body(data, fail_after=40))
+    checkpoint = await ImportService(db_session, mock_redis).get_checkpoint("logs")
+    committed = checkpoint.line
+    assert 0 < committed < len(RECORDS) and checkpoint.completed_at is None
+
+    stats = await ImportService(db_session, mock_redis, batch_records=2).run("logs", body(data))
+
+    assert stats["resumed_after"] == committed
+    checkpoint = await ImportService(db_session, mock_redis).get_checkpoint("logs")
+    assert ImportService.checkpoint_dict(checkpoint) == {"name": "logs", "line": len(RECORDS), "users": 1, "conversations": 2, "messages": 4, "errors": 4, "completed": True}
+    assert (await count(db_session, User), await count(db_session, Conversation), await count(db_session, Message)) == (1, 2, 4)
+
+@pytest.mark.asyncio
+async def test_import_into_a_cached_conversation_drops_the_stale_history(db_session, mock_redis):
+    await ImportService(db_session, mock_redis).run("first", body(ndjson(*RECORDS[:4])))
+    conversation_id = await db_session.scalar(select(Conversation.id).where(Conversation.external_id == "17"))
+    service = ConversationService(db_session, mock_redis)
+    assert len(await service.get_conversation_history(conversation_id)) == 2
+
+    stats = await ImportService(db_session, mock_redis).run("second", body(ndjson(RECORDS[0], RECORDS[1], RECORDS[-1])))
+
+    assert (stats["users"], stats["conversations"], stats["messages"], stats["existing"]) == (0, 0, 1, 2)
+    assert [h["content"] for h in await service.get_conversation_history(conversation_id)] == ["Where should I go?", "Lisbon.", "Thanks!"]
+
+@pytest.mark.asyncio
+async def test_import_invalidates_cached_counts(db_session, mock_redis):
+    users = UserService(db_session, mock_redis)
+    alice = await users.create_user("alice", "alice@example.com")
+    conversations = ConversationService(db_session, mock_redis)
+    assert (await users.list_users(include_total=True))["total"] == 1
+    assert (await conversations.list_conversations(alice.id, include_total=True))["total"] == 0
+
+    await ImportService(db_session, mock_redis).run("logs", body(ndjson(
+        {"type": "user", "username": "bob", "email": "bob@example.com"},
+        {"type": "conversation", "id": "1", "user": "alice"},
+    )))
+
+    assert (await users.list_users(include_total=True))["total"] == 2
+    assert (await conversations.list_conversations(alice.id, include_total=True))["total"] == 1
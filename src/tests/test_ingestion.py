@@ -0,0 +1,92 @@
+import pytest
+
+from src.models import Conversation, ChatMode
+from src.services.ingestion_service import DocumentTooLargeError, IngestionService, chunk_text, get_ingest_pool
+from src.services.rag_service import RAGService
+from src.services.tokenizer import get_tokenizer
+
+def paragraph(words: int, word: str = "alpha") -> str:
+    return " ".join(f"{word}{i}" for i in range(words)) + "."
+
+@pytest.fixture(autouse=True)
+def inline_chunking(monkeypatch):
+    # Chunk in the test process; the worker pool is exercised by benchmarks/ingestion.py
+    monkeypatch.setattr("src.services.ingestion_service.settings.ingest_processes", 0)
+    get_ingest_pool.cache_clear()
+    yield
+    get_ingest_pool.cache_clear()
+
+async def body(text: str, size: int):
+    data = text.encode()
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def test_chunks_stay_within_token_budget():
+    tokenizer = get_tokenizer("whitespace")
+    text = "\n\n".join([paragraph(30), paragraph(250, "long"), paragraph(40), "\x0c  ﬁne   print ", paragraph(25)])
+
+    chunks = chunk_text(text, 50, 80, "whitespace")
+
+    counts = [tokenizer.count(content) for content, _, _ in chunks]
+    assert all(50 < count <= 80 for count in counts[:-1])
+    assert counts[-1] <= 80
+    assert sum(counts) == 30 + 250 + 40 + 2 + 25
+    assert "fine print" in " ".join(content for content, _, _ in chunks)
+    content, terms, length = chunks[0]
+    assert terms["alpha0"] == 1 and length == sum(terms.values())
+
+@pytest.mark.asyncio
+async def test_streamed_upload_is_chunked_indexed_and_retrievable(db_session, monkeypatch):
+    monkeypatch.setattr("src.services.ingestion_service.settings.ingest_chunk_min_tokens", 20)
+    monkeypatch.setattr("src.services.ingestion_service.settings.ingest_chunk_max_tokens", 40)
+    monkeypatch.setattr("src.services.ingestion_service.settings.tokenizer", "whitespace")
+    conversation = Conversation(user_id=1, mode=ChatMode.GROUNDED)
+    db_session.add(conversation)
+    await db_session.commit()
+    filler = "\n\n".join(paragraph(15, f"w{i}x") for i in range(40))
+    text = f"{filler}\n\nRefunds for naïve customers take five days.\n\n{filler}"
+
+    service = IngestionService(db_session, batch_bytes=2000)
+    document = await service.create_document(conversation.id, "policy.txt")
+    await service.ingest(document, body(text, 7))  # 7-byte reads split the two-byte "ï"
+
+    status = IngestionService.status(await service.get_document(document.id))
+    assert status["status"] == "ready" and status["bytes_received"] == len(text.encode())
+    assert status["chunk_count"] > 10
+    chunks = await RAGService(db_session, mode="bm25").retrieve("naïve refunds", [document.id], top_k=1)
+    assert "Refunds for naïve customers take five days." in chunks[0]
+
+@pytest.mark.asyncio
+async def test_failed_upload_keeps_no_partial_chunks(db_session):
+    conversation = Conversation(user_id=1, mode=ChatMode.GROUNDED)
+    db_session.add(conversation)
+    await db_session.commit()
+    service = IngestionService(db_session, batch_bytes=500, max_bytes=3000)
+    document = await service.create_document(conversation.id, "big.txt")
+
+    with pytest.raises(DocumentTooLargeError):
+        await service.ingest(document, body("\n\n".join(paragraph(20) for _ in range(40)), 100))
+
+    document = await service.get_document(document.id)
+    assert document.status == "failed" and "larger than 3000" in document.error
+    assert await RAGService(db_session, mode="bm25").retrieve("alpha1", [document.id]) == []
+
+@pytest.mark.asyncio
+async def test_batches_are_cut_by_bytes_and_unfinished_uploads_are_not_retrieved(db_session):
+    conversation = Conversation(user_id=1, mode=ChatMode.GROUNDED)
+    db_session.add(conversation)
+    await db_session.commit()
+    service = IngestionService(db_session, batch_bytes=300)
+    text = "\n\n".join(paragraph(10, "żółw") for _ in range(30))
+
+    batches = [batch async for batch, _ in service._batches(body(text, 64))]
+    assert "".join(batches) == text
+    assert all(len(batch.encode()) <= 300 for batch in batches)
+
+    document = await service.create_document(conversation.id, "notes.txt")
+    await service.ingest(document, body(text, 64))
+    rag = RAGService(db_session, mode="bm25")
+    assert await rag.retrieve("żółw1", [document.id])
+    document.status = "ingesting"
+    await db_session.commit()
+    assert await rag.retrieve("żółw1", [document.id]) == []
@@ -0,0 +1,55 @@
+import asyncio
+import httpx
+import pytest
+
+from benchmarks.fake_llm import FakeLLMServer
+from src.services.llm_providers import LLMProvider, ProviderRouter
+from src.services.llm_scheduler import LLMScheduler
+from src.services.llm_service import LLMService
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+def service_for(client, router):
+    return LLMService(client, scheduler=LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=0), router=router)
+
+@pytest.mark.asyncio
+async def test_fails_over_to_next_provider_on_server_error():
+    with FakeLLMServer(error_rate=1.0) as broken, FakeLLMServer() as healthy:
+        router = ProviderRouter([LLMProvider("broken", broken.url, weight=1), LLMProvider("healthy", healthy.url, weight=0)], hedge=False, failure_threshold=1, failure_cooldown=60)
+        async with httpx.AsyncClient() as client:
+            response = await service_for(client, router).call_llm(list(MESSAGES))
+            assert response["content"].startswith("token")
+            assert router.metrics["failovers"] == 1
+
+            # The broken provider is cooling down, so the next call goes straight to the healthy one
+            await service_for(client, router).call_llm(list(MESSAGES))
+
+    assert broken.app.state.requests == 1
+    assert healthy.app.state.requests == 2
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_first_response_wins():
+    with FakeLLMServer(latency=2.0) as slow, FakeLLMServer() as fast:
+        router = ProviderRouter([LLMProvider("slow", slow.url, weight=1), LLMProvider("fast", fast.url, weight=0)], hedge=True, hedge_initial_delay=0.05, hedge_budget=1.0)
+        async with httpx.AsyncClient() as client:
+            started = asyncio.get_running_loop().time()
+            response = await service_for(client, router).call_llm(list(MESSAGES))
+            elapsed = asyncio.get_running_loop().time() - started
+
+    assert response["content"].startswith("token")
+    assert elapsed < 1.0
+    assert router.metrics["hedged"] == 1
+    assert router.metrics["hedge_wins"] == 1
+    assert len(router.providers[0].latency) == 1  # the cancelled primary still counts toward its tail
+
+@pytest.mark.asyncio
+async def test_hedges_stay_within_budget():
+    with FakeLLMServer(latency=0.2) as slow, FakeLLMServer() as fast:
+        router = ProviderRouter([LLMProvider("slow", slow.url, weight=1), LLMProvider("fast", fast.url, weight=0)], hedge=True, hedge_initial_delay=0.05, hedge_budget=0.5)
+        async with httpx.AsyncClient() as client:
+            for _ in range(4):
+                await service_for(client, router).call_llm(list(MESSAGES))
+
+    assert router.metrics["hedged"] == 2
+    assert router.metrics["hedges_denied"] == 2
+    assert fast.app.state.requests == 2
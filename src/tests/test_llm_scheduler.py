@@ -0,0 +1,103 @@
+import asyncio
+import json
+import httpx
+import pytest
+
+from benchmarks.fake_llm import FakeLLMServer
+from src.services.llm_scheduler import LLMScheduler, LLMUnavailableError, LLMUpstreamError
+from src.services.llm_providers import LLMProvider, ProviderRouter
+from src.services.llm_service import LLMService
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+@pytest.mark.asyncio
+async def test_retries_after_429_honoring_retry_after():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=3, backoff_base=0.01)
+    with FakeLLMServer(rate_limit_first=2, retry_after=0.1) as server:
+        async with httpx.AsyncClient() as client:
+            service = LLMService(client, scheduler=scheduler, router=ProviderRouter([LLMProvider("fake", server.url)]))
+            started = asyncio.get_running_loop().time()
+            response = await service.call_llm(list(MESSAGES))
+            elapsed = asyncio.get_running_loop().time() - started
+
+    assert response["content"].startswith("token")
+    assert server.app.state.requests == 3
+    assert scheduler.stats()["rate_limited"] == 2
+    assert scheduler.stats()["retries"] == 2
+    assert elapsed >= 0.2
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_budget_queues_callers():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=0)  # 10 per second, burst of 600
+    scheduler.requests.level = 1
+    await scheduler.acquire(1)
+
+    started = asyncio.get_running_loop().time()
+    await scheduler.acquire(1)
+
+    assert asyncio.get_running_loop().time() - started >= 0.09
+    assert scheduler.stats()["queue_wait_seconds_max"] >= 0.09
+
+@pytest.mark.asyncio
+async def test_bounded_queue_rejects_and_serves_by_priority():
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=0, max_queue=2)
+    scheduler.requests.level = 0
+    order = []
+
+    async def waiter(name, priority):
+        await scheduler.acquire(1, priority)
+        order.append(name)
+
+    low = asyncio.create_task(waiter("low", 5))
+    high = asyncio.create_task(waiter("high", 0))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMUnavailableError):
+        await scheduler.acquire(1)
+    await asyncio.gather(low, high)
+
+    assert order == ["high", "low"]
+    assert scheduler.stats()["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_consecutive_server_errors():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=0, breaker_threshold=2, breaker_cooldown=60)
+    transport = httpx.MockTransport(lambda request: httpx.Response(502, text="bad gateway"))
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        service = LLMService(client, scheduler=scheduler)
+        for _ in range(2):
+            with pytest.raises(LLMUpstreamError):
+                await service.call_llm(list(MESSAGES))
+        with pytest.raises(LLMUnavailableError):
+            await service.call_llm(list(MESSAGES))
+
+    assert scheduler.stats()["circuit"] == "open"
+
+@pytest.mark.asyncio
+async def test_half_open_probe_is_released_by_streams_and_cancelled_calls():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=0, breaker_threshold=1, breaker_cooldown=0)
+    scheduler.breaker.record_failure()
+    chunks = [{"choices": [{"delta": {"content": "Hi"}}]}, {"choices": [], "usage": {"total_tokens": 3}}]
+    body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body, headers={"content-type": "text/event-stream"}))
+
+    # A streamed probe reports its outcome, so the circuit closes
+    async with httpx.AsyncClient(transport=transport) as client:
+        events = [event async for event in LLMService(client, scheduler=scheduler).stream_llm(list(MESSAGES))]
+    assert events[-1]["tokens_used"] == 3
+    assert scheduler.stats()["circuit"] == "closed"
+
+    # A probe cancelled mid-call records nothing but lets the next call probe again
+    scheduler.breaker.record_failure()
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    task = asyncio.create_task(scheduler.run(hang, 1))
+    await asyncio.sleep(0.01)
+    assert scheduler.breaker.probing
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not scheduler.breaker.probing and scheduler.stats()["circuit"] == "half_open"
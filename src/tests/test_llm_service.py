@@ -0,0 +1,76 @@
+import httpx
+import json
+import pytest
+
+from src.services.llm_service import LLMService
+from src.services.tokenizer import RegexTokenizer, get_tokenizer
+
+def completion(content: str, total_tokens: int = 7) -> dict:
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"total_tokens": total_tokens}
+    }
+
+@pytest.mark.asyncio
+async def test_call_llm_reuses_injected_client():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=completion("Hi!"))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        service = LLMService(client)
+        first = await service.call_llm([{"role": "user", "content": "Hello"}])
+        second = await LLMService(client).call_llm([{"role": "user", "content": "Hello again"}])
+
+    assert first == {"content": "Hi!", "tokens_used": 7}
+    assert second["content"] == "Hi!"
+    assert len(requests) == 2
+    assert requests[0].headers["Authorization"].startswith("Bearer ")
+
+@pytest.mark.asyncio
+async def test_stream_llm_yields_deltas_then_usage():
+    chunks = [
+        {"choices": [{"delta": {"role": "assistant"}}]},
+        {"choices": [{"delta": {"content": "Hel"}}]},
+        {"choices": [{"delta": {"content": "lo!"}}]},
+        {"choices": [], "usage": {"total_tokens": 9}},
+    ]
+    body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        events = [e async for e in LLMService(client).stream_llm([{"role": "user", "content": "Hi"}])]
+
+    assert events == [{"delta": "Hel"}, {"delta": "lo!"}, {"content": "Hello!", "tokens_used": 9}]
+
+def test_context_window_uses_stored_counts():
+    service = LLMService(httpx.AsyncClient())
+    messages = [
+        {"role": "system", "content": "ctx", "token_count": 2},
+        {"role": "user", "content": "one", "token_count": 3},
+        {"role": "assistant", "content": "two", "token_count": 3},
+        {"role": "user", "content": "three", "token_count": 3},
+    ]
+
+    window = service._apply_context_window(messages, context_limit=8)
+
+    assert window == [
+        {"role": "system", "content": "ctx"},
+        {"role": "assistant", "content": "two"},
+        {"role": "user", "content": "three"},
+    ]
+    # The newest message is always kept, even when it alone exceeds the budget
+    assert service._apply_context_window(messages[1:], context_limit=1) == [{"role": "user", "content": "three"}]
+
+def test_regex_tokenizer_counts_punctuation_and_long_words():
+    tokenizer = get_tokenizer("regex")
+    assert tokenizer.count("Hello, world!") == 6
+    assert tokenizer.count("internationalization's") == 7
+    assert RegexTokenizer(2.5).count("Hello, world!") == 6
+    assert get_tokenizer("whitespace").count("Hello, world!") == 2
+    assert get_tokenizer("src.services.tokenizer:WhitespaceTokenizer").count("a b c") == 3
@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import AsyncMock
+from prometheus_client import REGISTRY
+
+from src.config.metrics import request_timings, server_timing
+from src.models import Conversation, ChatMode
+from src.routes.conversations import sse_stream
+from src.services.conversation_service import ConversationService
+
+# ---------------------------
+# Tests
+# ---------------------------
+
+@pytest.mark.asyncio
+async def test_add_message_records_stage_timings_and_cache_lookups(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+    monkeypatch.setattr(service.llm_service, "call_llm", AsyncMock(return_value={"content": "Hi!", "tokens_used": 5}))
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+
+    misses = REGISTRY.get_sample_value("botgpt_cache_lookups_total", {"cache": "conversation", "result": "miss"}) or 0
+    llm_turns = REGISTRY.get_sample_value("botgpt_stage_seconds_count", {"stage": "llm"}) or 0
+
+    timings = {}
+    token = request_timings.set(timings)
+    try:
+        await service.add_message(conversation.id, "Hello")
+    finally:
+        request_timings.reset(token)
+
+    assert {"db_read", "cache_read", "llm", "db_write", "cache_write"} <= set(timings)
+    assert "llm;dur=" in server_timing(timings)
+    assert REGISTRY.get_sample_value("botgpt_cache_lookups_total", {"cache": "conversation", "result": "miss"}) == misses + 1
+    assert REGISTRY.get_sample_value("botgpt_stage_seconds_count", {"stage": "llm"}) == llm_turns + 1
+
+@pytest.mark.asyncio
+async def test_failed_stream_is_counted_and_ends_with_an_error_event():
+    async def failing_events():
+        yield {"delta": "Hi"}
+        raise RuntimeError("upstream closed")
+
+    failures = REGISTRY.get_sample_value("botgpt_llm_failures_total", {"path": "stream"}) or 0
+    frames = [frame async for frame in sse_stream(failing_events())]
+
+    assert frames[-1].startswith("event: error\n") and "upstream closed" in frames[-1]
+    assert REGISTRY.get_sample_value("botgpt_llm_failures_total", {"path": "stream"}) == failures + 1
+
+@pytest.mark.asyncio
+async def test_failed_llm_call_is_counted_and_reraised(db_session, mock_redis, monkeypatch):
+    service = ConversationService(db_session, mock_redis)
+    monkeypatch.setattr(service.llm_service, "call_llm", AsyncMock(side_effect=RuntimeError("bad gateway")))
+
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+
+    failures = REGISTRY.get_sample_value("botgpt_llm_failures_total", {"path": "turn"}) or 0
+    with pytest.raises(RuntimeError):
+        await service.add_message(conversation.id, "Hello")
+
+    assert REGISTRY.get_sample_value("botgpt_llm_failures_total", {"path": "turn"}) == failures + 1
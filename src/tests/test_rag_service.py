@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from src.models import Conversation, Document, ChunkPosting, ChatMode
+from src.services.rag_service import BM25, RAGService
+from src.services.vector_store import VectorStore
+
+DOCUMENT = "\n\n".join([
+    "Refunds are processed within five business days.",
+    "Shipping is free for orders over fifty dollars.",
+    "Refunds for damaged items include shipping refunds and a refund of the original shipping cost.",
+    "Our office is closed on public holidays.",
+])
+
+async def add_document(db_session, content: str) -> Document:
+    conversation = Conversation(user_id=1, mode=ChatMode.GROUNDED)
+    db_session.add(conversation)
+    await db_session.flush()
+    document = Document(conversation_id=conversation.id, name="faq", content=content)
+    db_session.add(document)
+    await db_session.commit()
+    return document
+
+@pytest.mark.asyncio
+async def test_retrieve_ranks_best_matching_chunk_first(db_session):
+    document = await add_document(db_session, DOCUMENT)
+    service = RAGService(db_session)
+
+    chunks = await service.retrieve("how do shipping refunds work?", [document.id], top_k=2)
+
+    assert chunks[0].startswith("Refunds for damaged items")
+    assert len(chunks) == 2
+    assert "holidays" not in " ".join(chunks)
+
+@pytest.mark.asyncio
+async def test_document_is_indexed_once_and_reindexed_incrementally(db_session):
+    document = await add_document(db_session, DOCUMENT)
+    other = await add_document(db_session, "Holidays are listed on the website.")
+    service = RAGService(db_session)
+
+    await service.ensure_indexed([document.id, other.id])
+    assert document.chunk_count == 4
+
+    document.content = "Gift cards never expire."
+    await service.index_document(document)
+    await db_session.commit()
+
+    terms = (await db_session.execute(select(ChunkPosting.term).where(ChunkPosting.document_id == document.id))).scalars().all()
+    assert sorted(terms) == ["cards", "expire", "gift", "never"]
+    assert await service.retrieve("holidays", [document.id, other.id]) == ["Holidays are listed on the website."]
+
+def test_in_memory_rank_returns_no_chunks_without_overlap():
+    assert BM25().rank("zebra", DOCUMENT.split("\n\n")) == []
+    assert BM25().rank("office holidays", DOCUMENT.split("\n\n"), k=1) == ["Our office is closed on public holidays."]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["dense", "hybrid"])
+async def test_dense_and_hybrid_modes_use_memory_mapped_embeddings(db_session, tmp_path, mode):
+    document = await add_document(db_session, DOCUMENT)
+    service = RAGService(db_session, mode=mode)
+    service.vector_store = VectorStore(str(tmp_path))
+
+    chunks = await service.retrieve("office closed holiday", [document.id], top_k=1)
+
+    assert chunks == ["Our office is closed on public holidays."]
+    matrix, chunk_ids = service.vector_store.load(document.id)
+    assert isinstance(matrix, np.memmap)
+    assert matrix.dtype == np.float32 and matrix.shape == (4, service.embedder.dim)
+    assert len(chunk_ids) == 4
+
+def test_vector_store_search_returns_top_k_across_documents(tmp_path):
+    store = VectorStore(str(tmp_path))
+    store.write(1, [10, 11], np.array([[1, 0], [0.6, 0.8]], dtype=np.float32))
+    store.write(2, [20], np.array([[0.8, 0.6]], dtype=np.float32))
+
+    results = store.search([1, 2], np.array([1, 0], dtype=np.float32), k=2)
+
+    assert [chunk_id for chunk_id, _ in results] == [10, 20]
+
+    # Per-document top k, merged: the best rows win whichever document holds them
+    store.write(3, [30, 31, 32], np.array([[0.1, 0.9], [0.9, 0.1], [0.95, 0.05]], dtype=np.float32))
+    results = store.search([1, 2, 3], np.array([1, 0], dtype=np.float32), k=3)
+    assert [chunk_id for chunk_id, _ in results] == [10, 32, 31]
+
+def test_vector_store_reopens_documents_rewritten_by_another_process(tmp_path):
+    writer, reader = VectorStore(str(tmp_path)), VectorStore(str(tmp_path))
+    writer.write(1, [10], np.array([[1, 0]], dtype=np.float32))
+    assert reader.search([1], np.array([1, 0], dtype=np.float32), k=1) == [(10, 1.0)]
+
+    writer.write(1, [12, 13], np.array([[0, 1], [1, 0]], dtype=np.float32))
+
+    assert reader.search([1], np.array([0, 1], dtype=np.float32), k=1) == [(12, 1.0)]
@@ -0,0 +1,73 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.requests import Request
+
+from src.models import Base, Conversation, Message, ChatMode, ConversationState
+from src.models.replicas import ReplicaSet, get_read_db, pin_key, pin_primary
+from src.services.user_service import UserService
+
+@pytest_asyncio.fixture
+async def replica_set(db_session, tmp_path, monkeypatch):
+    # A second database file stands in for a replica that has not caught up with the primary,
+    # which is the test database whatever DATABASE_URL says
+    replicas = ReplicaSet([f"sqlite:///{tmp_path / 'replica.db'}"])
+    async with replicas.replicas[0].engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr("src.models.replicas.get_replica_set", lambda: replicas)
+    monkeypatch.setattr("src.models.replicas.async_engine", db_session.bind)
+    monkeypatch.setattr("src.models.replicas.AsyncSessionLocal", async_sessionmaker(db_session.bind, class_=AsyncSession, autoflush=False, expire_on_commit=False))
+    yield replicas
+    await replicas.stop()
+
+def request(conversation_id: int) -> Request:
+    return Request({"type": "http", "path_params": {"conversation_id": conversation_id}, "query_string": b"", "headers": []})
+
+async def messages_seen(conversation_id: int, redis_client) -> int:
+    sessions = get_read_db(request(conversation_id), redis_client)
+    db = await anext(sessions)
+    try:
+        return await db.scalar(select(func.count()).select_from(Message))
+    finally:
+        await sessions.aclose()
+
+@pytest.mark.asyncio
+async def test_reads_use_healthy_replicas_except_right_after_a_write(db_session, mock_redis, replica_set):
+    db_session.add(Conversation(id=1, user_id=1, mode=ChatMode.OPEN, state=ConversationState.ACTIVE))
+    db_session.add(Message(conversation_id=1, role="user", content="hello"))
+    await db_session.commit()
+
+    # Not checked yet, so not used
+    assert await messages_seen(1, mock_redis) == 1
+    await replica_set.check_all()
+    assert await messages_seen(1, mock_redis) == 0
+
+    await pin_primary(mock_redis, "conversation:1")
+    assert await messages_seen(1, mock_redis) == 1
+    assert await messages_seen(2, mock_redis) == 0
+    assert {k: replica_set.stats()[k] for k in ("replica", "primary", "pinned")} == {"replica": 2, "primary": 1, "pinned": 1}
+
+    user = await UserService(db_session, mock_redis).create_user("reader", "reader@example.com")
+    assert await mock_redis.exists(pin_key(f"user:{user.id}"))
+
+@pytest.mark.asyncio
+async def test_failing_replicas_are_taken_out_of_rotation(db_session, mock_redis, replica_set, tmp_path):
+    await replica_set.check_all()
+    replica = replica_set.choose()
+    assert replica.healthy and replica.lag == 0
+
+    # A query failing on the replica marks it down at once and is answered by the primary
+    db_session.add(Message(conversation_id=1, role="user", content="hello"))
+    await db_session.commit()
+    async with replica.engine.begin() as conn:
+        await conn.execute(text("DROP TABLE messages"))
+    assert await messages_seen(1, mock_redis) == 1
+    assert not replica.healthy and replica_set.metrics["failures"] == 1 and replica_set.metrics["fallbacks"] == 1
+    assert replica_set.choose() is None
+
+    # ... and the health check keeps out one that can not be reached
+    broken = ReplicaSet([f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+    await broken.check_all()
+    assert broken.choose() is None and broken.replicas[0].error
+    await broken.stop()
@@ -0,0 +1,53 @@
+import asyncio
+import httpx
+import pytest
+
+from src.services.llm_service import LLMService
+from src.services.response_cache import ResponseCache
+
+def fake_llm(calls: list, delay: float = 0.0):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": "Hello!"}}],
+            "usage": {"total_tokens": 12}
+        })
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+@pytest.mark.asyncio
+async def test_identical_prompts_hit_the_cache(mock_redis):
+    calls = []
+    async with fake_llm(calls) as client:
+        service = LLMService(client, response_cache=ResponseCache(mock_redis))
+        first = await service.call_llm([{"role": "user", "content": "hi"}])
+        second = await service.call_llm([{"role": "user", "content": " hi "}])
+        other = await service.call_llm([{"role": "user", "content": "hi"}], use_cache=False)
+
+    assert first == {"content": "Hello!", "tokens_used": 12}
+    assert second == {"content": "Hello!", "tokens_used": 0}
+    assert other["tokens_used"] == 12
+    assert len(calls) == 2
+    assert await service.response_cache.stats() == {"hits": 1, "misses": 1, "coalesced": 0, "entries": 1}
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_prompts_share_one_upstream_call(mock_redis):
+    calls = []
+    async with fake_llm(calls, delay=0.05) as client:
+        service = LLMService(client, response_cache=ResponseCache(mock_redis))
+        results = await asyncio.gather(*[service.call_llm([{"role": "user", "content": "hello"}]) for _ in range(5)])
+
+    assert len(calls) == 1
+    assert all(r["content"] == "Hello!" for r in results)
+    assert sum(r["tokens_used"] for r in results) == 12
+    assert (await service.response_cache.stats())["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_size_cap_evicts_oldest_entries(mock_redis):
+    cache = ResponseCache(mock_redis, max_entries=2)
+    for i in range(3):
+        await cache.set(f"{ResponseCache.prefix}{i}", {"content": str(i)})
+
+    assert await cache.get(f"{ResponseCache.prefix}0") is None
+    assert await cache.get(f"{ResponseCache.prefix}2") == {"content": "2"}
+    assert (await cache.stats())["entries"] == 2
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import pytest
+import time
+
+from src.models import User
+from src.services.history_cache import HistoryCache
+from src.services.tiered_cache import INVALIDATION_CHANNEL, InvalidationListener, LocalCache, TieredCache, invalidate
+from src.services.user_service import UserService
+
+# ---------------------------
+# Tests
+# ---------------------------
+
+def test_local_cache_is_bounded_and_expires(monkeypatch):
+    cache = LocalCache(max_entries=2, ttl=10)
+    cache.set("user:1", 1)
+    cache.set("user:2", 2)
+    cache.get("user:1")
+    cache.set("user:3", 3)  # evicts user:2, the least recently used
+
+    assert cache.get("user:2") is None
+    assert cache.get("user:1") == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("user:1") is None
+
+@pytest.mark.asyncio
+async def test_get_user_is_loaded_once_then_served_locally(db_session, mock_redis, monkeypatch):
+    db_session.add(User(username="alice", email="alice@example.com"))
+    await db_session.commit()
+    service = UserService(db_session, mock_redis)
+    service.cache = TieredCache(mock_redis, local=LocalCache(100, 60))
+    loads = 0
+    load_user = service._load_user
+
+    async def counting_load(user_id):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return await load_user(user_id)
+
+    monkeypatch.setattr(service, "_load_user", counting_load)
+    users = await asyncio.gather(*(service.get_user(1) for _ in range(5)))
+    await mock_redis.delete("user:1")
+
+    assert loads == 1
+    assert all(u["username"] == "alice" for u in users)
+    assert (await service.get_user(1))["email"] == "alice@example.com"
+    assert loads == 1
+
+@pytest.mark.asyncio
+async def test_append_on_one_worker_invalidates_the_others(mock_redis):
+    entry = lambda i: {"id": i, "role": "user", "content": f"message {i}", "timestamp": "2024-01-01T00:00:00", "token_count": 2}
+    worker_a, worker_b = LocalCache(100, 60), LocalCache(100, 60)
+    listeners = [InvalidationListener(mock_redis, worker_a), InvalidationListener(mock_redis, worker_b)]
+    for listener in listeners:
+        await listener.start()
+    await asyncio.sleep(0.05)
+    try:
+        cache_a, cache_b = HistoryCache(mock_redis, local=worker_a), HistoryCache(mock_redis, local=worker_b)
+        await cache_a.fill(1, [entry(1)], version=0)
+        assert [m["id"] for m in await cache_b.get(1)] == [1]
+        assert worker_b.get(HistoryCache.key(1)) is not None
+
+        await cache_a.append(1, [entry(2)])
+        await asyncio.sleep(0.1)
+
+        assert worker_b.get(HistoryCache.key(1)) is None
+        assert [m["id"] for m in await cache_b.get(1)] == [1, 2]
+        assert await cache_b.last_id(1) == 2
+
+        await invalidate(mock_redis, HistoryCache.key(1), local=worker_a)
+        await asyncio.sleep(0.1)
+        assert worker_b.get(HistoryCache.key(1)) is None
+        assert await cache_b.get(1) is None
+    finally:
+        for listener in listeners:
+            await listener.stop()
+
+@pytest.mark.asyncio
+async def test_listener_logs_a_bad_message_and_keeps_listening(mock_redis, caplog):
+    local = LocalCache(100, 60)
+    listener = InvalidationListener(mock_redis, local)
+    await listener.start()
+    await asyncio.sleep(0.05)
+    try:
+        await mock_redis.publish(INVALIDATION_CHANNEL, "not json")
+        await asyncio.sleep(1.2)
+        assert "Cache invalidation listener failed" in caplog.text
+
+        local.set("user:1", {"id": 1}, local.generation)
+        await mock_redis.publish(INVALIDATION_CHANNEL, json.dumps(["user:1"]))
+        await asyncio.sleep(0.1)
+        assert local.get("user:1") is None
+    finally:
+        await listener.stop()
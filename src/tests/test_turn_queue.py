@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func
+from unittest.mock import AsyncMock
+
+from src.models import Conversation, ChatMode, Message
+from src.services.conversation_service import ConversationService
+from src.services.llm_scheduler import LLMUnavailableError
+from src.services.llm_service import LLMService
+from src.services.turn_queue import LocalTurnQueue, RedisTurnQueue
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+def make_queue(queue_class, db_session, mock_redis, call_llm, **kwargs):
+    llm_service = LLMService()
+    llm_service.call_llm = call_llm
+    return queue_class(
+        mock_redis,
+        session_factory=lambda: db_session,
+        service_factory=lambda db, redis_client: ConversationService(db, redis_client, llm_service),
+        **kwargs,
+    )
+
+async def active_conversation(db_session) -> int:
+    conversation = Conversation(user_id=1, mode=ChatMode.OPEN)
+    db_session.add(conversation)
+    await db_session.commit()
+    return conversation.id
+
+# ---------------------------
+# Tests
+# ---------------------------
+
+@pytest.mark.asyncio
+async def test_local_queue_runs_turn_and_publishes_result(db_session, mock_redis):
+    conversation_id = await active_conversation(db_session)
+    queue = make_queue(LocalTurnQueue, db_session, mock_redis, AsyncMock(return_value={"content": "Hi!", "tokens_used": 5}))
+
+    turn_id = await queue.submit(conversation_id, "Hello")
+    assert (await queue.get(turn_id))["status"] == "queued"
+
+    await queue.start(1)
+    try:
+        turn = await queue.wait(turn_id, timeout=5)
+    finally:
+        await queue.stop()
+
+    assert turn["status"] == "done"
+    assert turn["result"]["assistant_response"] == "Hi!"
+
+
+@pytest.mark.asyncio
+async def test_redis_queue_redelivers_turn_left_pending_by_crashed_worker(db_session, mock_redis):
+    conversation_id = await active_conversation(db_session)
+    queue = make_queue(RedisTurnQueue, db_session, mock_redis, AsyncMock(return_value={"content": "Hi!", "tokens_used": 5}), retry_delay=0, block_ms=50)
+    await queue._prepare()
+
+    turn_id = await queue.submit(conversation_id, "Hello")
+    # A worker reads the entry and dies before acking it
+    await mock_redis.xreadgroup(queue.group, "crashed", {queue.stream: ">"}, count=1)
+
+    await queue.start(1)
+    try:
+        turn = await queue.wait(turn_id, timeout=5)
+    finally:
+        await queue.stop()
+
+    assert turn["status"] == "done"
+    assert (await mock_redis.xpending(queue.stream, queue.group))["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_turn_is_retried_while_llm_unavailable_then_gives_up(db_session, mock_redis):
+    conversation_id = await active_conversation(db_session)
+    call_llm = AsyncMock(side_effect=LLMUnavailableError("LLM circuit open"))
+    queue = make_queue(LocalTurnQueue, db_session, mock_redis, call_llm, retry_delay=0, max_deliveries=2)
+
+    turn_id = await queue.submit(conversation_id, "Hello")
+    await queue.start(1)
+    try:
+        turn = await queue.wait(turn_id, timeout=5)
+    finally:
+        await queue.stop()
+
+    assert turn["status"] == "failed"
+    assert call_llm.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_turn_still_running_elsewhere_is_not_run_twice(db_session, mock_redis):
+    conversation_id = await active_conversation(db_session)
+    release = asyncio.Event()
+
+    async def slow_llm(*args, **kwargs):
+        await release.wait()
+        return {"content": "Hi!", "tokens_used": 5}
+
+    call_llm = AsyncMock(side_effect=slow_llm)
+    queue = make_queue(LocalTurnQueue, db_session, mock_redis, call_llm, lease_ms=100)
+    turn_id = await queue.submit(conversation_id, "Hello")
+    job = await queue.queue.get()
+
+    first = asyncio.create_task(queue._run(job))
+    await asyncio.sleep(0.25)  # past the lease, which the first worker keeps renewing
+    assert await queue._run(job) is False
+    release.set()
+    assert await first is True
+
+    # A redelivery of a turn saved by a worker that died before marking it done
+    await queue._set_status(turn_id, "queued")
+    assert await queue._run(job) is True
+    assert call_llm.await_count == 1
+    assert (await queue.get(turn_id))["result"]["assistant_response"] == "Hi!"
+    assert await db_session.scalar(select(func.count()).select_from(Message)) == 2
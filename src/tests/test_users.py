@@ -0,0 +1,49 @@
+import pytest
+
+from src.services.pagination import encode_cursor
+from src.services.user_service import UserService
+
+# ---------------------------
+# Tests
+# ---------------------------
+
+@pytest.mark.asyncio
+async def test_list_users_keyset_pages(db_session, mock_redis):
+    service = UserService(db_session, mock_redis)
+    for i in range(5):
+        await service.create_user(username=f"user{i}", email=f"user{i}@example.com")
+
+    first = await service.list_users(limit=3, include_total=True)
+    assert [u["username"] for u in first["users"]] == ["user0", "user1", "user2"]
+    assert first["total"] == 5
+
+    second = await service.list_users(cursor=first["next_cursor"], limit=3)
+    assert [u["username"] for u in second["users"]] == ["user3", "user4"]
+    assert second["next_cursor"] is None
+
+    # Without cursor or limit the listing is unpaginated, as it was before paging, and cached
+    everyone = await service.list_users()
+    assert len(everyone["users"]) == 5 and everyone["next_cursor"] is None
+    assert await mock_redis.exists(UserService.list_key)
+    await service.create_user(username="user5", email="user5@example.com")
+    assert len((await service.list_users())["users"]) == 6
+
+
+@pytest.mark.asyncio
+async def test_create_user_invalidates_cached_count(db_session, mock_redis):
+    service = UserService(db_session, mock_redis)
+    await service.create_user(username="alice", email="alice@example.com")
+    assert (await service.list_users(include_total=True))["total"] == 1
+
+    await service.create_user(username="bob", email="bob@example.com")
+    assert (await service.list_users(include_total=True))["total"] == 2
+
+
+@pytest.mark.asyncio
+async def test_list_users_rejects_bad_cursor(db_session, mock_redis):
+    service = UserService(db_session, mock_redis)
+    with pytest.raises(ValueError):
+        await service.list_users(cursor="not-a-cursor")
+    # Well-formed, but not an id
+    with pytest.raises(ValueError):
+        await service.list_users(cursor=encode_cursor("abc"))
@@ -0,0 +1,39 @@
+# Standalone chat-turn workers for the Redis Streams turn queue, so workers can scale
+# separately from API replicas (run those with TURN_WORKERS=0):
+#
+#     TURN_QUEUE_BACKEND=redis python -m src.worker
+from src.config.http_client import init_http_client, close_http_client
+from src.config.redis_client import init_redis, close_redis, get_redis
+from src.config.settings import settings
+from src.services.tiered_cache import InvalidationListener, get_local_cache
+from src.services.turn_queue import get_turn_queue
+import asyncio
+import signal
+
+async def main():
+    if settings.turn_queue_backend != "redis":
+        raise SystemExit("Standalone workers need TURN_QUEUE_BACKEND=redis; the local queue only runs inside the API process")
+    await init_redis()
+    await init_http_client()
+    # Turns read conversation histories, so the local cache tier needs invalidations here too
+    listener = InvalidationListener(get_redis(), get_local_cache()) if get_local_cache() is not None else None
+    if listener:
+        await listener.start()
+    queue = get_turn_queue()
+    await queue.start(settings.turn_workers or 1)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+
+    # Turns interrupted here stay pending in the stream and are redelivered to another worker
+    await queue.stop()
+    if listener:
+        await listener.stop()
+    await close_http_client()
+    await close_redis()
+
+if __name__ == "__main__":
+    asyncio.run(main())